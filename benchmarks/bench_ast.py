@@ -0,0 +1,60 @@
+import gc
+import time
+import tracemalloc
+
+from src.lexer import tokenize
+from src.parser import Parser
+from src.arena import to_arena
+
+
+def source(statements: int) -> str:
+    lines = []
+    for i in range(statements // 4):
+        lines.append(f"func f{i}(a, b) = if a < b then a * {i} + b else f{i}(a - 1, b)")
+        lines.append(f"let x{i}: int = f{i}({i}, {i} + 2) * (3 - {i % 7})")
+        lines.append(f"let s{i} = [x{i}, {i}, {i} + 1][{i % 3}]")
+        lines.append(f"{{ let y = x{i}\ny = y + s{i}\ny }}")
+    return "\n".join(lines)
+
+
+def measure(build):
+    # Returns the built object, the time to build it and the memory it keeps.
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, retained
+
+
+def best_time(build, repeat: int = 3) -> float:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        build()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    for statements in (2_000, 20_000):
+        text = source(statements)
+        tokens = tokenize(text)
+        ast, _, ast_bytes = measure(lambda: Parser(tokens).parse())
+        parse_time = best_time(lambda: Parser(tokens).parse())
+        arena, _, arena_bytes = measure(lambda: to_arena(ast))
+        arena_time = best_time(lambda: to_arena(ast))
+        rebuild_time = best_time(lambda: to_arena(ast).to_ast(), repeat=1)
+
+        print(f"{statements} statements, {len(arena)} nodes")
+        print(f"  parse to AST objects : {parse_time * 1000:8.1f} ms  {ast_bytes / 1024:8.0f} KB")
+        print(f"  AST -> arena         : {arena_time * 1000:8.1f} ms  {arena_bytes / 1024:8.0f} KB"
+              f"  ({arena.nbytes() / 1024:.0f} KB in arrays)")
+        print(f"  arena -> AST adapter : {rebuild_time * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from src.bytecode import BytecodeCache, compile_source, dumps, source_digest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# One short-lived job: compile (or load) the script, then run it on the VM.
+JOB = """
+import sys
+from src.bytecode import BytecodeCache
+from src.vm import VirtualMachine
+vm = VirtualMachine(fast=True)
+vm.code = BytecodeCache(sys.argv[1]).compile(open(sys.argv[2]).read())
+vm.execute()
+"""
+
+
+def script(functions: int) -> str:
+    lines = []
+    for i in range(functions):
+        lines.append(f"func f{i}(a, b) = if a < b then a * {i} + b else a - b * {i}")
+        lines.append(f"let v{i} = f{i}({i}, {i * 2 + 1}) + {i}.5")
+    lines.append("let doubled = map(lambda x -> x * 2, [1, 2, 3])")
+    lines.append("doubled[2]")
+    return "\n".join(lines) + "\n"
+
+
+def best_of(func, repeat: int):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def in_process(source: str, cache_dir: str, repeat: int):
+    cache = BytecodeCache(cache_dir)
+    digest = source_digest(source)
+    cold = best_of(lambda: compile_source(source), repeat)
+    cache.store(digest, compile_source(source))
+    warm = best_of(lambda: cache.load(digest), repeat)
+    size = len(dumps(compile_source(source)))
+    return cold, warm, size
+
+
+def processes(source_path: str, cache_dir: str, runs: int):
+    def job():
+        subprocess.run([sys.executable, "-c", JOB, cache_dir, source_path], cwd=ROOT, check=True,
+                       stdout=subprocess.DEVNULL)
+
+    cold = []
+    warm = []
+    for _ in range(runs):
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        start = time.perf_counter()
+        job()
+        cold.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        job()
+        warm.append(time.perf_counter() - start)
+    return min(cold), min(warm)
+
+
+def main():
+    workdir = tempfile.mkdtemp()
+    try:
+        cache_dir = os.path.join(workdir, "cache")
+        for functions in (100, 2000):
+            source = script(functions)
+            source_path = os.path.join(workdir, f"script{functions}.nit")
+            with open(source_path, "w") as f:
+                f.write(source)
+
+            cold, warm, size = in_process(source, os.path.join(workdir, "in-process"), repeat=5)
+            cold_proc, warm_proc = processes(source_path, cache_dir, runs=3)
+            print(f"{functions} functions, {len(source) / 1024:.0f} KB source, {size / 1024:.0f} KB .nitc")
+            print(f"  lex+parse+compile : {cold * 1000:8.1f} ms")
+            print(f"  load .nitc        : {warm * 1000:8.1f} ms  ({cold / warm:.1f}x)")
+            print(f"  process, cold     : {cold_proc * 1000:8.1f} ms")
+            print(f"  process, warm     : {warm_proc * 1000:8.1f} ms  ({cold_proc / warm_proc:.2f}x)")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import time
+
+from src.lexer import tokenize
+from src.parser import Parser
+from src.resolver import resolve
+from src.evaluator import evaluate, create_global_env, run_deep
+from src.inline_cache import inline_cache_stats
+from src import closure_compiler
+
+
+# Two classes with the same method names but different layouts, so the
+# `s.area()` site sees two shapes while `c.bump` and `sq.side` see one.
+PROGRAM = """
+class Square {
+  let side: int
+  func area() = side * side
+}
+class Rect {
+  let pad: int
+  let w: int
+  let h: int
+  func area() = w * h
+}
+class Counter {
+  let count: int
+  func bump(by) = { count = count + by
+count }
+}
+func twice(x) = x + x
+let c = new Counter(0)
+let sq = new Square(3)
+let rect = new Rect(0, 2, 5)
+func pick(n) = if n < {half} then sq else rect
+func area(s) = s.area()
+func loop(n, acc) = if n == 0 then acc else loop(n - 1, acc + c.bump(1) + area(pick(n)) + twice(sq.side))
+loop({calls}, 0)
+"""
+
+
+def timed(engine, ast):
+    start = time.perf_counter()
+    result = run_deep(engine, ast, create_global_env())
+    return result, time.perf_counter() - start
+
+
+def report(label: str, ast, elapsed: float, calls: int):
+    print(f"  {label}: {elapsed / calls * 1e6:6.2f} us/iteration")
+    for kind, totals in inline_cache_stats(ast).items():
+        states = ", ".join(f"{state} {totals[state]}" for state in
+                           ('monomorphic', 'polymorphic', 'megamorphic') if totals.get(state))
+        print(f"    {kind:6} sites {totals['sites']:2}  hit rate {totals['hit_rate']:6.1%}"
+              + (f"  ({states})" if states else ""))
+
+
+def main():
+    calls = 20_000
+    source = PROGRAM.replace("{calls}", str(calls)).replace("{half}", str(calls // 2))
+    print(f"{calls} iterations: 4 calls, 2 method calls and 1 field access each")
+
+    ast = resolve(Parser(tokenize(source)).parse())
+    _, elapsed = timed(evaluate, ast)
+    report("evaluate        ", ast, elapsed, calls)
+
+    ast = Parser(tokenize(source)).parse()
+    _, elapsed = timed(closure_compiler.evaluate, ast)
+    report("closure compiler", ast, elapsed, calls)
+
+
+if __name__ == "__main__":
+    main()
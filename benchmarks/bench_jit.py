@@ -0,0 +1,45 @@
+import time
+
+from src.lexer import tokenize
+from src.parser import Parser
+from src.optimizer import optimize
+from src.resolver import resolve
+from src.evaluator import evaluate, create_global_env, run_deep
+
+PROGRAMS = [
+    ("recursion", "func fib(n) = if n < 2 then n else fib(n - 1) + fib(n - 2)\nfib(22)"),
+    ("tail loop", "func loop(i, acc) = if i == 0 then acc else loop(i - 1, acc + i * 3 - i / 4 + (i - 7) * (i + 7))\n"
+                  "loop(100000, 0)"),
+    ("locals", "func step(x) = { let a = x * 2\nlet b = a + x\nlet c = b * b - a\nc / 3 }\n"
+               "func loop(i, acc) = if i == 0 then acc else loop(i - 1, acc + step(i))\nloop(50000, 0)"),
+    # the lambda keeps `scale` interpreted; `loop` and `add` are translated
+    ("mixed", "func add(a, b) = a + b\nfunc scale(k) = lambda x -> x * k + 1\nlet xs = [1, 2, 3, 4, 5, 6, 7, 8]\n"
+              "func loop(i, acc) = if i == 0 then acc else loop(i - 1, acc + reduce(add, map(scale(i), xs), 0))\n"
+              "loop(5000, 0)"),
+]
+
+
+def timed(ast, jit: bool, repeat: int):
+    best = None
+    result = None
+    for _ in range(repeat):
+        env = create_global_env(jit=jit)
+        start = time.perf_counter()
+        result = [run_deep(evaluate, node, env) for node in ast]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def main():
+    for title, source in PROGRAMS:
+        ast = resolve(optimize(Parser(tokenize(source)).parse()))
+        expected, interpreted = timed(ast, False, repeat=3)
+        result, compiled = timed(ast, True, repeat=3)
+        assert result == expected
+        print(f"{title:10}: interpreted {interpreted * 1000:8.1f} ms, jit {compiled * 1000:8.1f} ms  "
+              f"({interpreted / compiled:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import mmap
+import os
+import re
+import tempfile
+import time
+
+from src.lexer import KEYWORDS, TOKENS, iter_tokens, tokenize
+
+# The tokenizer before the keyword table: keywords as `\b` alternatives tried
+# before IDENTIFIER, an uncompiled pattern and one list of tokens.
+LEGACY_TOKENS = [(kind, rf'{word}\b') for word, kind in KEYWORDS.items()] + \
+    [token for token in TOKENS if token[0] != 'WHITESPACE'] + [('WHITESPACE', r'\s+')]
+LEGACY_REGEX = '|'.join(f'(?P<{name}>{pattern})' for name, pattern in LEGACY_TOKENS)
+
+
+def legacy_tokenize(text: str) -> list:
+    tokens = []
+    for match in re.finditer(LEGACY_REGEX, text):
+        kind = match.lastgroup
+        value = match.group()
+        if kind == 'WHITESPACE':
+            continue
+        elif kind == 'NUMBER':
+            value = float(value) if '.' in value else int(value)
+        elif kind == 'STRING':
+            value = value[1:-1]
+        tokens.append((kind, value))
+    return tokens
+
+
+def source(megabytes: float) -> str:
+    block = "\n".join([
+        "func fib(n: int) = if n < 2 then n else fib(n - 1) + fib(n - 2)",
+        "let total: int = 0",
+        "let values = [1, 2.5, 3, 4]",
+        "let doubled = map(lambda x -> x * 2, values)",
+        "class Point { let x: int\n let y: int\n func sum() = x + y }",
+        "let p = new Point(3, 4)",
+        "let label: string = \"point sum\"",
+        "if p.sum() >= 7 then total = total + 1 else total = total - 1",
+        "let r = ref total",
+        "r := doubled[2] / 3",
+        "",
+    ])
+    return block * max(1, int(megabytes * 1024 * 1024 / len(block)))
+
+
+def timed(func, repeat: int = 3):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def count(tokens) -> int:
+    total = 0
+    for _ in tokens:
+        total += 1
+    return total
+
+
+def main():
+    text = source(4)
+    size = len(text.encode())
+    megabytes = size / (1024 * 1024)
+
+    with tempfile.NamedTemporaryFile('wb', suffix='.nit', delete=False) as handle:
+        handle.write(text.encode())
+        path = handle.name
+
+    try:
+        def from_file():
+            with open(path, 'r') as f:
+                return count(iter_tokens(f))
+
+        def from_mmap():
+            with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                return count(iter_tokens(mapped))
+
+        workloads = [
+            ("legacy regex, list  ", lambda: len(legacy_tokenize(text))),
+            ("tokenize, list      ", lambda: len(tokenize(text))),
+            ("iter_tokens, string ", lambda: count(iter_tokens(text))),
+            ("iter_tokens, file   ", from_file),
+            ("iter_tokens, mmap   ", from_mmap),
+        ]
+        runs = [(title, *timed(func)) for title, func in workloads]
+    finally:
+        os.remove(path)
+
+    _, legacy, legacy_time = runs[0]
+    print(f"lexing {megabytes:.1f} MB, {legacy} tokens")
+    for title, tokens, elapsed in runs:
+        assert tokens == legacy
+        print(f"  {title}: {elapsed * 1000:8.1f} ms  {megabytes / elapsed:6.1f} MB/s  ({legacy_time / elapsed:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
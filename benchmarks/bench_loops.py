@@ -0,0 +1,80 @@
+import contextlib
+import io
+import time
+
+from src.lexer import tokenize
+from src.parser import Parser
+from src.optimizer import optimize
+from src.resolver import resolve
+from src.typeinfer import infer_types
+from src.compiler import Compiler
+from src.vm import VirtualMachine
+from src.register_compiler import RegisterCompiler
+from src.register_vm import RegisterVM
+from src.evaluator import evaluate, create_global_env, run_deep
+
+N = 100_000
+XS = "[" + ", ".join(str(i % 97) for i in range(1000)) + "]"
+
+# (title, tail-recursive version, loop version); the first call of each
+# program is small so the JIT tier has translated `run` before the timed one
+PROGRAMS = [
+    ("counting",
+     "func go(i, n, acc) = if i == n then acc else go(i + 1, n, acc + i * 2)\n"
+     "func run(n) = go(0, n, 0)\nrun(1)\nrun({n})",
+     "func run(n) = {{ let acc = 0\nlet i = 0\nwhile i < n {{ acc = acc + i * 2\ni = i + 1 }}\nacc }}\n"
+     "run(1)\nrun({n})"),
+    ("body lets",
+     "func go(i, n, acc) = if i == n then acc else {{ let d = i * 3\nlet e = d - i\ngo(i + 1, n, acc + e) }}\n"
+     "func run(n) = go(0, n, 0)\nrun(1)\nrun({n})",
+     "func run(n) = {{ let acc = 0\nlet i = 0\nwhile i < n {{ let d = i * 3\nlet e = d - i\nacc = acc + e\n"
+     "i = i + 1 }}\nacc }}\nrun(1)\nrun({n})"),
+    ("array sum",
+     "let xs = {xs}\n"
+     "func go(xs, i, acc) = if i == 1000 then acc else go(xs, i + 1, acc + xs[i])\n"
+     "func sum(xs) = go(xs, 0, 0)\n"
+     "func run(n) = if n == 0 then 0 else sum(xs) + run(n - 1)\nrun(1)\nrun({rounds})",
+     "let xs = {xs}\n"
+     "func run(n) = {{ let acc = 0\nlet r = 0\nwhile r < n {{ for x in xs {{ acc = acc + x }}\nr = r + 1 }}\nacc }}\n"
+     "run(1)\nrun({rounds})"),
+]
+ENGINES = ('evaluate', 'jit', 'vm', 'vm_fast', 'registers')
+
+
+def run(engine: str, source: str):
+    ast = infer_types(optimize(Parser(tokenize(source)).parse()))
+    if engine in ('evaluate', 'jit'):
+        ast = resolve(ast)
+        env = create_global_env(jit=engine == 'jit', jit_threshold=1)
+        return [run_deep(evaluate, node, env) for node in ast][-1]
+    if engine == 'registers':
+        vm = RegisterVM()
+        vm.program = RegisterCompiler().compile(ast)
+    else:
+        vm = VirtualMachine(fast=engine == 'vm_fast')
+        vm.code = Compiler().compile(ast)
+    with contextlib.redirect_stdout(io.StringIO()):
+        return run_deep(vm.execute)
+
+
+def timed(engine: str, source: str):
+    start = time.perf_counter()
+    result = run(engine, source)
+    return result, time.perf_counter() - start
+
+
+def main():
+    for title, recursive, loop in PROGRAMS:
+        params = dict(n=N, xs=XS, rounds=N // 1000)
+        recursive, loop = recursive.format(**params), loop.format(**params)
+        print(title)
+        for engine in ENGINES:
+            expected, recursion_time = timed(engine, recursive)
+            result, loop_time = timed(engine, loop)
+            assert result == expected, (engine, result, expected)
+            print(f"  {engine:10}: recursion {recursion_time * 1000:8.1f} ms, loop {loop_time * 1000:8.1f} ms  "
+                  f"({recursion_time / loop_time:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import time
+
+from src.lexer import tokenize
+from src.parser import Parser
+from src.evaluator import evaluate, create_global_env
+from src import numarray
+from src.numarray import make_array
+
+
+FORMULAS = [
+    "lambda x -> x * 3 + 1",
+    "lambda x -> (x - 5) * (x + 5) / 2",
+    "lambda x -> x * x < 250000",
+]
+
+
+def timed(run):
+    start = time.perf_counter()
+    result = run()
+    return result, time.perf_counter() - start
+
+
+def main():
+    size = 1_000_000
+    values = list(range(-size // 2, size // 2))
+    array = make_array(values)
+    backend = "NumPy" if numarray.np is not None else "array module"
+    print(f"map over {size} ints ({backend})")
+    for formula in FORMULAS:
+        env = create_global_env()
+        func = evaluate(Parser(tokenize(formula)).parse(), env)
+        kernel = func.kernel
+
+        expected, per_element = timed(lambda: [func([x]) for x in values])
+        listed, comprehension = timed(lambda: kernel(values))
+        vectorized, whole_array = timed(lambda: kernel(array))
+        assert expected == listed == vectorized
+
+        print(f"  {formula}")
+        print(f"    per-element calls : {per_element * 1000:8.1f} ms")
+        print(f"    compiled, list    : {comprehension * 1000:8.1f} ms")
+        print(f"    compiled, NumArray: {whole_array * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
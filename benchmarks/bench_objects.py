@@ -0,0 +1,41 @@
+import time
+
+from src.lexer import tokenize
+from src.parser import Parser
+from src.evaluator import evaluate, create_global_env, run_deep
+from src import closure_compiler
+
+
+def program(size: int, calls: int) -> str:
+    fields = "\n".join(f"  let f{i}: int" for i in range(size))
+    methods = "\n".join(f"  func m{i}() = f{i}" for i in range(size))
+    return "\n".join([
+        f"class Counter {{\n  let count: int\n{fields}\n{methods}",
+        "  func bump(by) = { count = count + by\ncount }",
+        "}",
+        "let c = new Counter(0)",
+        "func loop(n, acc) = if n == 0 then acc else loop(n - 1, acc + c.bump(1))",
+        f"loop({calls}, 0)",
+    ])
+
+
+def timed(engine, ast):
+    start = time.perf_counter()
+    result = run_deep(engine, ast, create_global_env())
+    return result, time.perf_counter() - start
+
+
+def main():
+    calls = 20_000
+    for size in (1, 10, 100):
+        ast = Parser(tokenize(program(size, calls))).parse()
+        result, tree = timed(evaluate, ast)
+        compiled_result, compiled = timed(closure_compiler.evaluate, ast)
+        assert result == compiled_result
+        print(f"class with {size + 1} fields / {size + 1} methods, {calls} method calls")
+        print(f"  evaluate        : {tree / calls * 1e6:6.2f} us/call")
+        print(f"  closure compiler: {compiled / calls * 1e6:6.2f} us/call")
+
+
+if __name__ == "__main__":
+    main()
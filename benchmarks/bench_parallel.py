@@ -0,0 +1,41 @@
+import os
+import time
+
+from src.lexer import tokenize
+from src.parser import Parser
+from src.resolver import resolve
+from src.evaluator import evaluate, create_global_env, run_deep
+
+
+def program(builtin: str, size: int) -> str:
+    values = ", ".join(str(i % 5 + 12) for i in range(size))
+    return "\n".join([
+        "func fib(n) = if n < 2 then n else fib(n - 1) + fib(n - 2)",
+        "func add(a, b) = a + b",
+        f"let xs = [{values}]",
+        f"let ys = {builtin}(lambda x -> fib(x), xs)",
+        "reduce(add, ys, 0)",
+    ])
+
+
+def timed(source: str, **options):
+    ast = resolve(Parser(tokenize(source)).parse())
+    env = create_global_env(**options)
+    start = time.perf_counter()
+    result = run_deep(evaluate, ast, env)
+    return result, time.perf_counter() - start
+
+
+def main():
+    size = 400
+    print(f"fib(12..16) over {size} elements, {os.cpu_count()} CPUs")
+    serial, serial_time = timed(program("map", size))
+    print(f"  map              : {serial_time:6.2f} s")
+    for chunk_size in (25, 100):
+        result, elapsed = timed(program("pmap", size), chunk_size=chunk_size, parallel_threshold=0)
+        assert result == serial
+        print(f"  pmap, chunks {chunk_size:4}: {elapsed:6.2f} s  ({serial_time / elapsed:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
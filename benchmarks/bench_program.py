@@ -0,0 +1,53 @@
+import time
+
+from src import nit
+from src.lexer import tokenize
+from src.parser import Parser
+from src.evaluator import evaluate, create_global_env, run_deep
+
+PROGRAMS = [
+    ("expression", "price * (1 - discount) + tax"),
+    ("rules", "func clamp(x, lo, hi) = if x < lo then lo else if x > hi then hi else x\n"
+              "let total = price * quantity\n"
+              "let rate = if total > 1000 then discount * 2 else discount\n"
+              "clamp(total * (1 - rate) + tax, 0, 5000)"),
+]
+RUNS = 20000
+
+
+def bindings() -> list:
+    return [{'price': i % 97 + 1, 'quantity': i % 13, 'discount': 0.05, 'tax': 3} for i in range(RUNS)]
+
+
+# What callers did before the Program API: lex, parse and evaluate per call.
+def from_scratch(source: str, batch: list) -> list:
+    results = []
+    for names in batch:
+        env = create_global_env()
+        for name, value in names.items():
+            env.set(name, value)
+        results.append(evaluate(Parser(tokenize(source)).parse(), env))
+    return results
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    batch = bindings()
+    for title, source in PROGRAMS:
+        expected, scratch = timed(run_deep, from_scratch, source, batch)
+        nit.clear_cache()
+        result, many = timed(lambda: list(nit.compile(source).run_many(batch)))
+        assert result == expected
+        program = nit.compile(source)
+        single = timed(lambda: [program.run(names) for names in batch[:RUNS // 10]])[1] * 10
+        print(f"{title:10}: from scratch {scratch * 1000:8.1f} ms, run_many {many * 1000:8.1f} ms "
+              f"({scratch / many:.2f}x), run {single * 1000:8.1f} ms  ({RUNS} runs)")
+
+
+if __name__ == "__main__":
+    main()
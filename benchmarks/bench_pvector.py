@@ -0,0 +1,53 @@
+import time
+
+from src.lexer import tokenize
+from src.parser import Parser
+from src.optimizer import optimize
+from src.resolver import resolve
+from src.evaluator import evaluate, create_global_env, run_deep
+
+SIZES = (1_000, 5_000, 20_000)
+UPDATES = 50
+
+# Both programs add n to the elements at UPDATES spread-out indexes. Before
+# element assignment the only way to change one element was to rebuild the
+# array, as `rebuild` does with map.
+REBUILD = (
+    "let a = {array}\n"
+    "let k = 0\n"
+    "while k < {updates} {{ let i = k * {step}\n"
+    "a = map(lambda x -> if x == i then x + {n} else x, a)\n"
+    "k = k + 1 }}\n"
+    "a"
+)
+ASSIGN = (
+    "let a = {array}\n"
+    "let k = 0\n"
+    "while k < {updates} {{ let i = k * {step}\n"
+    "a[i] := a[i] + {n}\n"
+    "k = k + 1 }}\n"
+    "a"
+)
+
+
+def timed(source: str):
+    ast = resolve(optimize(Parser(tokenize(source)).parse()))
+    env = create_global_env()
+    start = time.perf_counter()
+    result = [run_deep(evaluate, node, env) for node in ast][-1]
+    return list(result), time.perf_counter() - start
+
+
+def main():
+    print(f"{UPDATES} element updates")
+    for n in SIZES:
+        params = dict(array="[" + ", ".join(map(str, range(n))) + "]", updates=UPDATES, step=n // UPDATES, n=n)
+        expected, rebuild_time = timed(REBUILD.format(**params))
+        result, assign_time = timed(ASSIGN.format(**params))
+        assert result == expected
+        print(f"  {n:6} elements: rebuild with map {rebuild_time * 1000:8.1f} ms, a[i] := v {assign_time * 1000:8.1f} ms  "
+              f"({rebuild_time / assign_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
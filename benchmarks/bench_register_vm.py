@@ -0,0 +1,99 @@
+import contextlib
+import io
+import time
+
+from src.lexer import tokenize
+from src.parser import Parser
+from src.optimizer import optimize
+from src.compiler import Compiler
+from src.vm import VirtualMachine
+from src.register_compiler import RegisterCompiler
+from src.register_vm import RegisterVM
+from src.evaluator import run_deep
+
+PROGRAMS = [
+    ("recursion", "func fib(n) = if n < 2 then n else fib(n - 1) + fib(n - 2)\nfib(20)"),
+    ("arithmetic", "func loop(i, acc) = if i == 0 then acc else loop(i - 1, acc + i * 3 - i / 4 + (i - 7) * (i + 7))\n"
+                   "loop(20000, 0)"),
+    ("locals", "func step(x) = { let a = x * 2\nlet b = a + x\nlet c = b * b - a\nc / 3 }\n"
+               "func loop(i, acc) = if i == 0 then acc else loop(i - 1, acc + step(i))\nloop(20000, 0)"),
+    ("closures", "func add(a, b) = a + b\nfunc scale(k) = lambda x -> x * k + 1\nlet xs = [1, 2, 3, 4, 5, 6, 7, 8]\n"
+                 "func loop(i, acc) = if i == 0 then acc else loop(i - 1, acc + reduce(add, map(scale(i), xs), 0))\n"
+                 "loop(2000, 0)"),
+]
+
+
+# Counts executed instructions: both VMs fetch each one by indexing their
+# code sequence once.
+class CountingCode(list):
+    count = 0
+
+    def __getitem__(self, index):
+        CountingCode.count += 1
+        return list.__getitem__(self, index)
+
+
+def build(engine: str, ast):
+    if engine == 'registers':
+        vm = RegisterVM()
+        vm.program = RegisterCompiler().compile(ast)
+        return vm
+    vm = VirtualMachine(fast=engine == 'vm_fast')
+    vm.code = Compiler().compile(ast)
+    return vm
+
+
+def static_count(vm) -> int:
+    if isinstance(vm, RegisterVM):
+        return sum(len(proto.code) for proto in vm.program.prototypes())
+    return len(vm.code)
+
+
+def executed_count(vm) -> int:
+    if isinstance(vm, RegisterVM):
+        for proto in vm.program.prototypes():
+            proto.code = CountingCode(proto.code)
+    else:
+        vm.code = CountingCode(vm.code)
+    CountingCode.count = 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        run_deep(vm.execute)
+    return CountingCode.count
+
+
+def timed(vm, repeat: int):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = run_deep(vm.execute)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def main():
+    for title, source in PROGRAMS:
+        ast = optimize(Parser(tokenize(source)).parse())
+        print(title)
+        baseline = None
+        expected = None
+        for engine in ('vm', 'registers', 'vm_fast'):
+            result, elapsed = timed(build(engine, ast), repeat=3)
+            if expected is None:
+                expected = result
+            assert result == expected
+            if engine == 'vm_fast':
+                # fast mode fetches fused instructions from its own arrays
+                print(f"  {engine:10}: {elapsed * 1000:8.1f} ms  ({baseline / elapsed:.2f}x)")
+                continue
+            static = static_count(build(engine, ast))
+            executed = executed_count(build(engine, ast))
+            baseline = baseline or elapsed
+            print(f"  {engine:10}: {elapsed * 1000:8.1f} ms  ({baseline / elapsed:.2f}x)  "
+                  f"{static:5} instructions, {executed:9} executed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import time
+from collections import Counter
+
+from src.lexer import tokenize
+from src.parser import Parser
+from src.optimizer import optimize
+from src.escape import analyze_scopes
+from src.resolver import resolve
+from src.typeinfer import infer_types
+from src.evaluator import evaluate, create_global_env, run_deep, Environment, SlotEnvironment
+
+ROUNDS = 300
+XS = "[" + ", ".join(str(i % 13) for i in range(200)) + "]"
+# Timed runs per variant, alternating between the two so that drift in the
+# machine's speed hits both alike; the spread between runs is as large as
+# the difference, so the range is reported rather than one ratio.
+REPEATS = 9
+
+# Closures everywhere: adder returns a lambda, map and filter call
+# block-bodied lambdas per element, reduce calls a named function, and
+# count is a self tail call with a block body.
+SOURCE = (
+    "let xs = {xs}\n"
+    "func adder(k) = lambda x -> {{ let y = x + k\ny }}\n"
+    "func total(a, x) = {{ let s = a + x\ns }}\n"
+    "func count(n, acc) = {{ let m = n - 1\nif n == 0 then acc else count(m, acc + 1) }}\n"
+    "func run(i, acc) = {{ let ys = filter(lambda y -> {{ let big = y > 8\nbig }}, map(adder(i), xs))\n"
+    "if i == 0 then acc else run(i - 1, acc + reduce(total, ys, 0) + count(i, 0)) }}\n"
+    "run({rounds}, 0)"
+)
+
+
+def build(source: str, scopes: bool):
+    ast = optimize(Parser(tokenize(source)).parse())
+    if scopes:
+        ast = analyze_scopes(ast)
+    return infer_types(resolve(ast))
+
+
+def execute(ast):
+    env = create_global_env()
+    return [run_deep(evaluate, node, env) for node in ast][-1]
+
+
+def count_scopes(ast):
+    # Counts scope objects by wrapping the constructors for one run.
+    counts = Counter()
+    originals = {cls: cls.__init__ for cls in (Environment, SlotEnvironment)}
+
+    def counting(cls, init):
+        def __init__(self, *args, **kwargs):
+            counts[cls.__name__] += 1
+            init(self, *args, **kwargs)
+        return __init__
+
+    for cls, init in originals.items():
+        cls.__init__ = counting(cls, init)
+    try:
+        result = execute(ast)
+    finally:
+        for cls, init in originals.items():
+            cls.__init__ = init
+    return result, sum(counts.values())
+
+
+def timed(ast) -> float:
+    start = time.perf_counter()
+    execute(ast)
+    return time.perf_counter() - start
+
+
+def main():
+    source = SOURCE.format(xs=XS, rounds=ROUNDS)
+    print(f"closure-heavy program, {ROUNDS} rounds over {XS.count(',') + 1} elements")
+    asts = {scopes: build(source, scopes) for scopes in (False, True)}
+    counts = {scopes: count_scopes(ast) for scopes, ast in asts.items()}
+    assert counts[False][0] == counts[True][0]
+    times = {False: [], True: []}
+    for _ in range(REPEATS):
+        for scopes, ast in asts.items():
+            times[scopes].append(timed(ast))
+    for scopes, title in ((False, "every block and call"), (True, "with scope analysis")):
+        elapsed = sorted(times[scopes])
+        print(f"  {title:22}: {counts[scopes][1]:8} scopes allocated, "
+              f"{elapsed[0] * 1000:7.1f} to {elapsed[-1] * 1000:7.1f} ms")
+    ratios = sorted(before / after for before, after in zip(times[False], times[True]))
+    print(f"  {counts[False][1] / counts[True][1]:.1f}x fewer scopes; time ratio over {REPEATS} paired runs "
+          f"{ratios[0]:.2f}x to {ratios[-1]:.2f}x, median {ratios[len(ratios) // 2]:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
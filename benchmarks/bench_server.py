@@ -0,0 +1,96 @@
+import argparse
+import asyncio
+import json
+import time
+
+from src.server import ScriptServer
+
+RULES = ("func clamp(x, lo, hi) = if x < lo then lo else if x > hi then hi else x\n"
+         "let total = price * quantity\n"
+         "let rate = if total > 1000 then discount * 2 else discount\n"
+         "clamp(total * (1 - rate) + tax, 0, 5000)")
+FIB = "func fib(n) = if n < 2 then n else fib(n - 1) + fib(n - 2)\nfib(n)"
+RUNAWAY = "func spin(x) = spin(x + 1)\nspin(0)"
+
+# (title, request for client c's i-th call); rules by program ID after the
+# first response, and a mix where every tenth request never terminates
+# and is cut off by the step budget
+WORKLOADS = [
+    ("rules", lambda c, i: {'source': RULES, 'bindings': {'price': i % 97, 'quantity': c + 1,
+                                                          'discount': 0.05, 'tax': 3}}),
+    ("fib vm", lambda c, i: {'source': FIB, 'bindings': {'n': 12 + i % 4}, 'engine': 'vm'}),
+    ("fib eval", lambda c, i: {'source': FIB, 'bindings': {'n': 12 + i % 4}}),
+    ("runaway 10%", lambda c, i: {'source': RUNAWAY, 'max_steps': 50_000} if i % 10 == 0
+        else {'source': RULES, 'bindings': {'price': i, 'quantity': 2, 'discount': 0.1, 'tax': 0}}),
+]
+
+
+def percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def client(address, number: int, requests: int, make, latencies: list, errors: list):
+    if isinstance(address, str):
+        reader, writer = await asyncio.open_unix_connection(address)
+    else:
+        reader, writer = await asyncio.open_connection(*address)
+    for i in range(requests):
+        request = dict(make(number, i), id=i)
+        start = time.perf_counter()
+        writer.write(json.dumps(request).encode() + b'\n')
+        await writer.drain()
+        response = json.loads(await reader.readline())
+        latencies.append(time.perf_counter() - start)
+        if not response['ok']:
+            errors.append(response['error']['type'])
+    writer.close()
+    await writer.wait_closed()
+
+
+async def load(address, clients: int, requests: int, make) -> tuple:
+    latencies = []
+    errors = []
+    start = time.perf_counter()
+    await asyncio.gather(*(client(address, c, requests, make, latencies, errors) for c in range(clients)))
+    return latencies, errors, time.perf_counter() - start
+
+
+async def run(args):
+    server = None
+    address = args.unix
+    if address is None and args.port is not None:
+        address = (args.host, args.port)
+    if address is None:
+        server = ScriptServer(workers=args.workers)
+        await server.start()
+        address = server.address()
+    try:
+        # warm up: start the workers and fill their program caches
+        for _, make in WORKLOADS:
+            await load(address, args.clients, 2, make)
+        for title, make in WORKLOADS:
+            latencies, errors, elapsed = await load(address, args.clients, args.requests, make)
+            summary = f", {len(errors)} errors ({', '.join(sorted(set(errors)))})" if errors else ""
+            print(f"{title:12}: p50 {percentile(latencies, 0.5) * 1000:7.2f} ms  "
+                  f"p99 {percentile(latencies, 0.99) * 1000:7.2f} ms  "
+                  f"{len(latencies) / elapsed:8.0f} req/s{summary}")
+    finally:
+        if server is not None:
+            await server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generator for src.server; starts its own server "
+                                                 "unless --port or --unix is given.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int)
+    parser.add_argument('--unix')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=100, help="per client")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
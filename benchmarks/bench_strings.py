@@ -0,0 +1,82 @@
+import contextlib
+import io
+import time
+
+from src import rope
+from src.lexer import tokenize
+from src.parser import Parser
+from src.optimizer import optimize
+from src.resolver import resolve
+from src.typeinfer import infer_types
+from src.compiler import Compiler
+from src.vm import VirtualMachine
+from src.register_compiler import RegisterCompiler
+from src.register_vm import RegisterVM
+from src.evaluator import evaluate, create_global_env, run_deep
+
+LINE = "x" * 63 + "."
+# 1 MB of output
+PIECES = (1 << 20) // len(LINE)
+
+ENGINES = ('evaluate', 'jit', 'vm_fast', 'registers')
+# (title, program, engines timed with plain strings too). Each program
+# builds the output from 64-character pieces; the first call is small so
+# the JIT tier has translated `build` before the timed one. The VMs keep a
+# frame per tail call, so with plain strings the accumulator would hold
+# every intermediate string (gigabytes); only ropes are timed there.
+PROGRAMS = [
+    ("accumulator", 'func build(n, acc) = if n == 0 then acc else build(n - 1, acc + "{line}")\n'
+                    'build(1, "")\nbuild({n}, "")', ('evaluate', 'jit')),
+    ("prepend", 'func build(n) = if n == 0 then "" else "{line}" + build(n - 1)\nbuild(1)\nbuild({n})', ENGINES),
+    ("while loop", 'func build(n) = {{ let s = ""\nlet i = 0\nwhile i < n {{ s = s + "{line}"\ni = i + 1 }}\ns }}\n'
+                   'build(1)\nbuild({n})', ENGINES),
+]
+
+
+def run(engine: str, source: str):
+    ast = infer_types(optimize(Parser(tokenize(source)).parse()))
+    if engine in ('evaluate', 'jit'):
+        ast = resolve(ast)
+        env = create_global_env(jit=engine == 'jit', jit_threshold=1)
+        return [run_deep(evaluate, node, env) for node in ast][-1]
+    if engine == 'registers':
+        vm = RegisterVM()
+        vm.program = RegisterCompiler().compile(ast)
+    else:
+        vm = VirtualMachine(fast=True)
+        vm.code = Compiler().compile(ast)
+    with contextlib.redirect_stdout(io.StringIO()):
+        return run_deep(vm.execute)
+
+
+def timed(engine: str, source: str, ropes: bool):
+    # Without ropes every concatenation copies, as plain strs did.
+    chunk = rope.ROPE_CHUNK
+    rope.ROPE_CHUNK = chunk if ropes else float('inf')
+    try:
+        start = time.perf_counter()
+        # str() observes the result, so flattening the rope is timed too
+        result = str(run(engine, source))
+        return result, time.perf_counter() - start
+    finally:
+        rope.ROPE_CHUNK = chunk
+
+
+def main():
+    for title, template, plain_engines in PROGRAMS:
+        source = template.format(line=LINE, n=PIECES)
+        print(f"{title} ({PIECES} pieces, {PIECES * len(LINE) >> 10} KB)")
+        for engine in ENGINES:
+            result, rope_time = timed(engine, source, ropes=True)
+            assert result == LINE * PIECES, engine
+            if engine not in plain_engines:
+                print(f"  {engine:10}: plain strings  skipped, ropes {rope_time * 1000:8.1f} ms")
+                continue
+            expected, plain_time = timed(engine, source, ropes=False)
+            assert result == expected, engine
+            print(f"  {engine:10}: plain strings {plain_time * 1000:8.1f} ms, ropes {rope_time * 1000:8.1f} ms  "
+                  f"({plain_time / rope_time:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
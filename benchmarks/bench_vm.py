@@ -0,0 +1,79 @@
+import time
+
+from src.lexer import tokenize
+from src.parser import Parser
+from src.compiler import Compiler
+from src.vm import VMInstruction, VirtualMachine, assemble
+
+
+def counting_loop(n: int):
+    # i = 0; total = 0; while i < n { total = total + i * 2; i = i + 1 }; total
+    return [
+        VMInstruction('LOAD', 0),
+        VMInstruction('STORE', 'i'),
+        VMInstruction('LOAD', 0),
+        VMInstruction('STORE', 'total'),
+        VMInstruction('LOAD_VAR', 'i'),
+        VMInstruction('LOAD', n),
+        VMInstruction('LESS'),
+        VMInstruction('JZ', 19),
+        VMInstruction('LOAD_VAR', 'total'),
+        VMInstruction('LOAD_VAR', 'i'),
+        VMInstruction('LOAD', 2),
+        VMInstruction('MUL'),
+        VMInstruction('ADD'),
+        VMInstruction('STORE', 'total'),
+        VMInstruction('LOAD_VAR', 'i'),
+        VMInstruction('LOAD', 1),
+        VMInstruction('ADD'),
+        VMInstruction('STORE', 'i'),
+        VMInstruction('JMP', 4),
+        VMInstruction('LOAD_VAR', 'total'),
+        VMInstruction('PRINT'),
+    ]
+
+
+def straight_line(statements: int):
+    lines = ["let x = 1", "let y = 2"]
+    for i in range(statements):
+        lines.append(f"let x = x + {i} * y - 1")
+        lines.append(f"let y = if x < {i * 3} then y + 1 else y - 1")
+    lines.append("x + y")
+    return Compiler().compile(Parser(tokenize("\n".join(lines))).parse())
+
+
+def run(code, fast: bool, repeat: int):
+    best = None
+    result = None
+    vm = VirtualMachine(fast=fast)
+    vm.code = code
+    if fast:
+        vm.assembled()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = vm.execute()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def main():
+    workloads = [
+        ("counting loop (200k iterations)", counting_loop(200_000), 3),
+        ("straight-line code (20k statements)", straight_line(20_000), 5),
+    ]
+    for title, code, repeat in workloads:
+        start = time.perf_counter()
+        ops, _ = assemble(code)
+        assemble_time = time.perf_counter() - start
+        slow_result, slow = run(code, fast=False, repeat=repeat)
+        fast_result, fast = run(code, fast=True, repeat=repeat)
+        assert slow_result == fast_result
+        print(f"{title}: {len(code)} instructions -> {len(ops)} after fusion")
+        print(f"  string dispatch : {slow * 1000:8.1f} ms")
+        print(f"  integer dispatch: {fast * 1000:8.1f} ms  ({slow / fast:.2f}x)")
+        print(f"  assemble (once) : {assemble_time * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
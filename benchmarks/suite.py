@@ -0,0 +1,228 @@
+import argparse
+import contextlib
+import io
+import json
+import platform
+import sys
+import time
+
+from src.lexer import tokenize
+from src.parser import Parser
+from src.optimizer import optimize
+from src.resolver import resolve
+from src.escape import analyze_scopes
+from src.purity import analyze_purity
+from src.typeinfer import infer_types
+from src.evaluator import evaluate, create_global_env, run_deep
+from src.compiler import Compiler
+from src.vm import VirtualMachine
+from src.register_compiler import RegisterCompiler
+from src.register_vm import RegisterVM
+
+DEFAULT_OUTPUT = "benchmark_results.json"
+DEFAULT_THRESHOLD = 0.10
+MIN_TIME = 0.001
+PHASES = ('lex', 'parse', 'compile', 'execute')
+
+
+def arithmetic() -> str:
+    return "\n".join([
+        "func loop(i, acc) = if i == 0 then acc else loop(i - 1, acc + i * 3 - i / 4 + (i - 7) * (i + 7))",
+        "loop(20000, 0)",
+    ])
+
+
+def recursion() -> str:
+    return "\n".join([
+        "func fib(n) = if n < 2 then n else fib(n - 1) + fib(n - 2)",
+        "fib(18)",
+    ])
+
+
+def objects() -> str:
+    return "\n".join([
+        "class Account {",
+        "  let balance: int",
+        "  let rate: int",
+        "  func deposit(amount) = { balance = balance + amount\nbalance }",
+        "  func interest() = balance * rate / 100",
+        "}",
+        "let a = new Account(0, 3)",
+        "func loop(n, acc) = if n == 0 then acc else loop(n - 1, acc + a.deposit(n) + a.interest())",
+        "loop(10000, 0)",
+    ])
+
+
+def arrays() -> str:
+    values = ", ".join(str(i * 7 % 101) for i in range(400))
+    return "\n".join([
+        "func add(a, b) = a + b",
+        "func at(ys, i) = ys[i]",
+        f"let xs = [{values}]",
+        "func round(n, acc) = if n == 0 then acc else round(n - 1, acc + reduce(add, map(lambda x -> x * x + n, xs), 0) "
+        "+ at(map(lambda x -> x / 2 < 25, xs), n))",
+        "round(40, 0)",
+    ])
+
+
+def parsing() -> str:
+    lines = []
+    for i in range(2_000):
+        lines.append(f"func f{i}(a, b) = if a < b then a * {i} + b else f{i}(a - 1, b)")
+        lines.append(f"let x{i}: int = f{i}({i}, {i} + 2) * (3 - {i % 7})")
+        lines.append(f"let s{i} = [x{i}, {i}, {i} + 1]")
+        lines.append(f"{{ let y = x{i}\ny = y + s{i}[{i % 3}]\ny }}")
+    lines.append("x1999")
+    return "\n".join(lines)
+
+
+# Workload name, source builder, and the engines that support it (the VMs
+# have no classes).
+VM_ENGINES = ('evaluate', 'vm', 'vm_fast', 'registers')
+WORKLOADS = [
+    ('arithmetic', arithmetic, VM_ENGINES),
+    ('recursion', recursion, VM_ENGINES),
+    ('objects', objects, ('evaluate',)),
+    ('arrays', arrays, VM_ENGINES),
+    ('parsing', parsing, VM_ENGINES),
+]
+
+
+def _timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def _compile(engine: str, ast):
+    if engine == 'evaluate':
+        return analyze_purity(infer_types(resolve(analyze_scopes(optimize(ast)))))
+    if engine == 'registers':
+        vm = RegisterVM()
+        vm.program = RegisterCompiler().compile(infer_types(optimize(ast)))
+        return vm
+    vm = VirtualMachine(fast=engine == 'vm_fast')
+    vm.code = Compiler().compile(infer_types(optimize(ast)))
+    if vm.fast:
+        vm.assembled()
+    return vm
+
+
+def _execute(engine: str, program):
+    with contextlib.redirect_stdout(io.StringIO()):
+        if engine == 'evaluate':
+            return run_deep(evaluate, program, create_global_env())
+        return run_deep(program.execute)
+
+
+def run_workload(source: str, engine: str, repeat: int) -> dict:
+    # Best time of each phase over `repeat` runs, each starting from fresh
+    # tokens, AST and environment so no caches carry over.
+    best = {}
+    result = None
+    for _ in range(repeat):
+        tokens, lex_time = _timed(tokenize, source)
+        ast, parse_time = _timed(lambda: Parser(tokens).parse())
+        program, compile_time = _timed(_compile, engine, ast)
+        result, execute_time = _timed(_execute, engine, program)
+        for phase, elapsed in zip(PHASES, (lex_time, parse_time, compile_time, execute_time)):
+            best[phase] = min(best.get(phase, elapsed), elapsed)
+    best['result'] = repr(result)[:80]
+    return best
+
+
+def run_suite(repeat: int = 3, only=None) -> dict:
+    results = {}
+    for name, build, engines in WORKLOADS:
+        if only and name not in only:
+            continue
+        source = build()
+        results[name] = {engine: run_workload(source, engine, repeat) for engine in engines}
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'repeat': repeat,
+        },
+        'results': results,
+    }
+
+
+def _timings(report: dict) -> dict:
+    return {
+        (workload, engine, phase): timing[phase]
+        for workload, engines in report['results'].items()
+        for engine, timing in engines.items()
+        for phase in PHASES
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float = DEFAULT_THRESHOLD,
+            min_time: float = MIN_TIME) -> list:
+    # (workload, engine, phase, baseline, current, ratio) for every phase
+    # slower than baseline by more than `threshold`, ignoring phases that
+    # take under `min_time` seconds in both runs.
+    regressions = []
+    old = _timings(baseline)
+    for key, new_time in _timings(current).items():
+        old_time = old.get(key)
+        if old_time is None or max(old_time, new_time) < min_time:
+            continue
+        ratio = new_time / old_time if old_time else float('inf')
+        if ratio > 1 + threshold:
+            regressions.append(key + (old_time, new_time, ratio))
+    return regressions
+
+
+def print_report(report: dict):
+    print(f"{'workload':12} {'engine':10}" + " ".join(f"{phase:>10}" for phase in PHASES))
+    for workload, engines in report['results'].items():
+        for engine, timing in engines.items():
+            print(f"{workload:12} {engine:10}" + " ".join(f"{timing[phase] * 1000:8.1f}ms" for phase in PHASES))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="NITLang benchmark suite")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help="run the suite and write JSON results")
+    run.add_argument('--output', default=DEFAULT_OUTPUT)
+    run.add_argument('--repeat', type=int, default=3)
+    run.add_argument('--only', nargs='*', help="workloads to run")
+
+    check = commands.add_parser('compare', help="flag regressions against a baseline")
+    check.add_argument('baseline')
+    check.add_argument('current', nargs='?', help="results file; runs the suite when omitted")
+    check.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    check.add_argument('--min-time', type=float, default=MIN_TIME)
+    check.add_argument('--repeat', type=int, default=3)
+
+    args = parser.parse_args(argv)
+    if args.command == 'run':
+        report = run_suite(args.repeat, args.only)
+        print_report(report)
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nwrote {args.output}")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if args.current:
+        with open(args.current) as f:
+            current = json.load(f)
+    else:
+        current = run_suite(args.repeat, list(baseline['results']))
+        print_report(current)
+    regressions = compare(baseline, current, args.threshold, args.min_time)
+    for workload, engine, phase, old_time, new_time, ratio in regressions:
+        print(f"REGRESSION {workload}/{engine}/{phase}: {old_time * 1000:.1f}ms -> {new_time * 1000:.1f}ms "
+              f"({ratio:.2f}x)")
+    if not regressions:
+        print(f"no regressions over {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,43 +1,108 @@
 from src.lexer import tokenize
-from src.parser import Parser
-from src.evaluator import evaluate, create_global_env
+from src.parser import Parser, LocatingParser
+from src.evaluator import evaluate, create_global_env, run_deep, memo_stats
+from src import closure_compiler
+from src.resolver import resolve
+from src.escape import analyze_scopes
+from src.optimizer import optimize
+from src.purity import analyze_purity
+from src.typeinfer import infer_types
 from src.compiler import Compiler
 from src.vm import VirtualMachine
+from src.register_compiler import RegisterCompiler
+from src.register_vm import RegisterVM, disassemble
+from src.bytecode import BytecodeCache
+from src.profiler import Profiler
 
 
-def run_with_evaluator(code: str):
+def print_profile(profiler: Profiler, profile_output: str = None):
+    print(f"Profile:\n{profiler.report()}\n")
+    if profile_output is not None:
+        profiler.write_collapsed(profile_output)
+        print(f"Collapsed stacks written to {profile_output}\n")
+
+
+def run_with_evaluator(code: str, optimize_ast: bool = True, memoize: bool = False, profile: bool = False,
+                       profile_output: str = None, jit: bool = False):
     print("=== Running with Evaluator (Full Support) ===")
     print(f"Input:\n{code.strip()}\n")
     tokens = tokenize(code)
     print(f"Tokens: {tokens}\n")
-    parser = Parser(tokens)
-    ast = parser.parse()
+    parser = LocatingParser(tokens) if profile else Parser(tokens)
+    ast = analyze_purity(infer_types(resolve(analyze_scopes(optimize(parser.parse(), enabled=optimize_ast)))))
     print(f"AST: {ast}\n")
 
-    env = create_global_env()
-    result = evaluate(ast, env)
+    env = create_global_env(memoize=memoize, jit=jit)
+    if profile:
+        profiler = Profiler(parser.locations)
+        result = profiler.evaluate(ast, env)
+    else:
+        result = run_deep(evaluate, ast, env)
     print(f"Result: {result}\n")
+    if memoize:
+        print(f"Memo stats: {memo_stats(env)}\n")
+    if profile:
+        print_profile(profiler, profile_output)
     return result
 
 
-def run_with_vm(code: str):
-    print("=== Running with VM (Simple Expressions Only) ===")
+def run_with_closure_compiler(code: str, optimize_ast: bool = True):
+    print("=== Running with Closure Compiler ===")
     print(f"Input:\n{code.strip()}\n")
     tokens = tokenize(code)
-    print(f"Tokens: {tokens}\n")
     parser = Parser(tokens)
-    ast = parser.parse()
-    print(f"AST: {ast}\n")
+    ast = infer_types(analyze_scopes(optimize(parser.parse(), enabled=optimize_ast)))
 
-    compiler = Compiler()
-    vm_code = compiler.compile(ast)
+    program = closure_compiler.compile_node(ast)
+    env = create_global_env()
+    result = run_deep(program, env)
+    print(f"Result: {result}\n")
+    return result
+
+
+def run_with_vm(code: str, fast: bool = False, optimize_ast: bool = True, cache_dir: str = None,
+                profile: bool = False, profile_output: str = None):
+    print("=== Running with VM ===")
+    print(f"Input:\n{code.strip()}\n")
+    if cache_dir is not None:
+        cache = BytecodeCache(cache_dir)
+        vm_code = cache.compile(code, optimize_ast)
+        print(f"Bytecode cache: {'hit' if cache.hits else 'miss'} ({cache.directory})\n")
+    else:
+        tokens = tokenize(code)
+        print(f"Tokens: {tokens}\n")
+        parser = Parser(tokens)
+        ast = infer_types(optimize(parser.parse(), enabled=optimize_ast))
+        print(f"AST: {ast}\n")
+
+        compiler = Compiler()
+        vm_code = compiler.compile(ast)
     print(f"VM Code:\n{vm_code}\n")
 
-    vm = VirtualMachine()
+    profiler = Profiler() if profile else None
+    vm = VirtualMachine(fast=fast, profiler=profiler)
     vm.code = vm_code
     print("Executing VM...")
     result = vm.execute()
     print(f"Result: {result}\n")
+    if profile:
+        print_profile(profiler, profile_output)
+    return result
+
+
+def run_with_register_vm(code: str, optimize_ast: bool = True):
+    print("=== Running with Register VM ===")
+    print(f"Input:\n{code.strip()}\n")
+    tokens = tokenize(code)
+    parser = Parser(tokens)
+    ast = infer_types(optimize(parser.parse(), enabled=optimize_ast))
+
+    vm = RegisterVM()
+    vm.program = RegisterCompiler().compile(ast)
+    print(f"Register Code:\n{disassemble(vm.program)}\n")
+    print("Executing Register VM...")
+    result = vm.execute()
+    print(f"Result: {result}\n")
     return result
 
 
@@ -60,8 +125,23 @@ if __name__ == "__main__":
 
     print("\n" + "=" * 50 + "\n")
 
+    print("🧪 Testing with Closure Compiler:")
+    try:
+        run_with_closure_compiler(test_code_evaluator)
+    except Exception as e:
+        print(f"Error: {e}\n")
+
+    print("\n" + "=" * 50 + "\n")
+
     print("🧪 Testing with VM:")
     try:
         run_with_vm(test_code_vm)
     except Exception as e:
-        print(f"Error: {e}\n")
\ No newline at end of file
+        print(f"Error: {e}\n")
+    print("\n" + "=" * 50 + "\n")
+
+    print("🧪 Testing with Register VM:")
+    try:
+        run_with_register_vm(test_code_vm)
+    except Exception as e:
+        print(f"Error: {e}\n")
@@ -0,0 +1,217 @@
+from array import array
+from .ast_nodes import NumberNode, StringNode, BinaryOpNode, FunctionNode, CallNode, IfNode, VariableNode, \
+    TypeNode, LetNode, BlockNode, RefNode, AssignRefNode, AssignNode, ClassNode, NewNode, MethodCallNode, \
+    FieldAccessNode, ArrayNode, LambdaNode, IndexNode, WhileNode, ForNode
+
+NONE = -1
+
+# Operand layout of each kind in `operands`; `*` marks a count followed by
+# that many entries. Names and operators are indices into `names`, literal
+# values are indices into `constants`, everything else is a node index.
+KINDS = [
+    (NumberNode, 'constant'),
+    (StringNode, 'constant'),
+    (BinaryOpNode, 'node name node'),
+    (FunctionNode, 'name *name node *name'),
+    (CallNode, 'name *node'),
+    (IfNode, 'node node node'),
+    (VariableNode, 'name'),
+    (LetNode, 'name node name'),
+    (BlockNode, '*node'),
+    (RefNode, 'node'),
+    (AssignRefNode, 'node node'),
+    (ClassNode, 'name *node *node'),
+    (NewNode, 'name *node'),
+    (MethodCallNode, 'node name *node'),
+    (AssignNode, 'name node'),
+    (FieldAccessNode, 'node name'),
+    (ArrayNode, '*node'),
+    (LambdaNode, 'name node'),
+    (IndexNode, 'node node'),
+    (WhileNode, 'node node'),
+    (ForNode, 'name node node'),
+]
+KIND_CODES = {node_type: code for code, (node_type, _) in enumerate(KINDS)}
+
+
+# A whole program in five flat arrays instead of one object per node: the
+# kind of each node, where its operands start, the operands themselves, and
+# the interned names and literal values they point to. Nodes are stored
+# children first, so a node's index is always greater than its children's.
+# It is a storage and transfer format: engines run AST objects, so consumers
+# rebuild a temporary tree with to_ast() and drop it when they are done, and
+# the arena never holds both forms.
+class NodeArena:
+    def __init__(self):
+        self.kinds = array('B')
+        self.starts = array('I')
+        self.operands = array('i')
+        self.names = []
+        self.constants = []
+        self.roots = array('i')
+        self._name_index = {}
+        self._constant_index = {}
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def intern(self, name) -> int:
+        if name is None:
+            return NONE
+        index = self._name_index.get(name)
+        if index is None:
+            index = self._name_index[name] = len(self.names)
+            self.names.append(name)
+        return index
+
+    def constant(self, value) -> int:
+        key = (type(value), repr(value))
+        index = self._constant_index.get(key)
+        if index is None:
+            index = self._constant_index[key] = len(self.constants)
+            self.constants.append(value)
+        return index
+
+    def add(self, node) -> int:
+        if node is None:
+            return NONE
+        operands = self._operands(node)
+        self.kinds.append(KIND_CODES[type(node)])
+        self.starts.append(len(self.operands))
+        self.operands.extend(operands)
+        return len(self.kinds) - 1
+
+    def _operands(self, node) -> list:
+        add, intern = self.add, self.intern
+        if isinstance(node, (NumberNode, StringNode)):
+            return [self.constant(node.value)]
+        if isinstance(node, BinaryOpNode):
+            return [add(node.left), intern(node.op), add(node.right)]
+        if isinstance(node, FunctionNode):
+            param_types = node.param_types or []
+            return [intern(node.name), len(node.params)] + [intern(p) for p in node.params] + [add(node.body)] + \
+                [len(param_types)] + [intern(t) for t in param_types]
+        if isinstance(node, (CallNode, NewNode)):
+            name = node.name if isinstance(node, CallNode) else node.class_name
+            return [intern(name), len(node.args)] + [add(arg) for arg in node.args]
+        if isinstance(node, IfNode):
+            return [add(node.condition), add(node.then_branch), add(node.else_branch)]
+        if isinstance(node, VariableNode):
+            return [intern(node.name)]
+        if isinstance(node, LetNode):
+            type_name = node.type_node.type_name if node.type_node else None
+            return [intern(node.name), add(node.value), intern(type_name)]
+        if isinstance(node, BlockNode):
+            return [len(node.statements)] + [add(stmt) for stmt in node.statements]
+        if isinstance(node, RefNode):
+            return [add(node.expr)]
+        if isinstance(node, AssignRefNode):
+            return [add(node.ref_expr), add(node.value)]
+        if isinstance(node, ClassNode):
+            methods = list(node.methods.values())
+            return [intern(node.name), len(node.fields)] + [add(field) for field in node.fields] + \
+                [len(methods)] + [add(method) for method in methods]
+        if isinstance(node, MethodCallNode):
+            return [add(node.obj), intern(node.method_name), len(node.args)] + [add(arg) for arg in node.args]
+        if isinstance(node, AssignNode):
+            return [intern(node.name), add(node.value)]
+        if isinstance(node, FieldAccessNode):
+            return [add(node.obj), intern(node.field_name)]
+        if isinstance(node, ArrayNode):
+            return [len(node.elements)] + [add(elem) for elem in node.elements]
+        if isinstance(node, LambdaNode):
+            return [intern(node.param), add(node.body)]
+        if isinstance(node, IndexNode):
+            return [add(node.array), add(node.index)]
+        if isinstance(node, WhileNode):
+            return [add(node.condition), add(node.body)]
+        if isinstance(node, ForNode):
+            return [intern(node.name), add(node.iterable), add(node.body)]
+        raise TypeError(f"Cannot store node in arena: {node}")
+
+    def kind(self, index: int):
+        return KINDS[self.kinds[index]][0]
+
+    def fields(self, index: int) -> list:
+        # Decodes the operands of one node into names, values, node indices
+        # and lists of node indices, following the kind's layout.
+        layout = KINDS[self.kinds[index]][1]
+        operands = self.operands
+        pos = self.starts[index]
+        fields = []
+        for part in layout.split():
+            if part.startswith('*'):
+                count = operands[pos]
+                pos += 1
+                items = operands[pos:pos + count]
+                pos += count
+                if part == '*name':
+                    fields.append([self.names[i] if i != NONE else None for i in items])
+                else:
+                    fields.append(list(items))
+            else:
+                value = operands[pos]
+                pos += 1
+                if part == 'name':
+                    fields.append(self.names[value] if value != NONE else None)
+                elif part == 'constant':
+                    fields.append(self.constants[value])
+                else:
+                    fields.append(value)
+        return fields
+
+    def node(self, index: int):
+        # Rebuilds the node at `index` and its subtree as AST objects.
+        if index == NONE:
+            return None
+        node_type = self.kind(index)
+        fields = self.fields(index)
+        build = self.node
+        if node_type in (NumberNode, StringNode, VariableNode):
+            return node_type(fields[0])
+        if node_type is BinaryOpNode:
+            return BinaryOpNode(build(fields[0]), fields[1], build(fields[2]))
+        if node_type is FunctionNode:
+            return FunctionNode(fields[0], fields[1], build(fields[2]), param_types=fields[3] or None)
+        if node_type in (CallNode, NewNode):
+            return node_type(fields[0], [build(arg) for arg in fields[1]])
+        if node_type is IfNode:
+            return IfNode(build(fields[0]), build(fields[1]), build(fields[2]))
+        if node_type is LetNode:
+            type_node = TypeNode(fields[2]) if fields[2] is not None else None
+            return LetNode(fields[0], build(fields[1]), type_node)
+        if node_type in (BlockNode, ArrayNode):
+            return node_type([build(child) for child in fields[0]])
+        if node_type is RefNode:
+            return RefNode(build(fields[0]))
+        if node_type in (AssignRefNode, IndexNode, WhileNode):
+            return node_type(build(fields[0]), build(fields[1]))
+        if node_type is ClassNode:
+            methods = {}
+            for method in fields[2]:
+                method_node = build(method)
+                methods[method_node.name] = method_node
+            return ClassNode(fields[0], [build(field) for field in fields[1]], methods)
+        if node_type is MethodCallNode:
+            return MethodCallNode(build(fields[0]), fields[1], [build(arg) for arg in fields[2]])
+        if node_type in (AssignNode, LambdaNode):
+            return node_type(fields[0], build(fields[1]))
+        if node_type is FieldAccessNode:
+            return FieldAccessNode(build(fields[0]), fields[1])
+        if node_type is ForNode:
+            return ForNode(fields[0], build(fields[1]), build(fields[2]))
+        raise TypeError(f"Unknown arena node kind: {node_type}")
+
+    def to_ast(self) -> list:
+        # A fresh copy of the program on every call, owned by the caller.
+        return [self.node(root) for root in self.roots]
+
+    def nbytes(self) -> int:
+        return sum(a.itemsize * len(a) for a in (self.kinds, self.starts, self.operands, self.roots))
+
+
+def to_arena(ast) -> NodeArena:
+    arena = NodeArena()
+    for node in (ast if isinstance(ast, list) else [ast]):
+        arena.roots.append(arena.add(node))
+    return arena
@@ -1,9 +1,11 @@
 from typing import Union
 
 class ASTNode:
-    pass
+    __slots__ = ('__weakref__',)
 
 class NumberNode(ASTNode):
+    __slots__ = ('value',)
+
     def __init__(self, value: Union[int, float]):
         self.value = value
 
@@ -11,6 +13,8 @@ class NumberNode(ASTNode):
         return f"NumberNode({self.value})"
 
 class StringNode(ASTNode):
+    __slots__ = ('value',)
+
     def __init__(self, value: str):
         self.value = value
 
@@ -18,33 +22,58 @@ class StringNode(ASTNode):
         return f"StringNode({self.value})"
 
 class BinaryOpNode(ASTNode):
+    __slots__ = ('left', 'op', 'right', 'operand_type')
+
     def __init__(self, left: 'ASTNode', op: str, right: 'ASTNode'):
         self.left = left
         self.op = op
         self.right = right
+        self.operand_type = None
 
     def __repr__(self):
         return f"BinaryOpNode({self.left}, {self.op}, {self.right})"
 
 class FunctionNode(ASTNode):
-    def __init__(self, name: str, params: list, body: ASTNode, closure_env=None):
+    __slots__ = ('name', 'params', 'body', 'closure_env', 'slot', 'layout', 'pure', 'memo', 'countdown', 'compiled',
+                 'param_types', 'checked_types', 'captured', 'limits', 'profiler')
+
+    def __init__(self, name: str, params: list, body: ASTNode, closure_env=None, param_types: list = None):
         self.name = name
         self.params = params
         self.body = body
         self.closure_env = closure_env
+        self.param_types = param_types
+        self.checked_types = None
+        self.slot = None
+        self.layout = None
+        self.pure = None
+        self.memo = None
+        self.countdown = None
+        self.compiled = None
+        self.captured = True
+        self.limits = None
+        self.profiler = None
 
     def __repr__(self):
         return f"FunctionNode({self.name}, {self.params}, {self.body})"
 
 class CallNode(ASTNode):
+    __slots__ = ('name', 'args', 'depth', 'slot', 'cache', 'arg_types')
+
     def __init__(self, name: str, args: list):
         self.name = name
         self.args = args
+        self.depth = None
+        self.slot = None
+        self.cache = None
+        self.arg_types = None
 
     def __repr__(self):
         return f"CallNode({self.name}, {self.args})"
 
 class IfNode(ASTNode):
+    __slots__ = ('condition', 'then_branch', 'else_branch')
+
     def __init__(self, condition: ASTNode, then_branch: ASTNode, else_branch: ASTNode):
         self.condition = condition
         self.then_branch = then_branch
@@ -54,13 +83,19 @@ class IfNode(ASTNode):
         return f"IfNode({self.condition}, {self.then_branch}, {self.else_branch})"
 
 class VariableNode(ASTNode):
+    __slots__ = ('name', 'depth', 'slot')
+
     def __init__(self, name: str):
         self.name = name
+        self.depth = None
+        self.slot = None
 
     def __repr__(self):
         return f"VariableNode({self.name})"
 
 class TypeNode(ASTNode):
+    __slots__ = ('type_name',)
+
     def __init__(self, type_name: str):
         self.type_name = type_name
 
@@ -68,22 +103,34 @@ class TypeNode(ASTNode):
         return f"TypeNode({self.type_name})"
 
 class LetNode(ASTNode):
+    __slots__ = ('name', 'value', 'type_node', 'slot', 'proven')
+
     def __init__(self, name: str, value: ASTNode, type_node: TypeNode = None):
         self.name = name
         self.value = value
         self.type_node = type_node
+        self.slot = None
+        self.proven = False
 
     def __repr__(self):
         return f"LetNode({self.name}, {self.value}, {self.type_node})"
 
+# `scoped` is cleared by escape.analyze_scopes for a block that runs in the
+# enclosing scope.
 class BlockNode(ASTNode):
+    __slots__ = ('statements', 'layout', 'scoped')
+
     def __init__(self, statements: list):
         self.statements = statements
+        self.layout = None
+        self.scoped = True
 
     def __repr__(self):
         return f"BlockNode({self.statements})"
 
 class RefNode(ASTNode):
+    __slots__ = ('expr',)
+
     def __init__(self, expr: ASTNode):
         self.expr = expr
 
@@ -91,6 +138,8 @@ class RefNode(ASTNode):
         return f"RefNode({self.expr})"
 
 class AssignRefNode(ASTNode):
+    __slots__ = ('ref_expr', 'value')
+
     def __init__(self, ref_expr: ASTNode, value: ASTNode):
         self.ref_expr = ref_expr
         self.value = value
@@ -99,15 +148,21 @@ class AssignRefNode(ASTNode):
         return f"AssignRefNode({self.ref_expr}, {self.value})"
 
 class ClassNode(ASTNode):
+    __slots__ = ('name', 'fields', 'methods', 'slot', 'shape')
+
     def __init__(self, name: str, fields: list, methods: dict):
         self.name = name
         self.fields = fields
         self.methods = methods
+        self.slot = None
+        self.shape = None
 
     def __repr__(self):
         return f"ClassNode({self.name}, {self.fields}, {self.methods})"
 
 class NewNode(ASTNode):
+    __slots__ = ('class_name', 'args')
+
     def __init__(self, class_name: str, args: list):
         self.class_name = class_name
         self.args = args
@@ -116,31 +171,43 @@ class NewNode(ASTNode):
         return f"NewNode({self.class_name}, {self.args})"
 
 class MethodCallNode(ASTNode):
+    __slots__ = ('obj', 'method_name', 'args', 'cache')
+
     def __init__(self, obj: ASTNode, method_name: str, args: list):
         self.obj = obj
         self.method_name = method_name
         self.args = args
+        self.cache = None
 
     def __repr__(self):
         return f"MethodCallNode({self.obj}, {self.method_name}, {self.args})"
 
 class AssignNode(ASTNode):
+    __slots__ = ('name', 'value', 'depth', 'slot')
+
     def __init__(self, name: str, value: ASTNode):
         self.name = name
         self.value = value
+        self.depth = None
+        self.slot = None
 
     def __repr__(self):
         return f"AssignNode({self.name}, {self.value})"
 
 class FieldAccessNode(ASTNode):
+    __slots__ = ('obj', 'field_name', 'cache')
+
     def __init__(self, obj: ASTNode, field_name: str):
         self.obj = obj
         self.field_name = field_name
+        self.cache = None
 
     def __repr__(self):
         return f"FieldAccessNode({self.obj}, {self.field_name})"
 
 class ArrayNode(ASTNode):
+    __slots__ = ('elements',)
+
     def __init__(self, elements: list):
         self.elements = elements
 
@@ -148,17 +215,98 @@ class ArrayNode(ASTNode):
         return f"ArrayNode({self.elements})"
 
 class LambdaNode(ASTNode):
+    __slots__ = ('param', 'body', 'layout', 'kernel', 'captured')
+
     def __init__(self, param: str, body: ASTNode):
         self.param = param
         self.body = body
+        self.layout = None
+        self.kernel = None
+        self.captured = True
 
     def __repr__(self):
         return f"LambdaNode({self.param}, {self.body})"
 
 class IndexNode(ASTNode):
+    __slots__ = ('array', 'index')
+
     def __init__(self, array: ASTNode, index: ASTNode):
         self.array = array
         self.index = index
 
     def __repr__(self):
-        return f"IndexNode({self.array}, {self.index})"
\ No newline at end of file
+        return f"IndexNode({self.array}, {self.index})"
+
+# Loops evaluate to None. `layout` is the resolver's layout of the body's
+# scope (the loop variable, then the body's declarations), and `scoping`
+# caches evaluator.loop_scoping.
+class WhileNode(ASTNode):
+    __slots__ = ('condition', 'body', 'layout', 'scoping')
+
+    def __init__(self, condition: ASTNode, body: 'BlockNode'):
+        self.condition = condition
+        self.body = body
+        self.layout = None
+        self.scoping = None
+
+    def __repr__(self):
+        return f"WhileNode({self.condition}, {self.body})"
+
+class ForNode(ASTNode):
+    __slots__ = ('name', 'iterable', 'body', 'layout', 'scoping')
+
+    def __init__(self, name: str, iterable: ASTNode, body: 'BlockNode'):
+        self.name = name
+        self.iterable = iterable
+        self.body = body
+        self.layout = None
+        self.scoping = None
+
+    def __repr__(self):
+        return f"ForNode({self.name}, {self.iterable}, {self.body})"
+
+def iter_child_nodes(node):
+    if isinstance(node, list):
+        yield from node
+    elif isinstance(node, BinaryOpNode):
+        yield node.left
+        yield node.right
+    elif isinstance(node, IfNode):
+        yield node.condition
+        yield node.then_branch
+        yield node.else_branch
+    elif isinstance(node, (FunctionNode, LambdaNode)):
+        yield node.body
+    elif isinstance(node, (CallNode, NewNode)):
+        yield from node.args
+    elif isinstance(node, LetNode):
+        if node.value is not None:
+            yield node.value
+    elif isinstance(node, BlockNode):
+        yield from node.statements
+    elif isinstance(node, RefNode):
+        yield node.expr
+    elif isinstance(node, AssignRefNode):
+        yield node.ref_expr
+        yield node.value
+    elif isinstance(node, AssignNode):
+        yield node.value
+    elif isinstance(node, ClassNode):
+        yield from node.fields
+        yield from node.methods.values()
+    elif isinstance(node, MethodCallNode):
+        yield node.obj
+        yield from node.args
+    elif isinstance(node, FieldAccessNode):
+        yield node.obj
+    elif isinstance(node, ArrayNode):
+        yield from node.elements
+    elif isinstance(node, IndexNode):
+        yield node.array
+        yield node.index
+    elif isinstance(node, WhileNode):
+        yield node.condition
+        yield node.body
+    elif isinstance(node, ForNode):
+        yield node.iterable
+        yield node.body
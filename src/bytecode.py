@@ -0,0 +1,224 @@
+import hashlib
+import os
+import struct
+import tempfile
+from typing import List, Optional
+
+from . import lexer, parser, ast_nodes, resolver, optimizer, evaluator, rope, typeinfer, arena, compiler
+from .lexer import tokenize
+from .parser import Parser
+from .optimizer import optimize
+from .typeinfer import infer_types
+from .compiler import Compiler
+from .vm import VMInstruction, OPCODES
+
+# .nitc layout, all integers little-endian:
+#   header    MAGIC, format version (u16), opcode table digest (8 bytes),
+#             compiler digest (8 bytes), source digest (32 bytes)
+#   constants count (u32), then one tagged entry per constant
+#   code      count (u32), then (opcode index u8, constant index u32) per
+#             instruction; NO_OPERAND marks an instruction without operand
+MAGIC = b'NITC'
+FORMAT_VERSION = 2
+NO_OPERAND = 0xFFFFFFFF
+OPCODES_DIGEST = hashlib.sha256(' '.join(OPCODES).encode()).digest()[:8]
+HEADER = struct.Struct('<4sH8s8s32s')
+COUNT = struct.Struct('<I')
+INSTRUCTION = struct.Struct('<BI')
+INT64 = struct.Struct('<q')
+FLOAT64 = struct.Struct('<d')
+
+OPCODE_INDEX = {name: i for i, name in enumerate(OPCODES)}
+
+# Modules whose code decides what a source compiles to: the front end, the
+# optimizer with the resolver it counts declarations with and the evaluator
+# it folds constants with, type inference and the compiler with its arena
+# input. The vm module only contributes the opcode table, which
+# OPCODES_DIGEST covers.
+TOOLCHAIN = (lexer, parser, ast_nodes, resolver, optimizer, evaluator, rope, typeinfer, arena, compiler)
+
+
+def _compiler_digest() -> bytes:
+    # Any edit to the toolchain invalidates cached files, even one that
+    # keeps the opcode table the same.
+    digest = hashlib.sha256()
+    for module in TOOLCHAIN:
+        with open(module.__file__, 'rb') as f:
+            digest.update(f.read())
+    return digest.digest()[:8]
+
+
+COMPILER_DIGEST = _compiler_digest()
+
+
+def source_digest(source: str, optimize_ast: bool = True) -> bytes:
+    key = f"{FORMAT_VERSION}:{int(optimize_ast)}:".encode() + source.encode()
+    return hashlib.sha256(key).digest()
+
+
+def _encode_constant(value, out: bytearray):
+    if value is None:
+        out += b'N'
+    elif type(value) is int:
+        if -(1 << 63) <= value < (1 << 63):
+            out += b'I'
+            out += INT64.pack(value)
+        else:
+            _encode_text(b'L', str(value), out)
+    elif type(value) is float:
+        out += b'F'
+        out += FLOAT64.pack(value)
+    elif type(value) is str:
+        _encode_text(b'S', value, out)
+    elif type(value) is tuple:
+        out += b'T'
+        out += COUNT.pack(len(value))
+        for item in value:
+            _encode_constant(item, out)
+    else:
+        raise TypeError(f"Cannot serialize constant: {value!r}")
+
+
+def _encode_text(tag: bytes, text: str, out: bytearray):
+    data = text.encode()
+    out += tag
+    out += COUNT.pack(len(data))
+    out += data
+
+
+class _Reader:
+    def __init__(self, data: bytes, pos: int = 0):
+        self.data = data
+        self.pos = pos
+
+    def take(self, size: int) -> bytes:
+        end = self.pos + size
+        if end > len(self.data):
+            raise ValueError("Truncated bytecode")
+        chunk = self.data[self.pos:end]
+        self.pos = end
+        return chunk
+
+    def unpack(self, fmt: struct.Struct):
+        return fmt.unpack(self.take(fmt.size))
+
+    def constant(self):
+        tag = self.take(1)
+        if tag == b'N':
+            return None
+        if tag == b'I':
+            return self.unpack(INT64)[0]
+        if tag == b'F':
+            return self.unpack(FLOAT64)[0]
+        if tag in (b'S', b'L'):
+            (size,) = self.unpack(COUNT)
+            text = self.take(size).decode()
+            return text if tag == b'S' else int(text)
+        if tag == b'T':
+            (size,) = self.unpack(COUNT)
+            return tuple(self.constant() for _ in range(size))
+        raise ValueError(f"Unknown constant tag: {tag!r}")
+
+
+def dumps(instructions: List[VMInstruction], digest: bytes = bytes(32)) -> bytes:
+    pool = {}
+    constants = bytearray()
+    code = bytearray()
+    for instruction in instructions:
+        operand = instruction.operand
+        if operand is None:
+            index = NO_OPERAND
+        else:
+            key = (type(operand), repr(operand))
+            index = pool.get(key)
+            if index is None:
+                index = pool[key] = len(pool)
+                _encode_constant(operand, constants)
+        code += INSTRUCTION.pack(OPCODE_INDEX[instruction.op], index)
+
+    return b''.join([
+        HEADER.pack(MAGIC, FORMAT_VERSION, OPCODES_DIGEST, COMPILER_DIGEST, digest),
+        COUNT.pack(len(pool)), bytes(constants),
+        COUNT.pack(len(instructions)), bytes(code),
+    ])
+
+
+def read_header(data: bytes):
+    if len(data) < HEADER.size:
+        raise ValueError("Truncated bytecode header")
+    magic, version, opcodes_digest, compiler_digest, digest = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Not a .nitc file")
+    if version != FORMAT_VERSION or opcodes_digest != OPCODES_DIGEST:
+        raise ValueError(f"Bytecode format {version} does not match this VM")
+    if compiler_digest != COMPILER_DIGEST:
+        raise ValueError("Bytecode was compiled by another version of the compiler")
+    return digest
+
+
+def loads(data: bytes) -> List[VMInstruction]:
+    read_header(data)
+    reader = _Reader(data, HEADER.size)
+    (constant_count,) = reader.unpack(COUNT)
+    constants = [reader.constant() for _ in range(constant_count)]
+    (count,) = reader.unpack(COUNT)
+    instructions = []
+    for op, index in INSTRUCTION.iter_unpack(reader.take(count * INSTRUCTION.size)):
+        if op >= len(OPCODES) or (index != NO_OPERAND and index >= constant_count):
+            raise ValueError("Corrupt bytecode")
+        instructions.append(VMInstruction(OPCODES[op], None if index == NO_OPERAND else constants[index]))
+    return instructions
+
+
+def default_cache_dir() -> str:
+    return os.environ.get('NITLANG_CACHE_DIR') or os.path.join(os.path.expanduser('~'), '.cache', 'nitlang')
+
+
+class BytecodeCache:
+    # One .nitc file per compiled source, named by the source digest. A file
+    # from another format version, VM or compiler is treated as missing and
+    # rewritten.
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or default_cache_dir()
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, digest: bytes) -> str:
+        return os.path.join(self.directory, digest.hex() + '.nitc')
+
+    def load(self, digest: bytes) -> Optional[List[VMInstruction]]:
+        try:
+            with open(self.path(digest), 'rb') as f:
+                data = f.read()
+            if read_header(data) != digest:
+                return None
+            return loads(data)
+        except (OSError, ValueError, UnicodeDecodeError):
+            return None
+
+    def store(self, digest: bytes, instructions: List[VMInstruction]):
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(dumps(instructions, digest))
+            os.replace(tmp_path, self.path(digest))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def compile(self, source: str, optimize_ast: bool = True) -> List[VMInstruction]:
+        digest = source_digest(source, optimize_ast)
+        instructions = self.load(digest)
+        if instructions is not None:
+            self.hits += 1
+            return instructions
+        self.misses += 1
+        instructions = compile_source(source, optimize_ast)
+        self.store(digest, instructions)
+        return instructions
+
+
+def compile_source(source: str, optimize_ast: bool = True) -> List[VMInstruction]:
+    ast = infer_types(optimize(Parser(tokenize(source)).parse(), enabled=optimize_ast))
+    return Compiler().compile(ast)
@@ -0,0 +1,628 @@
+from typing import Any, Callable
+from weakref import WeakKeyDictionary
+from .ast_nodes import ASTNode, NumberNode, StringNode, BinaryOpNode, FunctionNode, CallNode, IfNode, VariableNode, \
+    LetNode, BlockNode, RefNode, AssignRefNode, AssignNode, ClassNode, NewNode, MethodCallNode, FieldAccessNode, \
+    ArrayNode, LambdaNode, IndexNode, WhileNode, ForNode
+from .evaluator import Environment, ObjectInstance, ElementRef, check_args, typed_call, class_shape, method_scope, \
+    loop_scoping, clear_scope
+from .inline_cache import field_cache, method_cache
+from .numarray import ARRAY_TYPES, make_array, map_kernel
+from .rope import STRING_TYPES, concat
+
+
+# Compiles the AST once into a tree of Python closures, each taking the
+# current Environment. Node types, operators and names are resolved at
+# compile time, so running the program costs one call per node.
+
+Code = Callable[[Environment], Any]
+
+
+# What a call in tail position (the last statement of a function or lambda
+# body or of a block in one, or an `if` branch there) returns instead of
+# running the callee: the body's code and the callee's new scope. The
+# nearest enclosing non-tail call runs it in _trampoline, so tail calls,
+# including mutual recursion, run in constant Python stack as in evaluate.
+class TailCall:
+    __slots__ = ('code', 'env')
+
+    def __init__(self, code: Code, env: Environment):
+        self.code = code
+        self.env = env
+
+
+def _trampoline(result):
+    while type(result) is TailCall:
+        result = result.code(result.env)
+    return result
+
+
+class CompiledFunction(FunctionNode):
+    __slots__ = ('code',)
+
+    def __init__(self, name: str, params: list, body: ASTNode, closure_env, code: Code, param_types: list = None):
+        super().__init__(name, params, body, closure_env, param_types)
+        self.code = code
+
+
+_body_code = WeakKeyDictionary()
+
+
+# Function bodies are compiled as tail positions, so their code may return
+# a TailCall.
+def _code_for(func: FunctionNode) -> Code:
+    if isinstance(func, CompiledFunction):
+        return func.code
+    code = _body_code.get(func.body)
+    if code is None:
+        code = compile_node(func.body, tail=True)
+        _body_code[func.body] = code
+    return code
+
+
+def _compile_sequence(nodes: list, tail: bool = False) -> Code:
+    codes = [compile_node(node) for node in nodes[:-1]] + [compile_node(node, tail) for node in nodes[-1:]]
+    if not codes:
+        return lambda env: None
+    if len(codes) == 1:
+        return codes[0]
+
+    def run(env):
+        result = None
+        for code in codes:
+            result = code(env)
+        return result
+
+    return run
+
+
+def _compile_number(node: NumberNode) -> Code:
+    value = node.value
+    return lambda env: value
+
+
+def _compile_array(node: ArrayNode) -> Code:
+    elements = [compile_node(elem) for elem in node.elements]
+    return lambda env: make_array([elem(env) for elem in elements])
+
+
+# A lambda value; builtins call it like a Python function, and compiled
+# call sites enter its body through scope() so tail calls to it trampoline.
+class CompiledLambda:
+    __slots__ = ('param', 'code', 'env', 'kernel')
+
+    def __init__(self, param: str, code: Code, env: Environment, kernel):
+        self.param = param
+        self.code = code
+        self.env = env
+        self.kernel = kernel
+
+    def scope(self, args: list) -> Environment:
+        if len(args) != 1:
+            raise TypeError(f"Lambda expected 1 arg, got {len(args)}")
+        local_env = Environment(self.env)
+        local_env.vars[self.param] = args[0]
+        return local_env
+
+    def __call__(self, args):
+        return _trampoline(self.code(self.scope(args)))
+
+
+def _compile_lambda(node: LambdaNode) -> Code:
+    param = node.param
+    body = compile_node(node.body, tail=True)
+    kernel = map_kernel(node)
+    return lambda env: CompiledLambda(param, body, env, kernel)
+
+
+def _compile_index(node: IndexNode) -> Code:
+    array = compile_node(node.array)
+    index = compile_node(node.index)
+
+    def run(env):
+        array_val = array(env)
+        index_val = index(env)
+
+        if not isinstance(array_val, ARRAY_TYPES):
+            raise TypeError("Indexing only supported on arrays")
+        if not isinstance(index_val, int):
+            raise TypeError("Array index must be an integer")
+        if index_val < 0 or index_val >= len(array_val):
+            raise IndexError(f"Array index {index_val} out of bounds")
+
+        return array_val[index_val]
+
+    return run
+
+
+# For +, - and * the evaluator's `float(result) if has_float` is a no-op:
+# Python already returns a float whenever either operand is one.
+def _compile_binary(node: BinaryOpNode) -> Code:
+    left = compile_node(node.left)
+    right = compile_node(node.right)
+    op = node.op
+
+    if isinstance(node.right, NumberNode):
+        const = node.right.value
+        if op == 'PLUS':
+            return lambda env: left(env) + const
+        elif op == 'MINUS':
+            return lambda env: left(env) - const
+        elif op == 'MUL':
+            return lambda env: left(env) * const
+        elif op == 'LESS':
+            return lambda env: 1 if left(env) < const else 0
+        elif op == 'LESS_EQ':
+            return lambda env: 1 if left(env) <= const else 0
+        elif op == 'GREATER':
+            return lambda env: 1 if left(env) > const else 0
+        elif op == 'GREATER_EQ':
+            return lambda env: 1 if left(env) >= const else 0
+        elif op == 'EQUALS':
+            return lambda env: 1 if left(env) == const else 0
+
+    if op == 'PLUS':
+        def add(env):
+            left_val = left(env)
+            if isinstance(left_val, STRING_TYPES):
+                return concat(left_val, right(env))
+            return left_val + right(env)
+
+        return add
+    elif op == 'MINUS':
+        return lambda env: left(env) - right(env)
+    elif op == 'MUL':
+        return lambda env: left(env) * right(env)
+    elif op == 'DIV':
+        def div(env):
+            left_val = left(env)
+            right_val = right(env)
+            if right_val == 0:
+                raise ZeroDivisionError("Division by zero")
+            return left_val / right_val
+
+        return div
+    elif op == 'EQUALS':
+        return lambda env: 1 if left(env) == right(env) else 0
+    elif op == 'NOT_EQUALS':
+        return lambda env: 1 if left(env) != right(env) else 0
+    elif op == 'LESS':
+        return lambda env: 1 if left(env) < right(env) else 0
+    elif op == 'LESS_EQ':
+        return lambda env: 1 if left(env) <= right(env) else 0
+    elif op == 'GREATER':
+        return lambda env: 1 if left(env) > right(env) else 0
+    elif op == 'GREATER_EQ':
+        return lambda env: 1 if left(env) >= right(env) else 0
+
+    def unknown(env):
+        left(env)
+        right(env)
+        raise ValueError(f"Unknown operator: {op}")
+
+    return unknown
+
+
+def _compile_if(node: IfNode, tail: bool = False) -> Code:
+    condition = compile_node(node.condition)
+    then_branch = compile_node(node.then_branch, tail)
+    else_branch = compile_node(node.else_branch, tail)
+
+    def run(env):
+        if condition(env) != 0:
+            return then_branch(env)
+        return else_branch(env)
+
+    return run
+
+
+def _compile_function(node: FunctionNode) -> Code:
+    name = node.name
+    params = node.params
+    body = node.body
+    param_types = node.param_types
+    checked_types = node.checked_types
+    code = compile_node(body, tail=True)
+
+    def run(env):
+        func = CompiledFunction(name, params, body, env, code, param_types)
+        func.checked_types = checked_types
+        env.set(name, func)
+        return None
+
+    return run
+
+
+def _compile_call(node: CallNode, tail: bool = False) -> Code:
+    name = node.name
+    args = [compile_node(arg) for arg in node.args]
+    arg_count = len(args)
+
+    def run(env):
+        func = env.get(name)
+        if not isinstance(func, FunctionNode):
+            if type(func) is CompiledLambda:
+                local_env = func.scope([arg(env) for arg in args])
+                if tail:
+                    return TailCall(func.code, local_env)
+                return _trampoline(func.code(local_env))
+            if callable(func):
+                return func([arg(env) for arg in args])
+            raise TypeError(f"{name} is not a function")
+        arg_vals = [arg(env) for arg in args]
+        params = func.params
+        if arg_count != len(params):
+            raise TypeError(f"Function {name} expected {len(params)} args, got {arg_count}")
+        if func.param_types is not None and not typed_call(node, func):
+            check_args(func.param_types, arg_vals)
+
+        local_env = Environment(func.closure_env)
+        local_vars = local_env.vars
+        for param, arg in zip(params, arg_vals):
+            local_vars[param] = arg
+        if tail:
+            return TailCall(_code_for(func), local_env)
+        return _trampoline(_code_for(func)(local_env))
+
+    return run
+
+
+def _compile_class(node: ClassNode) -> Code:
+    def run(env):
+        env.set(node.name, node)
+        return None
+
+    return run
+
+
+def _compile_new(node: NewNode) -> Code:
+    class_name = node.class_name
+    args = [compile_node(arg) for arg in node.args]
+
+    def run(env):
+        class_def = env.get(class_name)
+        if not isinstance(class_def, ClassNode):
+            raise TypeError(f"{class_name} is not a class")
+
+        shape = class_shape(class_def)
+        values = list(shape.defaults)
+        for i in range(min(len(args), len(values))):
+            values[i] = args[i](env)
+        return ObjectInstance(shape, values)
+
+    return run
+
+
+def _run_method(method: FunctionNode, env: Environment) -> Any:
+    return _trampoline(_code_for(method)(env))
+
+
+def _compile_method_call(node: MethodCallNode) -> Code:
+    obj_code = compile_node(node.obj)
+    method_name = node.method_name
+    args = [compile_node(arg) for arg in node.args]
+
+    def run(env):
+        obj = obj_code(env)
+        if not isinstance(obj, ObjectInstance):
+            raise TypeError("Can only call methods on objects")
+
+        cache = node.cache or method_cache(node)
+        if obj.shape is cache.shape:
+            cache.hits += 1
+            method = cache.entry
+        else:
+            method = cache.lookup(obj.shape, method_name)
+            if method is None:
+                raise AttributeError(f"Method {method_name} not found")
+
+        arg_vals = [arg(env) for arg in args]
+        return _run_method(method, method_scope(obj, method, arg_vals, env, _run_method))
+
+    return run
+
+
+def _compile_field_access(node: FieldAccessNode) -> Code:
+    obj_code = compile_node(node.obj)
+    field_name = node.field_name
+
+    def run(env):
+        obj = obj_code(env)
+        if not isinstance(obj, ObjectInstance):
+            raise TypeError("Can only access fields on objects")
+        cache = node.cache or field_cache(node)
+        if obj.shape is cache.shape:
+            cache.hits += 1
+            return obj.values[cache.entry]
+        slot = cache.lookup(obj.shape, field_name)
+        if slot is None:
+            raise AttributeError(f"Field {field_name} not found")
+        return obj.values[slot]
+
+    return run
+
+
+def _compile_variable(node: VariableNode) -> Code:
+    name = node.name
+    return lambda env: env.get(name)
+
+
+def _compile_assign(node: AssignNode) -> Code:
+    name = node.name
+    value_code = compile_node(node.value)
+
+    def run(env):
+        value = value_code(env)
+        current_env = env
+        while current_env is not None:
+            if current_env.has(name):
+                current_env.set(name, value)
+                return None
+            current_env = current_env.parent
+        raise NameError(f"Variable '{name}' is not defined. Use 'let' to declare variables.")
+
+    return run
+
+
+def _compile_let(node: LetNode) -> Code:
+    if node.value is None:
+        return lambda env: None
+
+    name = node.name
+    value_code = compile_node(node.value)
+    expected_type = node.type_node.type_name if node.type_node and not node.proven else None
+
+    if expected_type == 'int':
+        def run(env):
+            value = value_code(env)
+            if not isinstance(value, int):
+                raise TypeError(f"Expected int, got {type(value).__name__}")
+            env.set(name, value)
+    elif expected_type == 'bool':
+        def run(env):
+            value = value_code(env)
+            if not isinstance(value, int):
+                raise TypeError(f"Expected bool (as int), got {type(value).__name__}")
+            env.set(name, value)
+    elif expected_type == 'string':
+        def run(env):
+            value = value_code(env)
+            if not isinstance(value, STRING_TYPES):
+                raise TypeError(f"Expected string, got {type(value).__name__}")
+            env.set(name, value)
+    else:
+        def run(env):
+            env.set(name, value_code(env))
+
+    return run
+
+
+def _compile_block(node: BlockNode, tail: bool = False) -> Code:
+    statements = node.statements
+    codes = [compile_node(stmt) for stmt in statements[:-1]] + [compile_node(stmt, tail) for stmt in statements[-1:]]
+    scoped = node.scoped
+
+    def run(env):
+        local_env = Environment(env) if scoped else env
+        result = None
+        for code in codes:
+            result = code(local_env)
+        return result
+
+    return run
+
+
+def _compile_while(node: WhileNode) -> Code:
+    condition_code = compile_node(node.condition)
+    codes = [compile_node(stmt) for stmt in node.body.statements]
+    scoping = loop_scoping(node)
+
+    def run(env):
+        scope = env if scoping == 'none' else None
+        while condition_code(env) != 0:
+            if scope is None or scoping == 'fresh':
+                scope = Environment(env)
+            elif scoping == 'reuse':
+                clear_scope(scope, None)
+            for code in codes:
+                code(scope)
+        return None
+
+    return run
+
+
+def _compile_for(node: ForNode) -> Code:
+    iterable_code = compile_node(node.iterable)
+    codes = [compile_node(stmt) for stmt in node.body.statements]
+    name = node.name
+    fresh = loop_scoping(node) == 'fresh'
+
+    def run(env):
+        iterable = iterable_code(env)
+        if not isinstance(iterable, ARRAY_TYPES):
+            raise TypeError("Can only loop over arrays")
+        scope = None
+        for value in iterable:
+            if scope is None or fresh:
+                scope = Environment(env)
+            else:
+                clear_scope(scope, None)
+            scope.vars[name] = value
+            for code in codes:
+                code(scope)
+        return None
+
+    return run
+
+
+def _compile_ref(node: RefNode) -> Code:
+    expr = node.expr
+
+    if isinstance(expr, VariableNode):
+        name = expr.name
+        return lambda env: ("REF", env.get_var_ref(name))
+
+    elif isinstance(expr, FieldAccessNode):
+        obj_code = compile_node(expr.obj)
+        field_name = expr.field_name
+
+        def run(env):
+            obj = obj_code(env)
+            if not isinstance(obj, ObjectInstance):
+                raise TypeError("Can only access fields on objects")
+            if not obj.has(field_name):
+                raise AttributeError(f"Field {field_name} not found")
+            return ("REF", (obj, field_name))
+
+        return run
+
+    elif isinstance(expr, IndexNode):
+        array_location = _compile_location(expr.array)
+        index_code = compile_node(expr.index)
+
+        def run(env):
+            element = ElementRef(array_location(env))
+            index_val = index_code(env)
+            element.get(index_val)
+            return ("REF", (element, index_val))
+
+        return run
+
+    def unsupported(env):
+        raise TypeError("Only variable, field and array element references are supported")
+
+    return unsupported
+
+
+# Compiled form of evaluator.location: code returning the (get, store)
+# pair for a variable, field or array element.
+def _compile_location(node) -> Callable:
+    if isinstance(node, VariableNode):
+        name = node.name
+
+        def variable(env):
+            scope, _ = env.get_var_ref(name)
+            return lambda: scope.get(name), lambda value: scope.set(name, value)
+
+        return variable
+
+    if isinstance(node, FieldAccessNode):
+        obj_code = compile_node(node.obj)
+        field_name = node.field_name
+
+        def field(env):
+            obj = obj_code(env)
+            if not isinstance(obj, ObjectInstance):
+                raise TypeError("Can only access fields on objects")
+            obj.get_field(field_name)
+            return lambda: obj.get_field(field_name), lambda value: obj.set(field_name, value)
+
+        return field
+
+    if isinstance(node, IndexNode):
+        array_location = _compile_location(node.array)
+        index_code = compile_node(node.index)
+
+        def element(env):
+            ref = ElementRef(array_location(env))
+            index_val = index_code(env)
+            ref.get(index_val)
+            return lambda: ref.get(index_val), lambda value: ref.set(index_val, value)
+
+        return element
+
+    def unassignable(env):
+        raise TypeError("Left side of ':=' must be a variable, field, or array element")
+
+    return unassignable
+
+
+def _compile_assign_ref(node: AssignRefNode) -> Code:
+    value_code = compile_node(node.value)
+
+    if isinstance(node.ref_expr, IndexNode):
+        array_location = _compile_location(node.ref_expr.array)
+        index_code = compile_node(node.ref_expr.index)
+
+        def assign_element(env):
+            element = ElementRef(array_location(env))
+            index_val = index_code(env)
+            left_value = element.get(index_val)
+            right_value = value_code(env)
+
+            if isinstance(left_value, tuple) and left_value[0] == "REF":
+                target_env, target_name = left_value[1]
+                target_env.set(target_name, right_value)
+            else:
+                element.set(index_val, right_value)
+            return None
+
+        return assign_element
+
+    ref_code = compile_node(node.ref_expr)
+
+    def run(env):
+        left_value = ref_code(env)
+        right_value = value_code(env)
+
+        if isinstance(left_value, tuple) and left_value[0] == "REF":
+            target_env, target_name = left_value[1]
+            target_env.set(target_name, right_value)
+            return None
+        raise TypeError("Left side of ':=' must evaluate to a reference")
+
+    return run
+
+
+_COMPILERS = {
+    NumberNode: _compile_number,
+    StringNode: _compile_number,
+    ArrayNode: _compile_array,
+    LambdaNode: _compile_lambda,
+    IndexNode: _compile_index,
+    BinaryOpNode: _compile_binary,
+    IfNode: _compile_if,
+    FunctionNode: _compile_function,
+    CallNode: _compile_call,
+    ClassNode: _compile_class,
+    NewNode: _compile_new,
+    MethodCallNode: _compile_method_call,
+    FieldAccessNode: _compile_field_access,
+    VariableNode: _compile_variable,
+    AssignNode: _compile_assign,
+    LetNode: _compile_let,
+    BlockNode: _compile_block,
+    RefNode: _compile_ref,
+    AssignRefNode: _compile_assign_ref,
+    WhileNode: _compile_while,
+    ForNode: _compile_for,
+}
+
+
+# Nodes whose compiler takes `tail`: the positions it passes on.
+_TAIL_NODES = (IfNode, BlockNode, CallNode)
+
+
+def compile_node(node_or_nodes, tail: bool = False) -> Code:
+    if isinstance(node_or_nodes, list):
+        return _compile_sequence(node_or_nodes, tail)
+
+    compiler = _COMPILERS.get(type(node_or_nodes))
+    if compiler is None:
+        for node_type, candidate in _COMPILERS.items():
+            if isinstance(node_or_nodes, node_type):
+                compiler = candidate
+                break
+    if compiler is None:
+        node_type = type(node_or_nodes)
+
+        def unknown(env):
+            raise TypeError(f"Unknown node type: {node_type}")
+
+        return unknown
+    if tail and isinstance(node_or_nodes, _TAIL_NODES):
+        return compiler(node_or_nodes, tail)
+    return compiler(node_or_nodes)
+
+
+def evaluate(node_or_nodes, env: Environment) -> Any:
+    return compile_node(node_or_nodes)(env)
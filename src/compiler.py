@@ -1,12 +1,24 @@
 from .ast_nodes import *
+from .arena import NodeArena
 from .vm import VMInstruction
 
+# Opcodes for operators whose operands infer_types proved to be ints or
+# strings.
+INT_OPS = {
+    'PLUS': 'ADD_INT', 'MINUS': 'SUB_INT', 'MUL': 'MUL_INT',
+    'EQUALS': 'EQUALS_INT', 'NOT_EQUALS': 'NOT_EQUALS_INT', 'LESS': 'LESS_INT', 'LESS_EQ': 'LESS_EQ_INT',
+    'GREATER': 'GREATER_INT', 'GREATER_EQ': 'GREATER_EQ_INT',
+}
+STRING_OPS = {'PLUS': 'CONCAT_STR'}
+
 
 class Compiler:
     def __init__(self):
         self.instructions = []
 
     def compile(self, node_or_nodes):
+        if isinstance(node_or_nodes, NodeArena):
+            node_or_nodes = node_or_nodes.to_ast()
         if isinstance(node_or_nodes, list):
             for node in node_or_nodes:
                 if self._is_expression(node):
@@ -21,7 +33,32 @@ class Compiler:
         return self.instructions
 
     def _is_expression(self, node):
-        return isinstance(node, (NumberNode, StringNode, BinaryOpNode, VariableNode, IfNode))  # ← IfNode اضافه شد
+        return isinstance(node, (NumberNode, StringNode, BinaryOpNode, VariableNode, IfNode, CallNode, ArrayNode,
+                                 LambdaNode, IndexNode, BlockNode))
+
+    def _compile_value(self, node):
+        self._compile_node(node)
+        if not self._is_expression(node):
+            self.instructions.append(VMInstruction('LOAD', None))
+
+    def _compile_loop_body(self, body):
+        # Statements only: the body leaves nothing on the stack, so each
+        # iteration jumps back with the stack as it found it.
+        for stmt in body.statements:
+            self._compile_node(stmt)
+            if self._is_expression(stmt):
+                self.instructions.append(VMInstruction('POP'))
+
+    def _compile_function(self, name, params, body, param_types=None):
+        jmp_pos = len(self.instructions)
+        self.instructions.append(VMInstruction('JMP', 0))
+        entry = len(self.instructions)
+        self._compile_value(body)
+        self.instructions.append(VMInstruction('RET'))
+        self.instructions[jmp_pos].operand = len(self.instructions)
+        # the VM checks annotated parameters when it binds the arguments
+        param_types = tuple(param_types) if param_types and any(param_types) else None
+        self.instructions.append(VMInstruction('MAKE_CLOSURE', (name, tuple(params), entry, param_types)))
 
     def _compile_node(self, node):
         if isinstance(node, NumberNode):
@@ -31,7 +68,11 @@ class Compiler:
         elif isinstance(node, BinaryOpNode):
             self._compile_node(node.left)
             self._compile_node(node.right)
-            if node.op == 'PLUS':
+            if node.operand_type == 'int' and node.op in INT_OPS:
+                self.instructions.append(VMInstruction(INT_OPS[node.op]))
+            elif node.operand_type == 'string' and node.op in STRING_OPS:
+                self.instructions.append(VMInstruction(STRING_OPS[node.op]))
+            elif node.op == 'PLUS':
                 self.instructions.append(VMInstruction('ADD'))
             elif node.op == 'MINUS':
                 self.instructions.append(VMInstruction('SUB'))
@@ -54,14 +95,24 @@ class Compiler:
         elif isinstance(node, VariableNode):
             self.instructions.append(VMInstruction('LOAD_VAR', node.name))
         elif isinstance(node, AssignNode):
-            self._compile_node(node.value)
-            self.instructions.append(VMInstruction('STORE', node.name))
+            self._compile_value(node.value)
+            self.instructions.append(VMInstruction('ASSIGN', node.name))
         elif isinstance(node, LetNode):
-            self._compile_node(node.value)
-            self.instructions.append(VMInstruction('STORE', node.name))
+            if node.value is not None:
+                self._compile_value(node.value)
+                if node.type_node and not node.proven:
+                    self.instructions.append(VMInstruction('CHECK_TYPE', node.type_node.type_name))
+                self.instructions.append(VMInstruction('STORE', node.name))
         elif isinstance(node, BlockNode):
-            for stmt in node.statements:
-                self._compile_node(stmt)
+            if not node.statements:
+                self.instructions.append(VMInstruction('LOAD', None))
+            for i, stmt in enumerate(node.statements):
+                if i == len(node.statements) - 1:
+                    self._compile_value(stmt)
+                else:
+                    self._compile_node(stmt)
+                    if self._is_expression(stmt):
+                        self.instructions.append(VMInstruction('POP'))
         elif isinstance(node, IfNode):
             self._compile_node(node.condition)
 
@@ -70,31 +121,57 @@ class Compiler:
             jz_pos = current_pos
             self.instructions.append(VMInstruction('JZ', 0))
 
-            self._compile_node(node.then_branch)
+            self._compile_value(node.then_branch)
 
             jmp_pos = len(self.instructions)
             self.instructions.append(VMInstruction('JMP', 0))
 
             else_start = len(self.instructions)
 
-            self._compile_node(node.else_branch)
+            self._compile_value(node.else_branch)
 
             end_pos = len(self.instructions)
 
             self.instructions[jz_pos].operand = else_start
             self.instructions[jmp_pos].operand = end_pos
 
+        elif isinstance(node, FunctionNode):
+            self._compile_function(node.name, node.params, node.body, node.param_types)
+            self.instructions.append(VMInstruction('STORE', node.name))
         elif isinstance(node, CallNode):
-            pass
+            self.instructions.append(VMInstruction('LOAD_VAR', node.name))
+            for arg in node.args:
+                self._compile_value(arg)
+            self.instructions.append(VMInstruction('CALL', (len(node.args), node.arg_types)))
         elif isinstance(node, ArrayNode):
             for elem in node.elements:
-                self._compile_node(elem)
+                self._compile_value(elem)
+            self.instructions.append(VMInstruction('BUILD_ARRAY', len(node.elements)))
         elif isinstance(node, LambdaNode):
-            pass
+            self._compile_function('<lambda>', [node.param], node.body)
         elif isinstance(node, IndexNode):
-            pass
+            self._compile_value(node.array)
+            self._compile_value(node.index)
+            self.instructions.append(VMInstruction('INDEX'))
+        elif isinstance(node, WhileNode):
+            start = len(self.instructions)
+            self._compile_value(node.condition)
+            jz_pos = len(self.instructions)
+            self.instructions.append(VMInstruction('JZ', 0))
+            self._compile_loop_body(node.body)
+            self.instructions.append(VMInstruction('JMP', start))
+            self.instructions[jz_pos].operand = len(self.instructions)
+        elif isinstance(node, ForNode):
+            self._compile_value(node.iterable)
+            self.instructions.append(VMInstruction('GET_ITER'))
+            start = len(self.instructions)
+            self.instructions.append(VMInstruction('ITER_NEXT', 0))
+            self.instructions.append(VMInstruction('STORE', node.name))
+            self._compile_loop_body(node.body)
+            self.instructions.append(VMInstruction('JMP', start))
+            self.instructions[start].operand = len(self.instructions)
         else:
             raise TypeError(f"Cannot compile node: {node}")
 
     def reset(self):
-        self.instructions = []
\ No newline at end of file
+        self.instructions = []
@@ -13,3 +13,12 @@ class Environment:
 
     def set(self, name, value):
         self.vars[name] = value
+
+    def assign(self, name, value):
+        env = self
+        while env is not None:
+            if name in env.vars:
+                env.vars[name] = value
+                return
+            env = env.parent
+        raise NameError(f"Variable '{name}' is not defined. Use 'let' to declare variables.")
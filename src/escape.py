@@ -0,0 +1,73 @@
+from .ast_nodes import ASTNode, FunctionNode, LambdaNode, RefNode, MethodCallNode, BlockNode, ClassNode, \
+    WhileNode, ForNode, iter_child_nodes
+from .resolver import declared_names
+
+# Nodes that can keep a reference to the scope they run in: closures and
+# refs capture it, and a method call's scope falls back to it.
+CAPTURING_NODES = (FunctionNode, LambdaNode, RefNode, MethodCallNode)
+
+
+def captures(node) -> bool:
+    if isinstance(node, CAPTURING_NODES):
+        return True
+    return any(captures(child) for child in iter_child_nodes(node))
+
+
+# Marks the scopes evaluate can do without. It sets
+#   - BlockNode.scoped = False for a block that declares nothing, or that is
+#     the whole body of a function or lambda and declares none of its
+#     parameters: its statements run in the enclosing scope, and its lets
+#     bind in the call's frame
+#   - FunctionNode.captured / LambdaNode.captured = False when nothing in
+#     the body can keep the call's frame alive after it returns, so the
+#     frame can be refilled for the next call instead of allocated
+# Method bodies keep their block scope, since their frame falls back to the
+# object's fields. Loop bodies are left to evaluator.loop_scoping. Runs
+# before resolve, which lays out a flattened block's names in the scope it
+# was flattened into.
+class ScopeAnalyzer:
+    def analyze(self, ast):
+        self._visit(ast)
+        return ast
+
+    def _body(self, body, params):
+        if isinstance(body, BlockNode) and not set(params) & set(declared_names(body.statements)):
+            body.scoped = False
+            self._visit(body.statements)
+        else:
+            self._visit(body)
+
+    def _visit(self, node):
+        if isinstance(node, list):
+            for child in node:
+                self._visit(child)
+
+        elif isinstance(node, FunctionNode):
+            node.captured = captures(node.body)
+            self._body(node.body, node.params)
+
+        elif isinstance(node, LambdaNode):
+            node.captured = captures(node.body)
+            self._body(node.body, [node.param])
+
+        elif isinstance(node, BlockNode):
+            if not declared_names(node.statements):
+                node.scoped = False
+            self._visit(node.statements)
+
+        elif isinstance(node, ClassNode):
+            self._visit(node.fields)
+            for method in node.methods.values():
+                self._visit(method.body)
+
+        elif isinstance(node, (WhileNode, ForNode)):
+            self._visit(node.condition if isinstance(node, WhileNode) else node.iterable)
+            self._visit(node.body.statements)
+
+        elif isinstance(node, ASTNode):
+            for child in iter_child_nodes(node):
+                self._visit(child)
+
+
+def analyze_scopes(ast):
+    return ScopeAnalyzer().analyze(ast)
@@ -1,10 +1,26 @@
+import sys
+import threading
+from collections import OrderedDict
 from typing import Any
 from .ast_nodes import ASTNode, NumberNode, StringNode, BinaryOpNode, FunctionNode, CallNode, IfNode, VariableNode, \
     LetNode, BlockNode, RefNode, AssignRefNode, AssignNode, ClassNode, NewNode, MethodCallNode, FieldAccessNode, \
-    ArrayNode, LambdaNode, IndexNode
+    ArrayNode, LambdaNode, IndexNode, WhileNode, ForNode
+from .arena import NodeArena
+from .inline_cache import CallCache, field_cache, method_cache
+from .numarray import ARRAY_TYPES, NumArray, make_array, map_kernel
+from .pvector import PersistentVector
+from .rope import STRING_TYPES, concat
+from .resolver import declared_names
+from .escape import captures
 
 
 class Environment:
+    memo_size = None
+    jit_threshold = None
+    limits = None
+    profiler = None
+    version = 0
+
     def __init__(self, parent=None):
         self.parent = parent
         self.vars = {}
@@ -18,6 +34,10 @@ class Environment:
 
     def set(self, name: str, value: Any):
         self.vars[name] = value
+        self.version += 1
+
+    def has(self, name: str) -> bool:
+        return name in self.vars
 
     def get_var_ref(self, name: str):
         if name in self.vars:
@@ -27,303 +47,1001 @@ class Environment:
         raise NameError(f"Name '{name}' is not defined")
 
 
-class ObjectInstance:
-    def __init__(self, class_name: str, fields: dict, methods: dict, field_env=None):
-        self.class_name = class_name
-        self.fields = fields
-        self.methods = methods
-        self.field_env = field_env
+UNSET = object()
 
 
-def evaluate(node_or_nodes, env: Environment) -> Any:
-    if isinstance(node_or_nodes, list):
-        result = None
-        for node in node_or_nodes:
-            result = evaluate(node, env)
-        return result
+class SlotEnvironment(Environment):
+    # Array-backed scope for resolved code: the layout maps each name declared
+    # in the scope to a slot. A slot stays UNSET until its `let` runs, and
+    # lookups then continue in the parent, exactly like a missing dict key.
+    def __init__(self, layout, parent=None):
+        self.parent = parent
+        self.layout = layout
+        self.values = [UNSET] * layout.size
+        self.extra = None
+
+    @property
+    def vars(self):
+        bound = {name: self.values[slot] for name, slot in self.layout.slots.items()
+                 if self.values[slot] is not UNSET}
+        if self.extra:
+            bound.update(self.extra)
+        return bound
 
-    if isinstance(node_or_nodes, ArrayNode):
-        return [evaluate(elem, env) for elem in node_or_nodes.elements]
-
-    if isinstance(node_or_nodes, LambdaNode):
-        def lambda_func(args):
-            local_env = Environment(env)
-            local_env.set(node_or_nodes.param, args[0])
-            return evaluate(node_or_nodes.body, local_env)
-
-        return lambda_func
-
-    if isinstance(node_or_nodes, IndexNode):
-        array_val = evaluate(node_or_nodes.array, env)
-        index_val = evaluate(node_or_nodes.index, env)
-
-        if not isinstance(array_val, list):
-            raise TypeError("Indexing only supported on arrays")
-        if not isinstance(index_val, int):
-            raise TypeError("Array index must be an integer")
-        if index_val < 0 or index_val >= len(array_val):
-            raise IndexError(f"Array index {index_val} out of bounds")
-
-        return array_val[index_val]
-
-    if isinstance(node_or_nodes, NumberNode):
-        return node_or_nodes.value
-
-    elif isinstance(node_or_nodes, StringNode):
-        return node_or_nodes.value
-
-    elif isinstance(node_or_nodes, BinaryOpNode):
-        left_val = evaluate(node_or_nodes.left, env)
-        right_val = evaluate(node_or_nodes.right, env)
-        has_float = isinstance(left_val, float) or isinstance(right_val, float)
-
-        if node_or_nodes.op == 'PLUS':
-            result = left_val + right_val
-            return float(result) if has_float else result
-        elif node_or_nodes.op == 'MINUS':
-            result = left_val - right_val
-            return float(result) if has_float else result
-        elif node_or_nodes.op == 'MUL':
-            result = left_val * right_val
-            return float(result) if has_float else result
-        elif node_or_nodes.op == 'DIV':
-            if right_val == 0:
-                raise ZeroDivisionError("Division by zero")
-            return left_val / right_val
-        elif node_or_nodes.op == 'EQUALS':
-            return 1 if left_val == right_val else 0
-        elif node_or_nodes.op == 'NOT_EQUALS':
-            return 1 if left_val != right_val else 0
-        elif node_or_nodes.op == 'LESS':
-            return 1 if left_val < right_val else 0
-        elif node_or_nodes.op == 'LESS_EQ':
-            return 1 if left_val <= right_val else 0
-        elif node_or_nodes.op == 'GREATER':
-            return 1 if left_val > right_val else 0
-        elif node_or_nodes.op == 'GREATER_EQ':
-            return 1 if left_val >= right_val else 0
-        else:
-            raise ValueError(f"Unknown operator: {node_or_nodes.op}")
+    def get(self, name: str) -> Any:
+        slot = self.layout.slots.get(name)
+        if slot is not None and self.values[slot] is not UNSET:
+            return self.values[slot]
+        if self.extra and name in self.extra:
+            return self.extra[name]
+        if self.parent:
+            return self.parent.get(name)
+        raise NameError(f"Name '{name}' is not defined")
 
-    elif isinstance(node_or_nodes, IfNode):
-        cond = evaluate(node_or_nodes.condition, env)
-        if cond != 0:
-            return evaluate(node_or_nodes.then_branch, env)
+    def set(self, name: str, value: Any):
+        slot = self.layout.slots.get(name)
+        if slot is not None:
+            self.values[slot] = value
         else:
-            return evaluate(node_or_nodes.else_branch, env)
-
-    elif isinstance(node_or_nodes, FunctionNode):
-        func_with_env = FunctionNode(
-            node_or_nodes.name,
-            node_or_nodes.params,
-            node_or_nodes.body,
-            env
-        )
-        env.set(node_or_nodes.name, func_with_env)
-        return None
+            if self.extra is None:
+                self.extra = {}
+            self.extra[name] = value
 
-    elif isinstance(node_or_nodes, CallNode):
-        func = env.get(node_or_nodes.name)
-        if not isinstance(func, FunctionNode):
-            if callable(func):
-                args = [evaluate(arg, env) for arg in node_or_nodes.args]
-                return func(args)
-            raise TypeError(f"{node_or_nodes.name} is not a function")
-        args = [evaluate(arg, env) for arg in node_or_nodes.args]
-        if len(args) != len(func.params):
-            raise TypeError(f"Function {node_or_nodes.name} expected {len(func.params)} args, got {len(args)}")
+    def has(self, name: str) -> bool:
+        slot = self.layout.slots.get(name)
+        if slot is not None and self.values[slot] is not UNSET:
+            return True
+        return bool(self.extra) and name in self.extra
+
+    def get_var_ref(self, name: str):
+        if self.has(name):
+            return (self, name)
+        if self.parent:
+            return self.parent.get_var_ref(name)
+        raise NameError(f"Name '{name}' is not defined")
 
-        local_env = Environment(func.closure_env)
-        for param, arg in zip(func.params, args):
-            local_env.set(param, arg)
-        return evaluate(func.body, local_env)
 
-    elif isinstance(node_or_nodes, ClassNode):
-        env.set(node_or_nodes.name, node_or_nodes)
-        return None
+def new_scope(layout, parent, params=(), args=()):
+    if layout is None:
+        env = Environment(parent)
+        for param, arg in zip(params, args):
+            env.vars[param] = arg
+        return env
+    env = SlotEnvironment(layout, parent)
+    if layout.param_count == len(args):
+        env.values[:len(args)] = args
+    else:
+        for param, arg in zip(params, args):
+            env.set(param, arg)
+    return env
+
+
+def reuse_scope(env, layout, parent, params, args) -> bool:
+    # Refills env for another call of the function whose frame it is, when
+    # the caller owns env and the function's body cannot have captured it
+    # (see escape.analyze_scopes). Returns False when a new scope is needed.
+    if type(env) is not SlotEnvironment or env.layout is not layout or env.parent is not parent:
+        return False
+    values = env.values
+    count = len(args)
+    if layout.param_count == count:
+        values[:count] = args
+        if len(values) > count:
+            values[count:] = [UNSET] * (len(values) - count)
+    else:
+        values[:] = [UNSET] * len(values)
+        for param, arg in zip(params, args):
+            env.set(param, arg)
+    env.extra = None
+    return True
+
+
+def lookup(env: Environment, depth: int, slot, name: str) -> Any:
+    while depth:
+        env = env.parent
+        depth -= 1
+    if slot is None:
+        return env.get(name)
+    value = env.values[slot]
+    if value is UNSET:
+        return env.parent.get(name)
+    return value
+
+
+MISSING = object()
+DEFAULT_MEMO_SIZE = 1024
+DEFAULT_JIT_THRESHOLD = 50
+
+
+class MemoCache:
+    # Bounded LRU cache of results for one pure function value. Arguments are
+    # keyed with their types so 1 and 1.0 stay distinct; calls with
+    # unhashable arguments such as arrays are not cached.
+    def __init__(self, maxsize: int = DEFAULT_MEMO_SIZE):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, args):
+        key = tuple((type(arg), arg) for arg in args)
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
 
-    elif isinstance(node_or_nodes, NewNode):
-        class_def = env.get(node_or_nodes.class_name)
-        if not isinstance(class_def, ClassNode):
-            raise TypeError(f"{node_or_nodes.class_name} is not a class")
+    def get(self, key):
+        value = self.entries.get(key, MISSING)
+        if value is MISSING:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self.entries),
+            'maxsize': self.maxsize,
+        }
+
+
+class LambdaClosure:
+    # A lambda value. Builtins such as map call it like a Python function;
+    # evaluate recognises it in CallNode and enters the body without
+    # recursing, so lambdas share the tail-call loop with named functions.
+    # Builtins call the same closure once per element; when its frame cannot
+    # be captured, the frame of the last call that returned is kept in
+    # `spare` and refilled instead of allocating one per call.
+    def __init__(self, node: LambdaNode, env: Environment, limits=None, profiler=None):
+        self.node = node
+        self.env = env
+        self.limits = limits
+        self.profiler = profiler
+        self.spare = None
+
+    def __call__(self, args):
+        if self.limits is not None:
+            self.limits.step()
+        node = self.node
+        params, args = (node.param,), (args[0],)
+        local_env = self.spare
+        if local_env is not None:
+            self.spare = None
+            reuse_scope(local_env, node.layout, self.env, params, args)
+        else:
+            local_env = new_scope(node.layout, self.env, params, args)
+        result = evaluate(node.body, local_env)
+        if not node.captured and node.layout is not None:
+            self.spare = local_env
+        return result
 
-        field_env = Environment()
+    @property
+    def kernel(self):
+        return map_kernel(self.node)
+
+
+class ClassShape:
+    # Built once per ClassNode and shared by all its instances: field names
+    # map to indices in ObjectInstance.values, and the method table holds the
+    # class's FunctionNodes without copying them per object.
+    def __init__(self, class_node: ClassNode):
+        self.name = class_node.name
+        self.fields = tuple(field.name for field in class_node.fields)
+        self.slots = {name: i for i, name in enumerate(self.fields)}
+        self.defaults = tuple(
+            "" if field.type_node and field.type_node.type_name == 'string' else 0
+            for field in class_node.fields
+        )
+        self.methods = dict(class_node.methods)
 
-        for i, field_node in enumerate(class_def.fields):
-            field_name = field_node.name
-            if i < len(node_or_nodes.args):
-                value = evaluate(node_or_nodes.args[i], env)
-            else:
-                if field_node.type_node and field_node.type_node.type_name == 'int':
-                    value = 0
-                elif field_node.type_node and field_node.type_node.type_name == 'string':
-                    value = ""
-                else:
-                    value = 0
 
-            field_env.set(field_name, value)
+def class_shape(class_node: ClassNode) -> ClassShape:
+    if class_node.shape is None:
+        class_node.shape = ClassShape(class_node)
+    return class_node.shape
 
-        fields = field_env.vars.copy()
 
-        class_env = Environment()
+class ObjectInstance:
+    __slots__ = ('shape', 'values')
 
-        for field_name, value in fields.items():
-            class_env.set(field_name, value)
+    def __init__(self, shape: ClassShape, values: list):
+        self.shape = shape
+        self.values = values
 
-        methods = {}
-        for method_name, method_node in class_def.methods.items():
-            method_with_env = FunctionNode(
-                method_name,
-                method_node.params,
-                method_node.body,
-                class_env
-            )
-            methods[method_name] = method_with_env
-            class_env.set(method_name, method_with_env)
+    @property
+    def class_name(self) -> str:
+        return self.shape.name
 
-        obj = ObjectInstance(class_def.name, fields, methods, field_env)
-        return obj
+    @property
+    def methods(self) -> dict:
+        return self.shape.methods
 
-    elif isinstance(node_or_nodes, MethodCallNode):
-        obj = evaluate(node_or_nodes.obj, env)
-        if not isinstance(obj, ObjectInstance):
-            raise TypeError("Can only call methods on objects")
+    @property
+    def fields(self) -> dict:
+        return {name: self.values[slot] for name, slot in self.shape.slots.items()}
 
-        method = obj.methods.get(node_or_nodes.method_name)
-        if not method:
-            raise AttributeError(f"Method {node_or_nodes.method_name} not found")
+    def has(self, name: str) -> bool:
+        return name in self.shape.slots
 
-        method_env = Environment(env)
+    def get_field(self, name: str) -> Any:
+        slot = self.shape.slots.get(name)
+        if slot is None:
+            raise AttributeError(f"Field {name} not found")
+        return self.values[slot]
 
-        for field_name, value in obj.fields.items():
-            method_env.set(field_name, value)
+    def set(self, name: str, value: Any):
+        self.values[self.shape.slots[name]] = value
 
-        for method_name, method_obj in obj.methods.items():
-            method_env.set(method_name, method_obj)
 
-        args = [evaluate(arg, env) for arg in node_or_nodes.args]
-        for param, arg in zip(method.params, args):
-            method_env.set(param, arg)
+class MethodEnvironment(Environment):
+    # Scope of one method call. Parameters live in `vars`; field names read
+    # and write the object's slots in place, and sibling method names resolve
+    # to methods bound to the same object. Everything else falls through to
+    # the caller's scope. `runner(method, env)` executes a method body.
+    def __init__(self, obj: ObjectInstance, parent, runner):
+        self.parent = parent
+        self.vars = {}
+        self.obj = obj
+        self.runner = runner
 
-        result = evaluate(method.body, method_env)
+    def get(self, name: str) -> Any:
+        if name in self.vars:
+            return self.vars[name]
+        shape = self.obj.shape
+        slot = shape.slots.get(name)
+        if slot is not None:
+            return self.obj.values[slot]
+        method = shape.methods.get(name)
+        if method is not None:
+            return BoundMethod(self.obj, method, self.parent, self.runner)
+        if self.parent:
+            return self.parent.get(name)
+        raise NameError(f"Name '{name}' is not defined")
 
-        for field_name in obj.fields:
-            if field_name in method_env.vars:
-                obj.fields[field_name] = method_env.vars[field_name]
-                if obj.field_env:
-                    obj.field_env.set(field_name, method_env.vars[field_name])
+    def set(self, name: str, value: Any):
+        if name not in self.vars:
+            slot = self.obj.shape.slots.get(name)
+            if slot is not None:
+                self.obj.values[slot] = value
+                return
+        self.vars[name] = value
 
-        return result
+    def has(self, name: str) -> bool:
+        shape = self.obj.shape
+        return name in self.vars or name in shape.slots or name in shape.methods
 
-    elif isinstance(node_or_nodes, FieldAccessNode):
-        obj = evaluate(node_or_nodes.obj, env)
-        if not isinstance(obj, ObjectInstance):
-            raise TypeError("Can only access fields on objects")
-        if node_or_nodes.field_name not in obj.fields:
-            raise AttributeError(f"Field {node_or_nodes.field_name} not found")
+    def get_var_ref(self, name: str):
+        if self.has(name):
+            return (self, name)
+        if self.parent:
+            return self.parent.get_var_ref(name)
+        raise NameError(f"Name '{name}' is not defined")
 
-        return obj.fields[node_or_nodes.field_name]
 
-    elif isinstance(node_or_nodes, VariableNode):
-        value = env.get(node_or_nodes.name)
+def method_scope(obj: ObjectInstance, method: FunctionNode, args: list, parent, runner) -> MethodEnvironment:
+    if method.param_types is not None:
+        check_args(method.param_types, args)
+    env = MethodEnvironment(obj, parent, runner)
+    for param, arg in zip(method.params, args):
+        env.vars[param] = arg
+    return env
 
-        if isinstance(value, tuple) and len(value) == 2 and value[0] == "REF":
-            return value
-        else:
-            return value
 
-    elif isinstance(node_or_nodes, AssignNode):
-        value = evaluate(node_or_nodes.value, env)
+class BoundMethod:
+    # A method looked up by name inside another method of the same object.
+    __slots__ = ('obj', 'method', 'scope', 'runner')
 
-        current_env = env
-        found = False
-        target_env = None
+    def __init__(self, obj: ObjectInstance, method: FunctionNode, scope, runner):
+        self.obj = obj
+        self.method = method
+        self.scope = scope
+        self.runner = runner
 
-        while current_env is not None:
-            if node_or_nodes.name in current_env.vars:
-                found = True
-                target_env = current_env
-                break
-            current_env = current_env.parent
+    def __call__(self, args):
+        limits = global_env(self.scope).limits
+        if limits is not None:
+            limits.step()
+        return self.runner(self.method, method_scope(self.obj, self.method, args, self.scope, self.runner))
 
-        if not found:
-            raise NameError(f"Variable '{node_or_nodes.name}' is not defined. Use 'let' to declare variables.")
 
-        target_env.set(node_or_nodes.name, value)
-        return None
+def run_method(method: FunctionNode, env: Environment) -> Any:
+    return evaluate(method.body, env)
 
-    elif isinstance(node_or_nodes, LetNode):
-        if node_or_nodes.value is None:
-            return None
 
-        value = evaluate(node_or_nodes.value, env)
-
-        if node_or_nodes.type_node:
-            expected_type = node_or_nodes.type_node.type_name
-            if expected_type == 'int':
-                if not isinstance(value, int):
-                    raise TypeError(f"Expected int, got {type(value).__name__}")
-            elif expected_type == 'bool':
-                if not isinstance(value, int):
-                    raise TypeError(f"Expected bool (as int), got {type(value).__name__}")
-            elif expected_type == 'string':
-                if not isinstance(value, str):
-                    raise TypeError(f"Expected string, got {type(value).__name__}")
-
-        env.set(node_or_nodes.name, value)
-        return None
+# The global scope of the run env belongs to, which holds the run's limits
+# and profiler (see create_global_env and profiler.Profiler). Functions and
+# lambdas copy both when they are created; while a profiler is set, its
+# call() gets the callee's name whenever evaluate enters a function, lambda,
+# method or builtin.
+def global_env(env: Environment) -> Environment:
+    while env.parent is not None:
+        env = env.parent
+    return env
 
-    elif isinstance(node_or_nodes, BlockNode):
-        local_env = Environment(env)
-        result = None
-        for stmt in node_or_nodes.statements:
-            result = evaluate(stmt, local_env)
-        return result
 
-    elif isinstance(node_or_nodes, RefNode):
-        expr = node_or_nodes.expr
+# Tail positions (the last statement of a program or block, both branches of
+# an `if`, and the body of a called function or lambda) rebind node_or_nodes
+# and env and loop instead of recursing, so tail-recursive programs run in
+# constant Python stack.
+def evaluate(node_or_nodes, env: Environment) -> Any:
+    # whether env is a scope this call created, which nothing else can see
+    # once the statements that ran in it have returned
+    owned = False
+    while True:
+        if isinstance(node_or_nodes, list):
+            if not node_or_nodes:
+                return None
+            for i in range(len(node_or_nodes) - 1):
+                evaluate(node_or_nodes[i], env)
+            node_or_nodes = node_or_nodes[-1]
+            continue
+
+        if isinstance(node_or_nodes, ArrayNode):
+            return make_array([evaluate(elem, env) for elem in node_or_nodes.elements])
+
+        if isinstance(node_or_nodes, LambdaNode):
+            root = global_env(env)
+            return LambdaClosure(node_or_nodes, env, root.limits, root.profiler)
+
+        if isinstance(node_or_nodes, IndexNode):
+            array_val = evaluate(node_or_nodes.array, env)
+            index_val = evaluate(node_or_nodes.index, env)
+
+            if not isinstance(array_val, ARRAY_TYPES):
+                raise TypeError("Indexing only supported on arrays")
+            if not isinstance(index_val, int):
+                raise TypeError("Array index must be an integer")
+            if index_val < 0 or index_val >= len(array_val):
+                raise IndexError(f"Array index {index_val} out of bounds")
+
+            return array_val[index_val]
+
+        if isinstance(node_or_nodes, NumberNode):
+            return node_or_nodes.value
+
+        elif isinstance(node_or_nodes, StringNode):
+            return node_or_nodes.value
+
+        elif isinstance(node_or_nodes, BinaryOpNode):
+            left_val = evaluate(node_or_nodes.left, env)
+            right_val = evaluate(node_or_nodes.right, env)
+
+            if node_or_nodes.op == 'PLUS':
+                if isinstance(left_val, STRING_TYPES):
+                    return concat(left_val, right_val)
+                result = left_val + right_val
+            elif node_or_nodes.op == 'MINUS':
+                result = left_val - right_val
+            elif node_or_nodes.op == 'MUL':
+                result = left_val * right_val
+            elif node_or_nodes.op == 'DIV':
+                if right_val == 0:
+                    raise ZeroDivisionError("Division by zero")
+                return left_val / right_val
+            elif node_or_nodes.op == 'EQUALS':
+                return 1 if left_val == right_val else 0
+            elif node_or_nodes.op == 'NOT_EQUALS':
+                return 1 if left_val != right_val else 0
+            elif node_or_nodes.op == 'LESS':
+                return 1 if left_val < right_val else 0
+            elif node_or_nodes.op == 'LESS_EQ':
+                return 1 if left_val <= right_val else 0
+            elif node_or_nodes.op == 'GREATER':
+                return 1 if left_val > right_val else 0
+            elif node_or_nodes.op == 'GREATER_EQ':
+                return 1 if left_val >= right_val else 0
+            else:
+                raise ValueError(f"Unknown operator: {node_or_nodes.op}")
+            # operands typed by infer_types are both ints or both strings
+            if node_or_nodes.operand_type is None and (isinstance(left_val, float) or isinstance(right_val, float)):
+                return float(result)
+            return result
+
+        elif isinstance(node_or_nodes, IfNode):
+            cond = evaluate(node_or_nodes.condition, env)
+            if cond != 0:
+                node_or_nodes = node_or_nodes.then_branch
+            else:
+                node_or_nodes = node_or_nodes.else_branch
+            continue
+
+        elif isinstance(node_or_nodes, FunctionNode):
+            func_with_env = FunctionNode(
+                node_or_nodes.name,
+                node_or_nodes.params,
+                node_or_nodes.body,
+                env,
+                node_or_nodes.param_types
+            )
+            func_with_env.layout = node_or_nodes.layout
+            func_with_env.checked_types = node_or_nodes.checked_types
+            func_with_env.captured = node_or_nodes.captured
+            root = env
+            while root.parent is not None:
+                root = root.parent
+            func_with_env.limits = root.limits
+            func_with_env.profiler = root.profiler
+            if node_or_nodes.pure and root.memo_size:
+                func_with_env.memo = MemoCache(root.memo_size)
+            elif root.jit_threshold is not None and root.limits is None and root.profiler is None:
+                # translated code would run without charging steps or
+                # reporting calls
+                func_with_env.countdown = root.jit_threshold
+            if node_or_nodes.slot is not None:
+                env.values[node_or_nodes.slot] = func_with_env
+            else:
+                env.set(node_or_nodes.name, func_with_env)
+            return None
+
+        elif isinstance(node_or_nodes, CallNode):
+            if node_or_nodes.depth is None:
+                func = env.get(node_or_nodes.name)
+            elif node_or_nodes.slot is not None:
+                func = lookup(env, node_or_nodes.depth, node_or_nodes.slot, node_or_nodes.name)
+            else:
+                scope = env
+                for _ in range(node_or_nodes.depth):
+                    scope = scope.parent
+                cache = node_or_nodes.cache
+                if cache is not None and cache.env is scope and cache.version == scope.version:
+                    cache.hits += 1
+                    func = cache.func
+                else:
+                    if cache is None:
+                        cache = node_or_nodes.cache = CallCache()
+                    func = cache.fill(scope, node_or_nodes.name)
+            if not isinstance(func, FunctionNode):
+                if type(func) is LambdaClosure:
+                    args = [evaluate(arg, env) for arg in node_or_nodes.args]
+                    if func.profiler is not None:
+                        func.profiler.call(node_or_nodes.name)
+                    if func.limits is not None:
+                        func.limits.step()
+                    if len(args) != 1:
+                        raise TypeError(f"Lambda expected 1 arg, got {len(args)}")
+                    lambda_node = func.node
+                    params, args = (lambda_node.param,), (args[0],)
+                    if not (owned and not lambda_node.captured
+                            and reuse_scope(env, lambda_node.layout, func.env, params, args)):
+                        env = new_scope(lambda_node.layout, func.env, params, args)
+                        owned = True
+                    node_or_nodes = lambda_node.body
+                    continue
+                if callable(func):
+                    args = [evaluate(arg, env) for arg in node_or_nodes.args]
+                    profiler = global_env(env).profiler
+                    if profiler is not None:
+                        profiler.call(node_or_nodes.name)
+                    return func(args)
+                raise TypeError(f"{node_or_nodes.name} is not a function")
+            args = [evaluate(arg, env) for arg in node_or_nodes.args]
+            if len(args) != len(func.params):
+                raise TypeError(f"Function {node_or_nodes.name} expected {len(func.params)} args, got {len(args)}")
+            if func.param_types is not None and not typed_call(node_or_nodes, func):
+                check_args(func.param_types, args)
+            if func.limits is not None:
+                func.limits.step()
+            if func.profiler is not None:
+                func.profiler.call(func.name)
+            elif func.compiled is not None:
+                return func.compiled(*args)
+            if func.countdown is not None:
+                warm(func)
+
+            if func.memo is not None:
+                key = func.memo.key(args)
+                if key is not None:
+                    result = func.memo.get(key)
+                    if result is MISSING:
+                        result = evaluate(func.body, new_scope(func.layout, func.closure_env, func.params, args))
+                        func.memo.put(key, result)
+                    return result
+
+            # a tail call that leaves a frame of the same function behind
+            # refills it
+            if not (owned and not func.captured
+                    and reuse_scope(env, func.layout, func.closure_env, func.params, args)):
+                env = new_scope(func.layout, func.closure_env, func.params, args)
+                owned = True
+            node_or_nodes = func.body
+            continue
+
+        elif isinstance(node_or_nodes, ClassNode):
+            env.set(node_or_nodes.name, node_or_nodes)
+            return None
+
+        elif isinstance(node_or_nodes, NewNode):
+            class_def = env.get(node_or_nodes.class_name)
+            if not isinstance(class_def, ClassNode):
+                raise TypeError(f"{node_or_nodes.class_name} is not a class")
 
-        if isinstance(expr, VariableNode):
-            return ("REF", env.get_var_ref(expr.name))
+            shape = class_shape(class_def)
+            values = list(shape.defaults)
+            args = node_or_nodes.args
+            for i in range(min(len(args), len(values))):
+                values[i] = evaluate(args[i], env)
+            return ObjectInstance(shape, values)
 
-        elif isinstance(expr, FieldAccessNode):
-            obj = evaluate(expr.obj, env)
-            field_name = expr.field_name
+        elif isinstance(node_or_nodes, MethodCallNode):
+            obj = evaluate(node_or_nodes.obj, env)
+            if not isinstance(obj, ObjectInstance):
+                raise TypeError("Can only call methods on objects")
 
+            cache = node_or_nodes.cache or method_cache(node_or_nodes)
+            if obj.shape is cache.shape:
+                cache.hits += 1
+                method = cache.entry
+            else:
+                method = cache.lookup(obj.shape, node_or_nodes.method_name)
+                if method is None:
+                    raise AttributeError(f"Method {node_or_nodes.method_name} not found")
+
+            args = [evaluate(arg, env) for arg in node_or_nodes.args]
+            root = global_env(env)
+            if root.profiler is not None:
+                root.profiler.call(f"{obj.shape.name}.{method.name}")
+            if root.limits is not None:
+                root.limits.step()
+            env = method_scope(obj, method, args, env, run_method)
+            node_or_nodes = method.body
+            continue
+
+        elif isinstance(node_or_nodes, FieldAccessNode):
+            obj = evaluate(node_or_nodes.obj, env)
             if not isinstance(obj, ObjectInstance):
                 raise TypeError("Can only access fields on objects")
-            if not hasattr(obj, 'field_env'):
-                raise AttributeError(f"Object does not have field environment")
-            if field_name not in obj.field_env.vars:
-                raise AttributeError(f"Field {field_name} not found")
+            cache = node_or_nodes.cache or field_cache(node_or_nodes)
+            if obj.shape is cache.shape:
+                cache.hits += 1
+                return obj.values[cache.entry]
+            slot = cache.lookup(obj.shape, node_or_nodes.field_name)
+            if slot is None:
+                raise AttributeError(f"Field {node_or_nodes.field_name} not found")
+            return obj.values[slot]
+
+        elif isinstance(node_or_nodes, VariableNode):
+            if node_or_nodes.depth is not None:
+                return lookup(env, node_or_nodes.depth, node_or_nodes.slot, node_or_nodes.name)
+            return env.get(node_or_nodes.name)
+
+        elif isinstance(node_or_nodes, AssignNode):
+            value = evaluate(node_or_nodes.value, env)
+
+            current_env = env
+            if node_or_nodes.depth is not None:
+                for _ in range(node_or_nodes.depth):
+                    current_env = current_env.parent
+                slot = node_or_nodes.slot
+                if slot is not None:
+                    if current_env.values[slot] is not UNSET:
+                        current_env.values[slot] = value
+                        return None
+                    current_env = current_env.parent
+
+            found = False
+            target_env = None
+
+            while current_env is not None:
+                if current_env.has(node_or_nodes.name):
+                    found = True
+                    target_env = current_env
+                    break
+                current_env = current_env.parent
+
+            if not found:
+                raise NameError(f"Variable '{node_or_nodes.name}' is not defined. Use 'let' to declare variables.")
+
+            target_env.set(node_or_nodes.name, value)
+            return None
 
-            return ("REF", (obj.field_env, field_name))
+        elif isinstance(node_or_nodes, LetNode):
+            if node_or_nodes.value is None:
+                return None
 
-        else:
-            raise TypeError("Only variable and field references are supported")
+            value = evaluate(node_or_nodes.value, env)
 
-    elif isinstance(node_or_nodes, AssignRefNode):
-        left_value = evaluate(node_or_nodes.ref_expr, env)
-        right_value = evaluate(node_or_nodes.value, env)
+            if node_or_nodes.type_node and not node_or_nodes.proven:
+                check_type(node_or_nodes.type_node.type_name, value)
 
-        if isinstance(left_value, tuple) and left_value[0] == "REF":
-            target_env, target_name = left_value[1]
-            target_env.set(target_name, right_value)
+            if node_or_nodes.slot is not None:
+                env.values[node_or_nodes.slot] = value
+            else:
+                env.set(node_or_nodes.name, value)
             return None
+
+        elif isinstance(node_or_nodes, BlockNode):
+            statements = node_or_nodes.statements
+            if not statements:
+                return None
+            if node_or_nodes.scoped:
+                env = new_scope(node_or_nodes.layout, env)
+                owned = True
+            for i in range(len(statements) - 1):
+                evaluate(statements[i], env)
+            node_or_nodes = statements[-1]
+            continue
+
+        elif isinstance(node_or_nodes, RefNode):
+            expr = node_or_nodes.expr
+
+            if isinstance(expr, VariableNode):
+                return ("REF", env.get_var_ref(expr.name))
+
+            elif isinstance(expr, FieldAccessNode):
+                obj = evaluate(expr.obj, env)
+                field_name = expr.field_name
+
+                if not isinstance(obj, ObjectInstance):
+                    raise TypeError("Can only access fields on objects")
+                if not obj.has(field_name):
+                    raise AttributeError(f"Field {field_name} not found")
+
+                return ("REF", (obj, field_name))
+
+            elif isinstance(expr, IndexNode):
+                element = ElementRef(location(expr.array, env))
+                index_val = evaluate(expr.index, env)
+                element.get(index_val)
+                return ("REF", (element, index_val))
+
+            else:
+                raise TypeError("Only variable, field and array element references are supported")
+
+        elif isinstance(node_or_nodes, AssignRefNode):
+            ref_expr = node_or_nodes.ref_expr
+            if isinstance(ref_expr, IndexNode):
+                element = ElementRef(location(ref_expr.array, env))
+                index_val = evaluate(ref_expr.index, env)
+                left_value = element.get(index_val)
+            else:
+                left_value = evaluate(ref_expr, env)
+            right_value = evaluate(node_or_nodes.value, env)
+
+            if isinstance(left_value, tuple) and left_value[0] == "REF":
+                target_env, target_name = left_value[1]
+                target_env.set(target_name, right_value)
+                return None
+            elif isinstance(ref_expr, IndexNode):
+                # an element that is not itself a reference is replaced
+                element.set(index_val, right_value)
+                return None
+            else:
+                raise TypeError("Left side of ':=' must evaluate to a reference")
+
+        elif isinstance(node_or_nodes, WhileNode):
+            return run_while(node_or_nodes, env)
+
+        elif isinstance(node_or_nodes, ForNode):
+            return run_for(node_or_nodes, env)
+
+        elif isinstance(node_or_nodes, NodeArena):
+            # the rebuilt tree lives only as long as this run, so inline
+            # caches and JIT translations start over on the next one
+            node_or_nodes = node_or_nodes.to_ast()
+            continue
+
+        else:
+            raise TypeError(f"Unknown node type: {type(node_or_nodes)}")
+
+
+# How a loop gives each iteration the body's block scope without building a
+# new Environment per iteration:
+#   'none'   a `while` body that declares nothing runs in the enclosing
+#            scope, which it cannot tell apart from an empty one
+#   'reuse'  one scope per loop, cleared between iterations
+#   'fresh'  a new scope per iteration, for bodies that can capture it
+def loop_scoping(node) -> str:
+    if node.scoping is None:
+        if isinstance(node, WhileNode) and not declared_names(node.body.statements):
+            node.scoping = 'none'
+        elif captures(node.body):
+            node.scoping = 'fresh'
         else:
-            raise TypeError("Left side of ':=' must evaluate to a reference")
+            node.scoping = 'reuse'
+    return node.scoping
 
+
+def clear_scope(scope: Environment, blank: list):
+    # Unbinds everything the last iteration bound; blank is [UNSET] * size
+    # for a SlotEnvironment.
+    if blank is None:
+        scope.vars.clear()
+        scope.version += 1
     else:
-        raise TypeError(f"Unknown node type: {type(node_or_nodes)}")
+        scope.values[:] = blank
+        scope.extra = None
+
+
+def run_while(node: WhileNode, env: Environment):
+    condition = node.condition
+    statements = node.body.statements
+    scoping = loop_scoping(node)
+    limits = global_env(env).limits
+    if scoping == 'none':
+        while evaluate(condition, env) != 0:
+            if limits is not None:
+                limits.step()
+            for stmt in statements:
+                evaluate(stmt, env)
+        return None
+    layout = node.layout
+    blank = [UNSET] * layout.size if layout is not None else None
+    scope = None
+    while evaluate(condition, env) != 0:
+        if limits is not None:
+            limits.step()
+        if scope is None or scoping == 'fresh':
+            scope = new_scope(layout, env)
+        else:
+            clear_scope(scope, blank)
+        for stmt in statements:
+            evaluate(stmt, scope)
+    return None
+
+
+def run_for(node: ForNode, env: Environment):
+    iterable = evaluate(node.iterable, env)
+    if not isinstance(iterable, ARRAY_TYPES):
+        raise TypeError("Can only loop over arrays")
+    name = node.name
+    params = (name,)
+    statements = node.body.statements
+    fresh = loop_scoping(node) == 'fresh'
+    layout = node.layout
+    blank = [UNSET] * layout.size if layout is not None else None
+    limits = global_env(env).limits
+    scope = None
+    for value in iterable:
+        if limits is not None:
+            limits.step()
+        if scope is None or fresh:
+            scope = new_scope(layout, env, params, (value,))
+        else:
+            clear_scope(scope, blank)
+            scope.set(name, value)
+        for stmt in statements:
+            evaluate(stmt, scope)
+    return None
+
+
+def checked_index(array_val, index_val) -> int:
+    if not isinstance(array_val, ARRAY_TYPES):
+        raise TypeError("Indexing only supported on arrays")
+    if not isinstance(index_val, int):
+        raise TypeError("Array index must be an integer")
+    if index_val < 0 or index_val >= len(array_val):
+        raise IndexError(f"Array index {index_val} out of bounds")
+    return index_val
+
+
+def location(node, env: Environment) -> tuple:
+    # (get, store) functions reading and rebinding the place node names: a
+    # variable, an object field, or an element of an array in one of those.
+    # Field receivers and indexes are evaluated once, here.
+    if isinstance(node, VariableNode):
+        scope, name = env.get_var_ref(node.name)
+        return lambda: scope.get(name), lambda value: scope.set(name, value)
+    if isinstance(node, FieldAccessNode):
+        obj = evaluate(node.obj, env)
+        if not isinstance(obj, ObjectInstance):
+            raise TypeError("Can only access fields on objects")
+        field_name = node.field_name
+        obj.get_field(field_name)
+        return lambda: obj.get_field(field_name), lambda value: obj.set(field_name, value)
+    if isinstance(node, IndexNode):
+        element = ElementRef(location(node.array, env))
+        index_val = evaluate(node.index, env)
+        element.get(index_val)
+        return lambda: element.get(index_val), lambda value: element.set(index_val, value)
+    raise TypeError("Left side of ':=' must be a variable, field, or array element")
+
+
+# The target of `ref a[i]` and `a[i] := v`, with the index as the name.
+# Arrays are values, so storing an element rebinds the array's location to
+# an updated PersistentVector, which shares all but one path with the old
+# one; whoever else holds the old array still sees it unchanged.
+class ElementRef:
+    __slots__ = ('array_get', 'array_store')
+
+    def __init__(self, array_location: tuple):
+        self.array_get, self.array_store = array_location
+
+    def get(self, index_val):
+        array_val = self.array_get()
+        return array_val[checked_index(array_val, index_val)]
+
+    def set(self, index_val, value):
+        array_val = self.array_get()
+        index_val = checked_index(array_val, index_val)
+        if not isinstance(array_val, PersistentVector):
+            array_val = PersistentVector.from_list(array_val)
+        self.array_store(array_val.set(index_val, value))
+
+
+def check_type(expected_type: str, value: Any) -> Any:
+    if expected_type == 'int':
+        if not isinstance(value, int):
+            raise TypeError(f"Expected int, got {type(value).__name__}")
+    elif expected_type == 'bool':
+        if not isinstance(value, int):
+            raise TypeError(f"Expected bool (as int), got {type(value).__name__}")
+    elif expected_type == 'string':
+        if not isinstance(value, STRING_TYPES):
+            raise TypeError(f"Expected string, got {type(value).__name__}")
+    return value
+
+
+# Parameter annotations are checked when a function or method is called,
+# like a `let` annotation when it binds.
+def check_args(param_types: list, args: list):
+    for expected_type, value in zip(param_types, args):
+        if expected_type is not None:
+            check_type(expected_type, value)
+
+
+# Whether infer_types proved a call's arguments have exactly the types the
+# callee's annotations check, so check_args cannot fail.
+def typed_call(node: CallNode, func: FunctionNode) -> bool:
+    return node.arg_types is not None and node.arg_types == func.checked_types
+
+
+# Counts a call of a function defined with the JIT enabled; the call that
+# reaches the threshold translates it (see src/jit.py), and later calls run
+# the translation. Functions the JIT cannot translate stay interpreted.
+def warm(func: FunctionNode):
+    func.countdown -= 1
+    if func.countdown <= 0:
+        from .jit import compile_function  # src.jit imports this module
+        func.countdown = None
+        func.compiled = compile_function(func)
+
+
+# Runs a named function on evaluated arguments outside evaluate's tail-call
+# loop, the way a CallNode would.
+def invoke_function(func: FunctionNode, args: list) -> Any:
+    if func.param_types is not None:
+        check_args(func.param_types, args)
+    if func.limits is not None:
+        func.limits.step()
+    if func.compiled is not None:
+        return func.compiled(*args)
+    if func.countdown is not None:
+        warm(func)
+    if func.memo is not None:
+        key = func.memo.key(args)
+        if key is not None:
+            result = func.memo.get(key)
+            if result is MISSING:
+                result = evaluate(func.body, new_scope(func.layout, func.closure_env, func.params, args))
+                func.memo.put(key, result)
+            return result
+    return evaluate(func.body, new_scope(func.layout, func.closure_env, func.params, args))
+
+
+RECURSION_LIMIT = 1_000_000
+STACK_SIZE = 512 * 1024 * 1024
+
+
+# Non-tail calls still nest evaluate frames. CPython keeps those frames on
+# its own heap-allocated stack, so running on a thread with a large native
+# stack and a lifted recursion limit bounds the depth by memory rather than
+# by the default limit of 1000.
+def run_deep(func, *args):
+    outcome = {}
+
+    def target():
+        try:
+            outcome['value'] = func(*args)
+        except BaseException as e:
+            outcome['error'] = e
+
+    old_limit = sys.getrecursionlimit()
+    old_stack_size = threading.stack_size()
+    sys.setrecursionlimit(max(old_limit, RECURSION_LIMIT))
+    try:
+        threading.stack_size(STACK_SIZE)
+        thread = threading.Thread(target=target)
+        thread.start()
+        thread.join()
+    finally:
+        threading.stack_size(old_stack_size)
+        sys.setrecursionlimit(old_limit)
+
+    if 'error' in outcome:
+        raise outcome['error']
+    return outcome.get('value')
+
+
+# Lets builtins call named functions as well as lambdas and Python
+# callables such as VM closures.
+def call_function(func, args: list) -> Any:
+    if isinstance(func, FunctionNode):
+        if len(args) != len(func.params):
+            raise TypeError(f"Function {func.name} expected {len(func.params)} args, got {len(args)}")
+        return invoke_function(func, args)
+    if type(func) is LambdaClosure and len(args) != 1:
+        raise TypeError(f"Lambda expected 1 arg, got {len(args)}")
+    if callable(func):
+        return func(args)
+    raise TypeError(f"{func} is not a function")
+
+
+# Lambdas whose body is plain arithmetic on their parameter expose a
+# MapKernel, which maps the whole array at once instead of calling the
+# lambda per element.
+def builtin_map(args):
+    func = args[0]
+    arr = args[1]
+    kernel = getattr(func, 'kernel', None)
+    if kernel is not None:
+        return kernel(arr)
+    return [call_function(func, [x]) for x in arr]
 
 
-def builtin_map(args):
+def builtin_filter(args):
     func = args[0]
     arr = args[1]
-    return [func([x]) for x in arr]
+    result = [x for x in arr if call_function(func, [x]) != 0]
+    return make_array(result) if isinstance(arr, NumArray) else result
 
 
-def create_global_env():
+# reduce(f, array, initial) folds from the left; f takes two arguments.
+def builtin_reduce(args):
+    func = args[0]
+    acc = args[2]
+    for x in args[1]:
+        acc = call_function(func, [acc, x])
+    return acc
+
+
+def create_global_env(memoize: bool = False, memo_size: int = DEFAULT_MEMO_SIZE,
+                      chunk_size: int = None, parallel_threshold: int = None,
+                      jit: bool = False, jit_threshold: int = DEFAULT_JIT_THRESHOLD, limits=None):
+    # With memoize=True, functions marked pure by purity.analyze_purity get a
+    # MemoCache of memo_size entries when they are defined. chunk_size and
+    # parallel_threshold tune pmap/pfilter/preduce (see src/parallel.py).
+    # With jit=True, other named functions are translated to Python after
+    # jit_threshold calls (see src/jit.py). With limits (a limits.Limits),
+    # every call and loop iteration of the run is charged to it; the JIT is
+    # off, and pmap/pfilter/preduce run serially, since pool workers could
+    # not charge it.
+    from .parallel import parallel_builtins  # src.parallel imports this module
+
+    if memoize and memo_size <= 0:
+        raise ValueError("memo_size must be positive")
+    if jit and jit_threshold <= 0:
+        raise ValueError("jit_threshold must be positive")
     env = Environment()
+    env.memo_size = memo_size if memoize else None
+    env.jit_threshold = jit_threshold if jit else None
+    env.limits = limits
     env.set('map', builtin_map)
-    return env
\ No newline at end of file
+    env.set('filter', builtin_filter)
+    env.set('reduce', builtin_reduce)
+    for name, builtin in parallel_builtins(chunk_size, parallel_threshold).items():
+        env.set(name, builtin)
+    if limits is not None:
+        env.set('pmap', builtin_map)
+        env.set('pfilter', builtin_filter)
+        env.set('preduce', builtin_reduce)
+    return env
+
+
+def memo_stats(env: Environment) -> dict:
+    stats = {}
+    for name, value in env.vars.items():
+        if isinstance(value, FunctionNode) and value.memo is not None:
+            stats[name] = value.memo.stats()
+    return stats
\ No newline at end of file
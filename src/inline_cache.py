@@ -0,0 +1,116 @@
+from .ast_nodes import CallNode, FieldAccessNode, MethodCallNode, iter_child_nodes
+
+POLYMORPHIC_LIMIT = 4
+
+
+class ShapeCache:
+    # Inline cache for a field-access or method-call site, keyed by the
+    # receiver's ClassShape. The first shape seen is kept in `shape`/`entry`
+    # and checked by the caller inline; up to POLYMORPHIC_LIMIT further shapes
+    # go to `polymorphic`. Past that the site is megamorphic and every other
+    # shape is looked up by name and counted as a miss; `megamorphic` is set
+    # by the first such shape. Shapes never change once built, so entries
+    # stay valid for the life of the program.
+    __slots__ = ('table', 'shape', 'entry', 'polymorphic', 'megamorphic', 'hits', 'misses')
+
+    def __init__(self, table: str):
+        self.table = table
+        self.shape = None
+        self.entry = None
+        self.polymorphic = None
+        self.megamorphic = False
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, shape, name: str):
+        if shape is self.shape:
+            self.hits += 1
+            return self.entry
+        if self.polymorphic is not None and shape in self.polymorphic:
+            self.hits += 1
+            return self.polymorphic[shape]
+
+        self.misses += 1
+        entry = getattr(shape, self.table).get(name)
+        if entry is None:
+            return None
+        if self.shape is None:
+            self.shape = shape
+            self.entry = entry
+        elif self.polymorphic is None:
+            self.polymorphic = {shape: entry}
+        elif len(self.polymorphic) < POLYMORPHIC_LIMIT:
+            self.polymorphic[shape] = entry
+        else:
+            self.megamorphic = True
+        return entry
+
+    @property
+    def state(self) -> str:
+        if self.shape is None:
+            return 'uninitialized'
+        if self.megamorphic:
+            return 'megamorphic'
+        if self.polymorphic is None:
+            return 'monomorphic'
+        return 'polymorphic'
+
+
+class CallCache:
+    # Inline cache for a call site whose name the resolver placed in a
+    # dict-backed scope. It remembers that scope and its version; any write
+    # to the scope bumps the version and the next call looks the name up again.
+    __slots__ = ('env', 'version', 'func', 'hits', 'misses')
+
+    def __init__(self):
+        self.env = None
+        self.version = -1
+        self.func = None
+        self.hits = 0
+        self.misses = 0
+
+    def fill(self, env, name: str):
+        self.misses += 1
+        func = env.get(name)
+        if env.has(name):
+            self.env = env
+            self.version = env.version
+            self.func = func
+        else:
+            self.env = None
+        return func
+
+
+def field_cache(node: FieldAccessNode) -> ShapeCache:
+    if node.cache is None:
+        node.cache = ShapeCache('slots')
+    return node.cache
+
+
+def method_cache(node: MethodCallNode) -> ShapeCache:
+    if node.cache is None:
+        node.cache = ShapeCache('methods')
+    return node.cache
+
+
+def _collect(node, stats: dict):
+    if isinstance(node, (CallNode, FieldAccessNode, MethodCallNode)) and node.cache is not None:
+        kind = {CallNode: 'call', FieldAccessNode: 'field', MethodCallNode: 'method'}[type(node)]
+        totals = stats[kind]
+        totals['sites'] += 1
+        totals['hits'] += node.cache.hits
+        totals['misses'] += node.cache.misses
+        if isinstance(node.cache, ShapeCache):
+            totals[node.cache.state] = totals.get(node.cache.state, 0) + 1
+    for child in iter_child_nodes(node):
+        _collect(child, stats)
+
+
+def inline_cache_stats(ast) -> dict:
+    # Hit and miss counts per kind of site, plus a hit rate between 0 and 1.
+    stats = {kind: {'sites': 0, 'hits': 0, 'misses': 0} for kind in ('call', 'field', 'method')}
+    _collect(ast, stats)
+    for totals in stats.values():
+        lookups = totals['hits'] + totals['misses']
+        totals['hit_rate'] = totals['hits'] / lookups if lookups else 0.0
+    return stats
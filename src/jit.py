@@ -0,0 +1,403 @@
+from typing import Any
+from weakref import WeakKeyDictionary
+from .ast_nodes import NumberNode, StringNode, BinaryOpNode, FunctionNode, CallNode, IfNode, VariableNode, \
+    LetNode, BlockNode, AssignNode, ArrayNode, IndexNode, WhileNode, ForNode
+from .evaluator import check_type, invoke_function
+from .numarray import ARRAY_TYPES, make_array
+from .rope import STRING_TYPES, concat
+
+# Second tier for hot named functions: a function's body is translated once
+# into Python source, compiled with compile()/exec, and the evaluator calls
+# the result instead of walking the body (see evaluator.warm). Parameters
+# and lets become Python locals, names from enclosing scopes are read from
+# the closure Environment, and self-calls in tail position become a loop.
+# Bodies with nodes the translator does not handle (lambdas, nested
+# functions, objects, references) are left to the interpreter.
+
+ARITHMETIC_OPS = {'PLUS': '+', 'MINUS': '-', 'MUL': '*'}
+COMPARE_OPS = {
+    'EQUALS': '==', 'NOT_EQUALS': '!=', 'LESS': '<',
+    'LESS_EQ': '<=', 'GREATER': '>', 'GREATER_EQ': '>=',
+}
+STATEMENT_NODES = (LetNode, AssignNode)
+
+
+class Untranslatable(Exception):
+    pass
+
+
+# Helpers the generated code calls; each raises the same errors as the
+# matching branch of evaluate.
+
+def _callee(name: str, func: Any) -> Any:
+    if not isinstance(func, FunctionNode) and not callable(func):
+        raise TypeError(f"{name} is not a function")
+    return func
+
+
+def _call(name: str, func: Any, args: list) -> Any:
+    if isinstance(func, FunctionNode):
+        if len(args) != len(func.params):
+            raise TypeError(f"Function {name} expected {len(func.params)} args, got {len(args)}")
+        return invoke_function(func, args)
+    return func(args)
+
+
+def _div(left: Any, right: Any) -> Any:
+    if right == 0:
+        raise ZeroDivisionError("Division by zero")
+    return left / right
+
+
+def _add(left: Any, right: Any) -> Any:
+    if isinstance(left, STRING_TYPES):
+        return concat(left, right)
+    return left + right
+
+
+def _index(array: Any, index: Any) -> Any:
+    if not isinstance(array, ARRAY_TYPES):
+        raise TypeError("Indexing only supported on arrays")
+    if not isinstance(index, int):
+        raise TypeError("Array index must be an integer")
+    if index < 0 or index >= len(array):
+        raise IndexError(f"Array index {index} out of bounds")
+    return array[index]
+
+
+def _assign(env, name: str, value: Any):
+    while env is not None:
+        if env.has(name):
+            env.set(name, value)
+            return None
+        env = env.parent
+    raise NameError(f"Variable '{name}' is not defined. Use 'let' to declare variables.")
+
+
+def _iterate(array: Any) -> Any:
+    if not isinstance(array, ARRAY_TYPES):
+        raise TypeError("Can only loop over arrays")
+    return array
+
+
+HELPERS = {
+    '_callee': _callee, '_call': _call, '_div': _div, '_add': _add, '_concat': concat, '_index': _index,
+    '_assign': _assign,
+    '_array': make_array, '_check_type': check_type, '_iterate': _iterate,
+}
+
+
+# Emits the Python source of one function. Expressions translate to Python
+# expressions; blocks, lets, assignments and `if`s whose branches need
+# statements are emitted as statements before the expression that uses
+# their value, with earlier operands saved to temporaries first so they are
+# still evaluated left to right.
+class _Translator:
+    def __init__(self, func: FunctionNode):
+        self.func = func
+        self.lines = []
+        self.depth = 3
+        self.scopes = []
+        self.counter = 0
+        self.temps = set()
+        self.locals = set()
+        self.constants = {}
+
+    def translate(self) -> str:
+        func = self.func
+        params = {name: self._fresh(name) for name in func.params}
+        self.params = [params[name] for name in func.params]
+        self.scopes.append(params)
+        self._tail(func.body)
+        header = [
+            "def _make(_env, _self):",
+            "    _get = _env.get",
+            f"    def jit_{func.name}({', '.join(self.params)}):",
+            "        while True:",
+        ]
+        return "\n".join(header + self.lines + [f"    return jit_{func.name}", ""])
+
+    def _fresh(self, name: str) -> str:
+        self.counter += 1
+        local = f"v{self.counter}_{name}"
+        self.locals.add(local)
+        return local
+
+    def _temp(self) -> str:
+        self.counter += 1
+        temp = f"_t{self.counter}"
+        self.temps.add(temp)
+        return temp
+
+    def _constant(self, value) -> str:
+        if type(value) is int:
+            return repr(value)
+        key = (type(value), value)
+        if key not in self.constants:
+            self.constants[key] = (f"_k{len(self.constants)}", value)
+        return self.constants[key][0]
+
+    def _emit(self, line: str):
+        self.lines.append("    " * self.depth + line)
+
+    def _local(self, name: str):
+        for scope in reversed(self.scopes):
+            if name in scope:
+                return scope[name]
+        return None
+
+    def _stable(self, value: str) -> bool:
+        # Whether later statements can leave value unchanged.
+        return value in self.temps or value.lstrip('-').isdigit() or value.startswith('_k')
+
+    def _operands(self, items: list) -> list:
+        # Python expressions for each item (a node, or an expression string),
+        # evaluated left to right even when a later item emits statements.
+        values = []
+        for item in items:
+            mark = len(self.lines)
+            value = item if isinstance(item, str) else self._expr(item)
+            if len(self.lines) > mark:
+                for i, earlier in enumerate(values):
+                    if not self._stable(earlier):
+                        temp = self._temp()
+                        self.lines.insert(mark, "    " * self.depth + f"{temp} = {earlier}")
+                        mark += 1
+                        values[i] = temp
+            values.append(value)
+        return values
+
+    def _branch(self, node, translate=None) -> tuple:
+        # Lines and value of node emitted one level deeper, for an `if` arm
+        # or a loop condition.
+        outer = self.lines
+        self.lines = []
+        self.depth += 1
+        try:
+            value = (translate or self._expr)(node)
+            return self.lines, value
+        finally:
+            self.lines = outer
+            self.depth -= 1
+
+    def _loop_body(self, body: BlockNode, scope: dict):
+        # Each iteration's lets get fresh locals, like the fresh scope the
+        # interpreter gives every iteration.
+        self.depth += 1
+        self.scopes.append(scope)
+        mark = len(self.lines)
+        try:
+            for stmt in body.statements:
+                self._statement(stmt)
+            if len(self.lines) == mark:
+                self._emit("pass")
+        finally:
+            self.scopes.pop()
+            self.depth -= 1
+
+    def _cond(self, node) -> str:
+        if isinstance(node, BinaryOpNode) and node.op in COMPARE_OPS:
+            left, right = self._operands([node.left, node.right])
+            return f"{left} {COMPARE_OPS[node.op]} {right}"
+        return f"{self._expr(node)} != 0"
+
+    def _callee_expr(self, name: str) -> str:
+        local = self._local(name)
+        if local is not None:
+            return f"_callee({name!r}, {local})"
+        return f"_callee({name!r}, _get({name!r}))"
+
+    def _expr(self, node) -> str:
+        if isinstance(node, (NumberNode, StringNode)):
+            return self._constant(node.value)
+        elif isinstance(node, VariableNode):
+            local = self._local(node.name)
+            return local if local is not None else f"_get({node.name!r})"
+        elif isinstance(node, BinaryOpNode):
+            if node.op in COMPARE_OPS:
+                return f"(1 if {self._cond(node)} else 0)"
+            if node.op not in ARITHMETIC_OPS and node.op != 'DIV':
+                raise Untranslatable(f"operator {node.op}")
+            left, right = self._operands([node.left, node.right])
+            if node.op == 'DIV':
+                return f"_div({left}, {right})"
+            if node.op == 'PLUS':
+                # strings concatenate into ropes; a number on either side
+                # rules strings out, and otherwise ints are tested inline
+                if node.operand_type == 'string' or isinstance(node.left, StringNode) \
+                        or isinstance(node.right, StringNode):
+                    return f"_concat({left}, {right})"
+                if node.operand_type != 'int' and not isinstance(node.left, NumberNode) \
+                        and not isinstance(node.right, NumberNode):
+                    if left.isidentifier():
+                        return f"({left} + {right} if {left}.__class__ is int else _add({left}, {right}))"
+                    return f"_add({left}, {right})"
+            return f"({left} {ARITHMETIC_OPS[node.op]} {right})"
+        elif isinstance(node, IfNode):
+            cond = self._cond(node.condition)
+            then_lines, then_value = self._branch(node.then_branch)
+            else_lines, else_value = self._branch(node.else_branch)
+            if not then_lines and not else_lines:
+                return f"({then_value} if {cond} else {else_value})"
+            result = self._temp()
+            self._emit(f"if {cond}:")
+            self.lines.extend(then_lines)
+            self._emit(f"    {result} = {then_value}")
+            self._emit("else:")
+            self.lines.extend(else_lines)
+            self._emit(f"    {result} = {else_value}")
+            return result
+        elif isinstance(node, CallNode):
+            callee, *args = self._operands([self._callee_expr(node.name)] + node.args)
+            return f"_call({node.name!r}, {callee}, [{', '.join(args)}])"
+        elif isinstance(node, ArrayNode):
+            return f"_array([{', '.join(self._operands(node.elements))}])"
+        elif isinstance(node, IndexNode):
+            array, index = self._operands([node.array, node.index])
+            return f"_index({array}, {index})"
+        elif isinstance(node, BlockNode):
+            if not node.statements:
+                return "None"
+            self.scopes.append({})
+            try:
+                for stmt in node.statements[:-1]:
+                    self._statement(stmt)
+                last = node.statements[-1]
+                if isinstance(last, STATEMENT_NODES):
+                    self._statement(last)
+                    return "None"
+                return self._expr(last)
+            finally:
+                self.scopes.pop()
+        elif isinstance(node, AssignNode):
+            self._statement(node)
+            return "None"
+        elif isinstance(node, WhileNode):
+            cond_lines, cond = self._branch(node.condition, self._cond)
+            if cond_lines:
+                # the condition needs statements, so it is tested inside
+                self._emit("while True:")
+                self.lines.extend(cond_lines)
+                self._emit(f"    if not ({cond}):")
+                self._emit("        break")
+            else:
+                self._emit(f"while {cond}:")
+            self._loop_body(node.body, {})
+            return "None"
+        elif isinstance(node, ForNode):
+            array = self._expr(node.iterable)
+            local = self._fresh(node.name)
+            self._emit(f"for {local} in _iterate({array}):")
+            self._loop_body(node.body, {node.name: local})
+            return "None"
+        # a let outside a block binds in whichever scope is current when
+        # it runs, which has no fixed Python local
+        raise Untranslatable(type(node).__name__)
+
+    def _statement(self, node):
+        if isinstance(node, LetNode):
+            if node.value is None:
+                return
+            value = self._expr(node.value)
+            if node.type_node and not node.proven:
+                value = f"_check_type({node.type_node.type_name!r}, {value})"
+            local = self._fresh(node.name)
+            self._emit(f"{local} = {value}")
+            self.scopes[-1][node.name] = local
+        elif isinstance(node, AssignNode):
+            value = self._expr(node.value)
+            local = self._local(node.name)
+            if local is not None:
+                self._emit(f"{local} = {value}")
+            else:
+                self._emit(f"_assign(_env, {node.name!r}, {value})")
+        else:
+            # reads of locals and constants have no effect; anything else
+            # can raise, so it still runs
+            value = self._expr(node)
+            if not self._stable(value) and value not in self.locals and value != "None":
+                self._emit(value)
+
+    def _tail(self, node):
+        if isinstance(node, IfNode):
+            cond = self._cond(node.condition)
+            self._emit(f"if {cond}:")
+            self.depth += 1
+            self._tail(node.then_branch)
+            self.depth -= 1
+            self._emit("else:")
+            self.depth += 1
+            self._tail(node.else_branch)
+            self.depth -= 1
+        elif isinstance(node, BlockNode) and node.statements:
+            self.scopes.append({})
+            for stmt in node.statements[:-1]:
+                self._statement(stmt)
+            last = node.statements[-1]
+            if isinstance(last, STATEMENT_NODES):
+                self._statement(last)
+                self._emit("return None")
+            else:
+                self._tail(last)
+            self.scopes.pop()
+        elif (isinstance(node, CallNode) and node.name == self.func.name and self._local(node.name) is None
+              and len(node.args) == len(self.func.params)):
+            # A self-call in tail position rebinds the parameters and loops
+            # while the name still refers to this function.
+            callee, *args = self._operands([self._callee_expr(node.name)] + node.args)
+            saved = []
+            for arg in [callee] + args:
+                if arg in self.temps:
+                    saved.append(arg)
+                else:
+                    temp = self._temp()
+                    self._emit(f"{temp} = {arg}")
+                    saved.append(temp)
+            callee, *args = saved
+            self._emit(f"if {callee} is _self:")
+            for expected_type, arg in zip(self.func.param_types or (), args):
+                if expected_type is not None:
+                    self._emit(f"    _check_type({expected_type!r}, {arg})")
+            if args:
+                self._emit(f"    {', '.join(self.params)} = {', '.join(args)}")
+            self._emit("    continue")
+            self._emit(f"return _call({node.name!r}, {callee}, [{', '.join(args)}])")
+        else:
+            self._emit(f"return {self._expr(node)}")
+
+
+def translate(func: FunctionNode) -> str:
+    # The Python source the JIT would compile for func; raises Untranslatable
+    # when the body uses a construct it leaves to the interpreter.
+    return _Translator(func).translate()
+
+
+# Factories per function body: every closure created from one definition
+# shares the compiled code and binds its own Environment. None marks bodies
+# that could not be translated.
+_factories = WeakKeyDictionary()
+
+
+def _factory(func: FunctionNode):
+    if func.body in _factories:
+        return _factories[func.body]
+    try:
+        translator = _Translator(func)
+        source = translator.translate()
+    except (Untranslatable, RecursionError):
+        _factories[func.body] = None
+        return None
+    namespace = dict(HELPERS)
+    namespace.update(translator.constants.values())
+    exec(compile(source, f"<jit {func.name}>", 'exec'), namespace)
+    factory = _factories[func.body] = namespace['_make']
+    return factory
+
+
+def compile_function(func: FunctionNode):
+    # A Python function taking func's arguments and returning its result, or
+    # None when func stays interpreted.
+    factory = _factory(func)
+    if factory is None:
+        return None
+    return factory(func.closure_env, func)
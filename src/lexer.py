@@ -1,30 +1,37 @@
+import mmap
 import re
-from typing import List
+from typing import Iterator, List
+
+KEYWORDS = {
+    'class': 'CLASS',
+    'new': 'NEW',
+    'func': 'FUNC',
+    'if': 'IF',
+    'then': 'THEN',
+    'else': 'ELSE',
+    'let': 'LET',
+    'ref': 'REF',
+    'lambda': 'LAMBDA',
+    'while': 'WHILE',
+    'for': 'FOR',
+    'in': 'IN',
+    'int': 'INT',
+    'bool': 'BOOL',
+    'string': 'STRING_TYPE',
+    'true': 'TRUE',
+    'false': 'FALSE',
+}
 
 TOKENS = [
-    ('CLASS', r'class\b'),
-    ('NEW', r'new\b'),
-    ('FUNC', r'func\b'),
-    ('IF', r'if\b'),
-    ('THEN', r'then\b'),
-    ('ELSE', r'else\b'),
-    ('LET', r'let\b'),
-    ('REF', r'ref\b'),
-    ('LAMBDA', r'lambda\b'),
-    ('INT', r'int\b'),
-    ('BOOL', r'bool\b'),
-    ('STRING_TYPE', r'string\b'),
-    ('TRUE', r'true\b'),
-    ('FALSE', r'false\b'),
+    ('IDENTIFIER', r'[a-zA-Z_][a-zA-Z0-9_]*'),
+    ('NUMBER', r'\d*\.\d+|\d+\.|\d+'),
     ('LBRACE', r'\{'),
     ('RBRACE', r'\}'),
     ('LBRACKET', r'\['),
     ('RBRACKET', r'\]'),
     ('ARROW', r'->'),
     ('SEMICOLON', r';'),
-    ('NUMBER', r'\d*\.\d+|\d+\.|\d+'),
     ('STRING', r'"[^"]*"'),
-    ('IDENTIFIER', r'[a-zA-Z_][a-zA-Z0-9_]*'),
     ('PLUS', r'\+'),
     ('MINUS', r'-'),
     ('MUL', r'\*'),
@@ -42,32 +49,133 @@ TOKENS = [
     ('COMMA', r','),
     ('DOT', r'\.'),
     ('COLON', r':'),
-    ('WHITESPACE', r'\s+'),
 ]
 
-TOKEN_REGEX = '|'.join(f'(?P<{name}>{pattern})' for name, pattern in TOKENS)
+# Leading whitespace is consumed by the same match as the token after it, so
+# each token costs one match; the token itself is the group named by its kind.
+TOKEN_REGEX = r'\s*(?:' + '|'.join(f'(?P<{name}>{pattern})' for name, pattern in TOKENS) + ')'
+TOKEN_PATTERN = re.compile(TOKEN_REGEX)
+BYTES_TOKEN_PATTERN = re.compile(TOKEN_REGEX.encode())
+KINDS = (None,) + tuple(name for name, _ in TOKENS)
+
+# Characters that start a token but are not one on their own; when a chunk
+# ends on one of them the scanner waits for more input before failing.
+PARTIAL_STARTS = '"!'
+CHUNK_SIZE = 1 << 16
+
 
 class Token:
-    def __init__(self, type_: str, value: str):
+    __slots__ = ('type', 'value', 'line', 'column')
+
+    def __init__(self, type_: str, value, line: int = 0, column: int = 0):
         self.type = type_
         self.value = value
+        self.line = line
+        self.column = column
 
     def __repr__(self):
         return f"Token({self.type}, {self.value})"
 
+
+def _read_chunks(source, chunk_size: int):
+    while True:
+        chunk = source.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def _scan(chunks) -> Iterator[Token]:
+    # Scans one chunk at a time. A token that touches the end of a chunk may
+    # continue in the next one, so it is carried over and rescanned. Bytes
+    # input is matched with the bytes pattern and decoded token by token, so
+    # columns count bytes there.
+    chunks = iter(chunks)
+    chunk = next(chunks, None)
+    binary = chunk is not None and not isinstance(chunk, str)
+    finditer = (BYTES_TOKEN_PATTERN if binary else TOKEN_PATTERN).finditer
+    newline = b'\n' if binary else '\n'
+    keywords = KEYWORDS
+    kinds = KINDS
+    line = 1
+    line_start = 0
+    base = 0
+    leftover = None
+
+    while chunk is not None:
+        following = next(chunks, None)
+        final = following is None
+        buffer = leftover + chunk if leftover else chunk
+        end = len(buffer)
+        pos = 0
+        truncated = False
+
+        for match in finditer(buffer):
+            if match.start() != pos:
+                break
+            group = match.lastindex
+            start, stop = match.span(group)
+            if stop == end and not final:
+                truncated = True
+                break
+
+            if start != pos:
+                space = buffer[pos:start]
+                last_newline = space.rfind(newline)
+                if last_newline >= 0:
+                    line += space.count(newline)
+                    line_start = base + pos + last_newline + 1
+            pos = stop
+
+            kind = kinds[group]
+            value = match.group(group)
+            if binary:
+                value = value.decode()
+            column = base + start - line_start + 1
+            if kind == 'IDENTIFIER':
+                kind = keywords.get(value, 'IDENTIFIER')
+            elif kind == 'NUMBER':
+                value = float(value) if '.' in value else int(value)
+            elif kind == 'STRING':
+                yield Token(kind, value[1:-1], line, column)
+                newlines = value.count('\n')
+                if newlines:
+                    line += newlines
+                    line_start = base + start + value.rindex('\n') + 1
+                continue
+            yield Token(kind, value, line, column)
+
+        if pos < end and not truncated:
+            rest = buffer[pos:]
+            stripped = rest.lstrip()
+            if stripped:
+                char = stripped[:1]
+                if binary:
+                    char = char.decode(errors='replace')
+                if final or char not in PARTIAL_STARTS:
+                    error_pos = pos + len(rest) - len(stripped)
+                    space = rest[:error_pos - pos]
+                    last_newline = space.rfind(newline)
+                    if last_newline >= 0:
+                        line += space.count(newline)
+                        line_start = base + pos + last_newline + 1
+                    column = base + error_pos - line_start + 1
+                    raise SyntaxError(f"Unexpected character {char!r} at line {line}, column {column}")
+        leftover = buffer[pos:] if pos < end else None
+        base += pos
+        chunk = following
+
+
+def iter_tokens(source, chunk_size: int = CHUNK_SIZE) -> Iterator[Token]:
+    # `source` is a string, a bytes-like object such as an mmap, or a
+    # file-like object opened in text or binary mode. File input is read in
+    # chunks of `chunk_size`, so tokens are produced without loading it all.
+    if isinstance(source, (str, bytes, bytearray, mmap.mmap)):
+        return _scan((source,))
+    if hasattr(source, 'read'):
+        return _scan(_read_chunks(source, chunk_size))
+    raise TypeError(f"Cannot tokenize {type(source).__name__}")
+
+
 def tokenize(text: str) -> List[Token]:
-    tokens = []
-    for match in re.finditer(TOKEN_REGEX, text):
-        kind = match.lastgroup
-        value = match.group()
-        if kind == 'WHITESPACE':
-            continue
-        elif kind == 'NUMBER':
-            if '.' in value:
-                value = float(value)
-            else:
-                value = int(value)
-        elif kind == 'STRING':
-            value = value[1:-1]
-        tokens.append(Token(kind, value))
-    return tokens
\ No newline at end of file
+    return list(iter_tokens(text))
@@ -0,0 +1,70 @@
+from math import isfinite
+from time import monotonic
+from typing import Any
+from .evaluator import evaluate, global_env
+
+# Steps between wall-clock checks, so a step is one counter increment and
+# one comparison.
+CHECK_INTERVAL = 1000
+
+
+class LimitExceeded(RuntimeError):
+    pass
+
+
+class StepLimitExceeded(LimitExceeded):
+    pass
+
+
+class DeadlineExceeded(LimitExceeded):
+    pass
+
+
+# A step budget and a wall-clock timeout for one run at a time. `evaluate`
+# charges a step per call and per loop iteration to the Limits its global
+# environment was created with (create_global_env(limits=...)), and
+# VirtualMachine(limits=...) one step per instruction. Unlimited runs, and
+# other runs in the same process, are unaffected. Either limit may be None.
+class Limits:
+    def __init__(self, max_steps: int = None, timeout: float = None):
+        if max_steps is not None and not (isfinite(max_steps) and max_steps > 0):
+            raise ValueError("max_steps must be positive")
+        if timeout is not None and not (isfinite(timeout) and timeout > 0):
+            raise ValueError("timeout must be positive")
+        self.max_steps = max_steps
+        self.timeout = timeout
+        self.steps = 0
+        self._deadline = None
+        self._next_check = 0
+
+    def start(self):
+        # Resets the step count and starts the clock.
+        self.steps = 0
+        self._deadline = monotonic() + self.timeout if self.timeout is not None else None
+        self._schedule()
+
+    def _schedule(self):
+        next_check = self.steps + CHECK_INTERVAL if self._deadline is not None else float('inf')
+        if self.max_steps is not None:
+            next_check = min(next_check, self.max_steps + 1)
+        self._next_check = next_check
+
+    def step(self):
+        self.steps += 1
+        if self.steps >= self._next_check:
+            self._check()
+
+    def _check(self):
+        if self.max_steps is not None and self.steps > self.max_steps:
+            raise StepLimitExceeded(f"Step limit of {self.max_steps} exceeded")
+        if self._deadline is not None and monotonic() > self._deadline:
+            raise DeadlineExceeded(f"Timeout of {self.timeout}s exceeded after {self.steps} steps")
+        self._schedule()
+
+    def evaluate(self, ast, env) -> Any:
+        # Runs `evaluate` in the calling thread (wrap in run_deep for deep
+        # recursion); env must have been created with these limits.
+        if global_env(env).limits is not self:
+            raise ValueError("env was not created with these limits")
+        self.start()
+        return evaluate(ast, env)
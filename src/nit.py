@@ -0,0 +1,157 @@
+import threading
+from typing import Any, Iterable, Iterator
+
+from .lexer import tokenize
+from .parser import Parser
+from .optimizer import optimize
+from .resolver import resolve
+from .escape import analyze_scopes
+from .typeinfer import infer_types
+from .purity import analyze_purity
+from .limits import Limits
+from .rope import flatten
+from .evaluator import evaluate, create_global_env, run_deep, MemoCache, MISSING, DEFAULT_MEMO_SIZE, \
+    DEFAULT_JIT_THRESHOLD
+
+# Embedding API: compile a program once, then run it against many sets of
+# input bindings.
+#
+#     from src import nit
+#     program = nit.compile("price * (1 - discount)")
+#     program.run({'price': 120, 'discount': 0.25})
+#     for total in program.run_many(orders): ...
+#
+# Every run gets fresh globals from create_global_env, with the bindings set
+# on top of the builtins, so runs cannot see each other's lets, functions or
+# memo caches. compile() keeps the most recently used programs in an LRU
+# cache keyed by source and options.
+
+DEFAULT_CACHE_SIZE = 256
+DEFAULT_BATCH_SIZE = 1000
+
+
+class Program:
+    # The analyzed AST of one source string and the options its runs use.
+    # The AST is shared by every run and keeps its inline caches and JIT
+    # translations between them; runs of one Program are serialized.
+    __slots__ = ('_source', '_ast', '_options', '_lock')
+
+    def __init__(self, source: str, optimize_ast: bool = True, memoize: bool = False,
+                 memo_size: int = DEFAULT_MEMO_SIZE, jit: bool = False,
+                 jit_threshold: int = DEFAULT_JIT_THRESHOLD):
+        ast = Parser(tokenize(source)).parse()
+        ast = analyze_purity(infer_types(resolve(analyze_scopes(optimize(ast, enabled=optimize_ast)))))
+        # checked now rather than on the first run
+        create_global_env(memoize=memoize, memo_size=memo_size, jit=jit, jit_threshold=jit_threshold)
+        object.__setattr__(self, '_source', source)
+        object.__setattr__(self, '_ast', ast)
+        object.__setattr__(self, '_options', dict(memoize=memoize, memo_size=memo_size, jit=jit,
+                                                  jit_threshold=jit_threshold))
+        object.__setattr__(self, '_lock', threading.Lock())
+
+    def __setattr__(self, name: str, value: Any):
+        raise AttributeError("Program is immutable")
+
+    def __delattr__(self, name: str):
+        raise AttributeError("Program is immutable")
+
+    @property
+    def source(self) -> str:
+        return self._source
+
+    def run(self, bindings: dict = None, limits: Limits = None) -> Any:
+        # The value of the program's last statement, with each name in
+        # bindings defined as a global. With limits, the run raises
+        # StepLimitExceeded or DeadlineExceeded when it goes over them.
+        with self._lock:
+            return run_deep(self._run, bindings, limits)
+
+    def run_many(self, bindings: Iterable[dict], batch_size: int = DEFAULT_BATCH_SIZE,
+                 limits: Limits = None) -> Iterator[Any]:
+        # Yields run(b, limits) for each b in bindings, in order; each run
+        # gets the whole budget of limits. Runs are grouped
+        # into batches of batch_size that share one large-stack thread, so
+        # the per-run cost is just the evaluation. An error stops the
+        # iteration after the results of earlier runs have been yielded.
+        if batch_size <= 0:
+            raise ValueError("batch_size must be positive")
+        batch = []
+        for item in bindings:
+            batch.append(item)
+            if len(batch) == batch_size:
+                yield from self._run_batch(batch, limits)
+                batch = []
+        if batch:
+            yield from self._run_batch(batch, limits)
+
+    def _run_batch(self, batch: list, limits: Limits) -> Iterator[Any]:
+        with self._lock:
+            outcome = run_deep(self._run_all, batch, limits)
+        results, error = outcome
+        yield from results
+        if error is not None:
+            raise error
+
+    def _run_all(self, batch: list, limits: Limits) -> tuple:
+        results = []
+        for bindings in batch:
+            try:
+                results.append(self._run(bindings, limits))
+            except Exception as e:
+                return results, e
+        return results, None
+
+    def _run(self, bindings: dict, limits: Limits = None) -> Any:
+        env = create_global_env(**self._options, limits=limits)
+        if bindings:
+            for name, value in bindings.items():
+                env.set(name, value)
+        # a string result is handed back as a str, not a rope
+        if limits is not None:
+            return flatten(limits.evaluate(self._ast, env))
+        return flatten(evaluate(self._ast, env))
+
+    def __repr__(self):
+        source = self._source if len(self._source) <= 40 else self._source[:37] + '...'
+        return f"Program({source!r})"
+
+
+# Programs by source and options, most recently used last.
+_programs = MemoCache(DEFAULT_CACHE_SIZE)
+_programs_lock = threading.Lock()
+
+
+def compile(source: str, optimize_ast: bool = True, memoize: bool = False, memo_size: int = DEFAULT_MEMO_SIZE,
+            jit: bool = False, jit_threshold: int = DEFAULT_JIT_THRESHOLD) -> Program:
+    # The Program for source, from the cache when the same source was
+    # compiled with the same options. Syntax errors are raised here.
+    key = (source, optimize_ast, memoize, memo_size, jit, jit_threshold)
+    with _programs_lock:
+        program = _programs.get(key)
+    if program is MISSING:
+        program = Program(source, optimize_ast, memoize, memo_size, jit, jit_threshold)
+        with _programs_lock:
+            _programs.put(key, program)
+    return program
+
+
+def cache_info() -> dict:
+    # hits, misses, evictions, size and maxsize of the program cache
+    with _programs_lock:
+        return _programs.stats()
+
+
+def set_cache_size(maxsize: int):
+    if maxsize <= 0:
+        raise ValueError("maxsize must be positive")
+    with _programs_lock:
+        _programs.maxsize = maxsize
+        while len(_programs.entries) > maxsize:
+            _programs.entries.popitem(last=False)
+            _programs.evictions += 1
+
+
+def clear_cache():
+    with _programs_lock:
+        _programs.entries.clear()
+        _programs.hits = _programs.misses = _programs.evictions = 0
@@ -0,0 +1,241 @@
+from array import array
+from .ast_nodes import NumberNode, BinaryOpNode, VariableNode, LambdaNode
+from .pvector import PersistentVector
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Array literals shorter than this stay plain lists; converting them would
+# cost more than it saves.
+NUMARRAY_MIN_SIZE = 32
+
+# Integer intermediates above this are not exact as float64, so kernels
+# whose bounds reach it fall back to Python ints.
+EXACT_INT_LIMIT = 2 ** 53
+
+ARITHMETIC_OPS = {'PLUS': '+', 'MINUS': '-', 'MUL': '*'}
+COMPARE_OPS = {
+    'EQUALS': '==', 'NOT_EQUALS': '!=', 'LESS': '<',
+    'LESS_EQ': '<=', 'GREATER': '>', 'GREATER_EQ': '>=',
+}
+
+
+# An array whose elements are all ints or all floats, stored unboxed in a
+# NumPy int64/float64 array, or in array('q')/array('d') without NumPy.
+# It reads, prints and compares like the list it replaces.
+class NumArray:
+    __slots__ = ('data',)
+
+    def __init__(self, data):
+        self.data = data
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return NumArray(self.data[index])
+        value = self.data[index]
+        return value.item() if np is not None else value
+
+    def __iter__(self):
+        return iter(self.data.tolist())
+
+    def tolist(self) -> list:
+        return self.data.tolist()
+
+    @property
+    def is_float(self) -> bool:
+        return self.data.dtype.kind == 'f' if np is not None else self.data.typecode == 'd'
+
+    def max_abs(self):
+        if np is not None:
+            high, low = self.data.max().item(), self.data.min().item()
+        else:
+            high, low = max(self.data), min(self.data)
+        return max(high, -low)
+
+    def __eq__(self, other):
+        return self.tolist() == _plain(other)
+
+    def __lt__(self, other):
+        return self.tolist() < _plain(other)
+
+    def __le__(self, other):
+        return self.tolist() <= _plain(other)
+
+    def __gt__(self, other):
+        return self.tolist() > _plain(other)
+
+    def __ge__(self, other):
+        return self.tolist() >= _plain(other)
+
+    def __add__(self, other):
+        return self.tolist() + _plain(other)
+
+    def __radd__(self, other):
+        return _plain(other) + self.tolist()
+
+    def __mul__(self, other):
+        return self.tolist() * other
+
+    __rmul__ = __mul__
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(self.tolist())
+
+
+# an array becomes a PersistentVector when an element is assigned
+ARRAY_TYPES = (list, NumArray, PersistentVector)
+
+
+def _plain(value):
+    return value.tolist() if isinstance(value, NumArray) else value
+
+
+def make_array(values: list):
+    # Returns a NumArray for long homogeneous int or float lists and the
+    # list itself otherwise (mixed types, bigints, strings, short lists).
+    if len(values) < NUMARRAY_MIN_SIZE:
+        return values
+    kind = type(values[0])
+    if kind is not int and kind is not float:
+        return values
+    if not all(type(value) is kind for value in values):
+        return values
+    try:
+        if np is not None:
+            data = np.array(values, dtype=np.int64 if kind is int else np.float64)
+        else:
+            data = array('q' if kind is int else 'd', values)
+    except OverflowError:
+        return values
+    return NumArray(data)
+
+
+def _vectorizable(node, param: str) -> bool:
+    if isinstance(node, NumberNode):
+        return True
+    if isinstance(node, VariableNode):
+        return node.name == param
+    if isinstance(node, BinaryOpNode):
+        return (node.op in ARITHMETIC_OPS or node.op in COMPARE_OPS or node.op == 'DIV') and \
+            _vectorizable(node.left, param) and _vectorizable(node.right, param)
+    return False
+
+
+def _uses(node, param: str) -> bool:
+    if isinstance(node, VariableNode):
+        return True
+    if isinstance(node, BinaryOpNode):
+        return _uses(node.left, param) or _uses(node.right, param)
+    return False
+
+
+# Python source for the body with the parameter renamed to `_v`. Division
+# and comparisons go through helpers so both kernels keep the evaluator's
+# ZeroDivisionError and 1/0 results.
+def _source(node, vector: bool) -> str:
+    if isinstance(node, NumberNode):
+        return f"({node.value!r})"
+    if isinstance(node, VariableNode):
+        return "_v"
+    left = _source(node.left, vector)
+    right = _source(node.right, vector)
+    if node.op == 'DIV':
+        return f"_div({left}, {right})"
+    if node.op in COMPARE_OPS:
+        if vector:
+            return f"_cmp({left} {COMPARE_OPS[node.op]} {right})"
+        return f"(1 if {left} {COMPARE_OPS[node.op]} {right} else 0)"
+    return f"({left} {ARITHMETIC_OPS[node.op]} {right})"
+
+
+def _scalar_div(left, right):
+    if right == 0:
+        raise ZeroDivisionError("Division by zero")
+    return left / right
+
+
+def _vector_div(left, right):
+    if np.any(right == 0):
+        raise ZeroDivisionError("Division by zero")
+    return left / right
+
+
+def _vector_cmp(mask):
+    if isinstance(mask, np.ndarray):
+        return mask.astype(np.int64)
+    return 1 if mask else 0
+
+
+def _bounds(node, param: str, is_float: bool, max_abs):
+    # (float result?, bound on the absolute value) of the body over an
+    # array, or None when an integer intermediate may not fit exactly in
+    # int64/float64 and the kernel has to use Python ints instead.
+    if isinstance(node, NumberNode):
+        result = (isinstance(node.value, float), abs(node.value))
+    elif isinstance(node, VariableNode):
+        result = (is_float, max_abs)
+    elif node.op in COMPARE_OPS:
+        left = _bounds(node.left, param, is_float, max_abs)
+        right = _bounds(node.right, param, is_float, max_abs)
+        return None if left is None or right is None else (False, 1)
+    else:
+        left = _bounds(node.left, param, is_float, max_abs)
+        right = _bounds(node.right, param, is_float, max_abs)
+        if left is None or right is None:
+            return None
+        if node.op == 'DIV':
+            return (True, 0)
+        bound = left[1] * right[1] if node.op == 'MUL' else left[1] + right[1]
+        result = (left[0] or right[0], bound)
+    if not result[0] and result[1] >= EXACT_INT_LIMIT:
+        return None
+    return result
+
+
+class MapKernel:
+    # The body of a `x -> ...` lambda made only of numbers, `x` and
+    # arithmetic/comparison operators, compiled once to a list comprehension
+    # and, with NumPy, to one whole-array expression.
+    def __init__(self, node: LambdaNode):
+        self.node = node
+        self.scalar = eval(f"lambda _values: [{_source(node.body, False)} for _v in _values]",
+                           {'_div': _scalar_div})
+        self.vector = None
+        if np is not None and _uses(node.body, node.param):
+            self.vector = eval(f"lambda _v: {_source(node.body, True)}",
+                               {'_div': _vector_div, '_cmp': _vector_cmp})
+
+    def __call__(self, values):
+        if not isinstance(values, NumArray):
+            return self.scalar(values)
+        if np is None:
+            # Every element goes through the same operators, so the results
+            # all have the first one's type and only int64 overflow is left
+            # to check, which array() does while it copies.
+            result = self.scalar(values.tolist())
+            if not result:
+                return result
+            try:
+                return NumArray(array('d' if type(result[0]) is float else 'q', result))
+            except OverflowError:
+                return result
+        if self.vector is not None and \
+                _bounds(self.node.body, self.node.param, values.is_float, values.max_abs()) is not None:
+            with np.errstate(all='ignore'):
+                return NumArray(self.vector(values.data))
+        return make_array(self.scalar(values.tolist()))
+
+
+def map_kernel(node: LambdaNode):
+    # Cached on the node: None until first asked, False if the body cannot
+    # be vectorized.
+    if node.kernel is None:
+        node.kernel = MapKernel(node) if _vectorizable(node.body, node.param) else False
+    return node.kernel or None
@@ -0,0 +1,207 @@
+from collections import Counter
+from .ast_nodes import iter_child_nodes, NumberNode, StringNode, BinaryOpNode, FunctionNode, CallNode, IfNode, VariableNode, \
+    LetNode, BlockNode, RefNode, AssignRefNode, AssignNode, NewNode, MethodCallNode, FieldAccessNode, \
+    ArrayNode, LambdaNode, IndexNode, WhileNode, ForNode
+from .evaluator import evaluate
+from .resolver import declared_names
+from .rope import STRING_TYPES
+
+COMPARISON_OPS = ('EQUALS', 'NOT_EQUALS', 'LESS', 'LESS_EQ', 'GREATER', 'GREATER_EQ')
+
+
+def _is_literal(node) -> bool:
+    return isinstance(node, (NumberNode, StringNode))
+
+
+def _literal(value):
+    if isinstance(value, STRING_TYPES):
+        return StringNode(str(value))
+    return NumberNode(value)
+
+
+def _is_int_literal(node, value: int) -> bool:
+    return isinstance(node, NumberNode) and type(node.value) is int and node.value == value
+
+
+def _is_numeric(node) -> bool:
+    if isinstance(node, NumberNode):
+        return True
+    if isinstance(node, BinaryOpNode):
+        if node.op in COMPARISON_OPS or node.op in ('MINUS', 'DIV'):
+            return True
+        return _is_numeric(node.left) and _is_numeric(node.right)
+    if isinstance(node, IfNode):
+        return _is_numeric(node.then_branch) and _is_numeric(node.else_branch)
+    return False
+
+
+def _let_type_ok(node: LetNode) -> bool:
+    if node.type_node is None:
+        return True
+    if node.type_node.type_name in ('int', 'bool'):
+        return isinstance(node.value, NumberNode) and isinstance(node.value.value, int)
+    if node.type_node.type_name == 'string':
+        return isinstance(node.value, StringNode)
+    return True
+
+
+def _mutated_names(node, names: set):
+    if isinstance(node, AssignNode):
+        names.add(node.name)
+    elif isinstance(node, RefNode) and isinstance(node.expr, VariableNode):
+        names.add(node.expr.name)
+    elif isinstance(node, (RefNode, AssignRefNode)):
+        # storing an array element rebinds the variable holding the array
+        target = node.expr if isinstance(node, RefNode) else node.ref_expr
+        while isinstance(target, IndexNode):
+            target = target.array
+            if isinstance(target, VariableNode):
+                names.add(target.name)
+    for child in iter_child_nodes(node):
+        _mutated_names(child, names)
+    return names
+
+
+def mutated_names(node) -> set:
+    return _mutated_names(node, set())
+
+
+# Rewrites the AST before it reaches evaluate or the Compiler:
+#   - folds operators whose operands are literals, using evaluate itself so
+#     the int/float and 1/0 comparison rules stay identical; expressions that
+#     would raise at runtime are left alone
+#   - replaces an `if` with a literal condition by the branch it takes
+#   - drops `x + 0`, `0 + x`, `x - 0`, `x * 1` and `1 * x` when x is known to
+#     be numeric, so type errors on strings and objects are preserved
+#   - replaces reads of a `let` bound to a literal with the literal, when the
+#     name is declared once in its scope and never assigned or taken by `ref`
+class Optimizer:
+    def __init__(self):
+        self.mutated = set()
+
+    def optimize(self, ast):
+        self.mutated = mutated_names(ast)
+        if isinstance(ast, list):
+            return self._statements(ast, {})
+        return self._visit(ast, {})
+
+    def _scope_constants(self, constants: dict, declared) -> dict:
+        if not constants:
+            return constants
+        return {name: value for name, value in constants.items() if name not in declared}
+
+    def _statements(self, statements: list, constants: dict) -> list:
+        declared = Counter(declared_names(statements))
+        constants = self._scope_constants(constants, declared)
+        result = []
+        for stmt in statements:
+            stmt = self._visit(stmt, constants)
+            result.append(stmt)
+            if (isinstance(stmt, LetNode) and _is_literal(stmt.value) and declared[stmt.name] == 1
+                    and stmt.name not in self.mutated and _let_type_ok(stmt)):
+                constants = dict(constants)
+                constants[stmt.name] = stmt.value
+        return result
+
+    def _visit(self, node, constants: dict):
+        if isinstance(node, list):
+            return [self._visit(child, constants) for child in node]
+
+        if isinstance(node, VariableNode):
+            value = constants.get(node.name)
+            if value is not None:
+                return _literal(value.value)
+            return node
+
+        if isinstance(node, BinaryOpNode):
+            node.left = self._visit(node.left, constants)
+            node.right = self._visit(node.right, constants)
+            return self._fold_binary(node)
+
+        if isinstance(node, IfNode):
+            node.condition = self._visit(node.condition, constants)
+            if _is_literal(node.condition):
+                branch = node.then_branch if node.condition.value != 0 else node.else_branch
+                return self._visit(branch, constants)
+            node.then_branch = self._visit(node.then_branch, constants)
+            node.else_branch = self._visit(node.else_branch, constants)
+            return node
+
+        if isinstance(node, BlockNode):
+            node.statements = self._statements(node.statements, constants)
+            return node
+
+        if isinstance(node, WhileNode):
+            node.condition = self._visit(node.condition, constants)
+            node.body = self._visit(node.body, constants)
+            return node
+
+        if isinstance(node, ForNode):
+            node.iterable = self._visit(node.iterable, constants)
+            node.body = self._visit(node.body, self._scope_constants(constants, [node.name]))
+            return node
+
+        if isinstance(node, FunctionNode):
+            declared = list(node.params) + declared_names(node.body)
+            node.body = self._visit(node.body, self._scope_constants(constants, declared))
+            return node
+
+        if isinstance(node, LambdaNode):
+            declared = [node.param] + declared_names(node.body)
+            node.body = self._visit(node.body, self._scope_constants(constants, declared))
+            return node
+
+        if isinstance(node, LetNode):
+            if node.value is not None:
+                node.value = self._visit(node.value, constants)
+            return node
+
+        if isinstance(node, AssignNode):
+            node.value = self._visit(node.value, constants)
+        elif isinstance(node, (CallNode, NewNode)):
+            node.args = self._visit(node.args, constants)
+        elif isinstance(node, MethodCallNode):
+            node.obj = self._visit(node.obj, constants)
+            node.args = self._visit(node.args, constants)
+        elif isinstance(node, FieldAccessNode):
+            node.obj = self._visit(node.obj, constants)
+        elif isinstance(node, ArrayNode):
+            node.elements = self._visit(node.elements, constants)
+        elif isinstance(node, IndexNode):
+            node.array = self._visit(node.array, constants)
+            node.index = self._visit(node.index, constants)
+        elif isinstance(node, AssignRefNode):
+            node.value = self._visit(node.value, constants)
+        return node
+
+    def _fold_binary(self, node: BinaryOpNode):
+        left, right, op = node.left, node.right, node.op
+
+        if _is_literal(left) and _is_literal(right):
+            if op == 'MUL' and (isinstance(left.value, str) or isinstance(right.value, str)):
+                return node
+            try:
+                return _literal(evaluate(node, None))
+            except Exception:
+                return node
+
+        if op == 'PLUS':
+            if _is_int_literal(right, 0) and _is_numeric(left):
+                return left
+            if _is_int_literal(left, 0) and _is_numeric(right):
+                return right
+        elif op == 'MINUS':
+            if _is_int_literal(right, 0) and _is_numeric(left):
+                return left
+        elif op == 'MUL':
+            if _is_int_literal(right, 1) and _is_numeric(left):
+                return left
+            if _is_int_literal(left, 1) and _is_numeric(right):
+                return right
+        return node
+
+
+def optimize(ast, enabled: bool = True):
+    if not enabled:
+        return ast
+    return Optimizer().optimize(ast)
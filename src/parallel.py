@@ -0,0 +1,233 @@
+import multiprocessing
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from .ast_nodes import FunctionNode, LambdaNode, VariableNode, CallNode, AssignNode, iter_child_nodes
+from .arena import to_arena
+from .evaluator import Environment, LambdaClosure, builtin_map, builtin_filter, call_function, \
+    create_global_env, run_deep
+from .numarray import NumArray, make_array
+from .pvector import PersistentVector
+from .rope import Rope
+from .purity import IMPURE_NODES
+
+# Elements per task sent to a worker, and the array length below which
+# pmap/pfilter/preduce just run serially.
+DEFAULT_CHUNK_SIZE = 20_000
+PARALLEL_THRESHOLD = 50_000
+
+_pool = None
+_in_worker = False
+_loaded = (None, None)
+
+
+class Unshippable(Exception):
+    pass
+
+
+# A lambda or named function ready to pickle: its definition as a NodeArena
+# (fresh nodes, without resolver slots or caches) and the values it reads
+# from enclosing scopes, themselves packed. Functions that call each other
+# share PackedFunctions, so recursion survives the trip.
+class PackedFunction:
+    __slots__ = ('arena', 'captured')
+
+    def __init__(self, arena):
+        self.arena = arena
+        self.captured = {}
+
+
+def _free_names(node, names: set):
+    # Every name the body reads or calls. Bodies that assign or touch
+    # objects would act on a worker's copy, so they are not shipped.
+    if isinstance(node, IMPURE_NODES) or isinstance(node, AssignNode):
+        raise Unshippable(type(node).__name__)
+    if isinstance(node, (VariableNode, CallNode)):
+        names.add(node.name)
+    for child in iter_child_nodes(node):
+        _free_names(child, names)
+
+
+def _find(env: Environment, name: str):
+    while env is not None:
+        if env.has(name):
+            return env, env.get(name)
+        env = env.parent
+    return None, None
+
+
+def _pack(value, seen: dict):
+    if value is None or isinstance(value, (int, float, str, Rope, NumArray)):
+        return value
+    if isinstance(value, (list, PersistentVector)):
+        return [_pack(item, seen) for item in value]
+    if type(value) is LambdaClosure:
+        node, env = value.node, value.env
+    elif type(value) is FunctionNode and value.closure_env is not None:
+        node, env = value, value.closure_env
+    else:
+        raise Unshippable(type(value).__name__)
+
+    packed = seen.get(id(value))
+    if packed is not None:
+        return packed
+    packed = seen[id(value)] = PackedFunction(to_arena(node))
+    names = set()
+    _free_names(node.body, names)
+    for name in sorted(names):
+        scope, captured = _find(env, name)
+        if scope is None:
+            continue
+        if scope.parent is None and callable(captured) and type(captured) is not LambdaClosure:
+            continue  # a builtin; workers have their own
+        packed.captured[name] = _pack(captured, seen)
+    return packed
+
+
+def _unpack(value, globals_env: Environment, seen: dict):
+    if isinstance(value, list):
+        return [_unpack(item, globals_env, seen) for item in value]
+    if not isinstance(value, PackedFunction):
+        return value
+    func = seen.get(id(value))
+    if func is not None:
+        return func
+    node = value.arena.to_ast()[0]
+    env = Environment(globals_env)
+    if isinstance(node, LambdaNode):
+        func = LambdaClosure(node, env)
+    else:
+        func = FunctionNode(node.name, node.params, node.body, env, node.param_types)
+    seen[id(value)] = func
+    for name, captured in value.captured.items():
+        env.vars[name] = _unpack(captured, globals_env, seen)
+    return func
+
+
+def pack_function(func) -> bytes:
+    # Raises Unshippable (or a pickling error) for anything a worker could
+    # not run with the same result, such as closure-compiler or VM functions.
+    return pickle.dumps(_pack(func, {}))
+
+
+def _load(payload: bytes):
+    # Workers keep the last function they unpacked; every chunk of one call
+    # carries the same payload.
+    global _loaded
+    if _loaded[0] != payload:
+        _loaded = (payload, _unpack(pickle.loads(payload), create_global_env(), {}))
+    return _loaded[1]
+
+
+def _is_data(value) -> bool:
+    # Arrays and results cross the process boundary only as plain values.
+    if value is None or isinstance(value, (int, float, str, Rope, NumArray)):
+        return True
+    if isinstance(value, (list, PersistentVector)):
+        return all(_is_data(item) for item in value)
+    return False
+
+
+def _fold(func, acc, values):
+    for x in values:
+        acc = call_function(func, [acc, x])
+    return acc
+
+
+def _apply(op: str, func, chunk):
+    if op == 'map':
+        return builtin_map([func, chunk])
+    if op == 'filter':
+        return builtin_filter([func, chunk])
+    return _fold(func, chunk[0], chunk[1:])
+
+
+def _run_chunk(op: str, payload: bytes, chunk: bytes):
+    global _in_worker
+    _in_worker = True
+    result = run_deep(_apply, op, _load(payload), pickle.loads(chunk))
+    if not _is_data(result):
+        raise Unshippable(type(result).__name__)
+    return result
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    # Spawned rather than forked: the parent runs programs on run_deep's
+    # thread, and forking a threaded process is unsafe.
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=os.cpu_count(), mp_context=multiprocessing.get_context('spawn'))
+    return _pool
+
+
+def _run_chunks(op: str, func, arr, chunk_size: int, threshold: int):
+    # Results of each chunk in order, or None when the call should run
+    # serially: small arrays, nested calls inside a worker, or functions,
+    # elements or results that cannot cross the process boundary, or a pool
+    # whose workers died. Shipped bodies cannot assign or touch objects, so
+    # running them again serially is safe.
+    global _pool
+    if _in_worker or len(arr) < threshold or not _is_data(arr):
+        return None
+    try:
+        payload = pack_function(func)
+    except (Unshippable, pickle.PicklingError, TypeError, AttributeError):
+        return None
+    chunks = [pickle.dumps(arr[i:i + chunk_size]) for i in range(0, len(arr), chunk_size)]
+    pool = _get_pool()
+    futures = [pool.submit(_run_chunk, op, payload, chunk) for chunk in chunks]
+    try:
+        return [future.result() for future in futures]
+    except Unshippable:
+        return None
+    except BrokenProcessPool:
+        _pool = None
+        return None
+
+
+def _concat(parts: list, arr):
+    result = []
+    for part in parts:
+        result.extend(part)
+    return make_array(result) if isinstance(arr, NumArray) else result
+
+
+def builtin_pmap(args, chunk_size: int = DEFAULT_CHUNK_SIZE, threshold: int = PARALLEL_THRESHOLD):
+    parts = _run_chunks('map', args[0], args[1], chunk_size, threshold)
+    if parts is None:
+        return builtin_map(args)
+    return _concat(parts, args[1])
+
+
+def builtin_pfilter(args, chunk_size: int = DEFAULT_CHUNK_SIZE, threshold: int = PARALLEL_THRESHOLD):
+    parts = _run_chunks('filter', args[0], args[1], chunk_size, threshold)
+    if parts is None:
+        return builtin_filter(args)
+    return _concat(parts, args[1])
+
+
+# Each worker folds its chunk starting from the chunk's first element and
+# the parent folds the partial results into the initial value, so f must be
+# associative for the result to match reduce.
+def builtin_preduce(args, chunk_size: int = DEFAULT_CHUNK_SIZE, threshold: int = PARALLEL_THRESHOLD):
+    func, arr, initial = args[0], args[1], args[2]
+    parts = _run_chunks('reduce', func, arr, chunk_size, threshold)
+    if parts is None:
+        return _fold(func, initial, arr)
+    return _fold(func, initial, parts)
+
+
+def parallel_builtins(chunk_size: int = None, threshold: int = None) -> dict:
+    chunk_size = DEFAULT_CHUNK_SIZE if chunk_size is None else chunk_size
+    threshold = PARALLEL_THRESHOLD if threshold is None else threshold
+    if chunk_size <= 0:
+        raise ValueError("chunk_size must be positive")
+    if threshold < 0:
+        raise ValueError("parallel_threshold must not be negative")
+    return {
+        'pmap': partial(builtin_pmap, chunk_size=chunk_size, threshold=threshold),
+        'pfilter': partial(builtin_pfilter, chunk_size=chunk_size, threshold=threshold),
+        'preduce': partial(builtin_preduce, chunk_size=chunk_size, threshold=threshold),
+    }
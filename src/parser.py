@@ -2,7 +2,7 @@ from typing import List
 from .lexer import Token
 from .ast_nodes import ASTNode, NumberNode, StringNode, BinaryOpNode, FunctionNode, CallNode, IfNode, VariableNode, \
     LetNode, BlockNode, RefNode, AssignRefNode, TypeNode, ClassNode, NewNode, MethodCallNode, AssignNode, \
-    FieldAccessNode, ArrayNode, LambdaNode, IndexNode
+    FieldAccessNode, ArrayNode, LambdaNode, IndexNode, WhileNode, ForNode
 
 
 class Parser:
@@ -127,6 +127,10 @@ class Parser:
             return self.parse_block()
         elif token.type == 'IF':
             return self.parse_if()
+        elif token.type == 'WHILE':
+            return self.parse_while()
+        elif token.type == 'FOR':
+            return self.parse_for()
         elif token.type == 'LET':
             return self.parse_let()
         elif token.type == 'REF':
@@ -183,6 +187,18 @@ class Parser:
         else_branch = self.statement()
         return IfNode(condition, then_branch, else_branch)
 
+    def parse_while(self) -> WhileNode:
+        self.consume('WHILE')
+        condition = self.comparison()
+        return WhileNode(condition, self.parse_block())
+
+    def parse_for(self) -> ForNode:
+        self.consume('FOR')
+        name = self.consume('IDENTIFIER').value
+        self.consume('IN')
+        iterable = self.comparison()
+        return ForNode(name, iterable, self.parse_block())
+
     def parse_let(self) -> LetNode:
         self.consume('LET')
         name = self.consume('IDENTIFIER').value
@@ -233,6 +249,7 @@ class Parser:
         name = self.consume('IDENTIFIER').value
 
         params = []
+        param_types = []
         if self.peek().type == 'LPAREN':
             self.consume('LPAREN')
             if self.peek().type != 'RPAREN':
@@ -250,6 +267,7 @@ class Parser:
                             raise SyntaxError(f"Unknown type: {type_token.value}")
 
                     params.append(param_name)
+                    param_types.append(param_type)
 
                     if self.peek().type == 'COMMA':
                         self.consume('COMMA')
@@ -262,7 +280,7 @@ class Parser:
             body = self.parse_block()
         else:
             body = self.comparison()
-        return FunctionNode(name, params, body)
+        return FunctionNode(name, params, body, param_types=param_types if any(param_types) else None)
 
 
     def parse_ref(self) -> RefNode:
@@ -320,4 +338,40 @@ class Parser:
         param = self.consume('IDENTIFIER').value
         self.consume('ARROW')
         body = self.comparison()
-        return LambdaNode(param, body)
\ No newline at end of file
+        return LambdaNode(param, body)
+
+
+# A Parser that also maps every expression, statement, function and class
+# node it builds to the (line, column) of its first token. Profiler reports
+# use the map; plain Parser skips the bookkeeping.
+class LocatingParser(Parser):
+    def __init__(self, tokens: List[Token]):
+        super().__init__(tokens)
+        self.locations = {}
+
+    def _located(self, parse) -> ASTNode:
+        start = self.peek()
+        node = parse()
+        self.locations.setdefault(node, (start.line, start.column))
+        return node
+
+    def statement(self) -> ASTNode:
+        return self._located(super().statement)
+
+    def comparison(self) -> ASTNode:
+        return self._located(super().comparison)
+
+    def expr(self) -> ASTNode:
+        return self._located(super().expr)
+
+    def term(self) -> ASTNode:
+        return self._located(super().term)
+
+    def factor(self) -> ASTNode:
+        return self._located(super().factor)
+
+    def parse_function(self) -> FunctionNode:
+        return self._located(super().parse_function)
+
+    def parse_class(self) -> ClassNode:
+        return self._located(super().parse_class)
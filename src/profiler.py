@@ -0,0 +1,171 @@
+import sys
+from time import perf_counter
+from . import evaluator
+
+ROOT = '<program>'
+
+
+# Collects, for one or more runs of `evaluate` or VirtualMachine:
+#   nodes      node -> [executions, cumulative seconds]
+#   functions  name -> calls (tail calls included)
+#   opcodes    op -> [executions, cumulative seconds]
+#   stacks     tuple of frame names -> seconds spent with exactly that stack
+# Profiler.evaluate sets the profiler on the run's global scope, which
+# functions and lambdas defined in the run copy, and times each evaluate
+# invocation with a profile function on the run's own thread. Nothing is
+# shared with other runs, so unprofiled runs, in this thread or any other,
+# pay only a None check per call.
+class Profiler:
+    def __init__(self, locations: dict = None):
+        self.locations = locations if locations is not None else {}
+        self.nodes = {}
+        self.functions = {}
+        self.opcodes = {}
+        self.stacks = {}
+        self._stack = [ROOT]
+        self._entries = []
+        self._mark = None
+
+    def _switch(self):
+        # Charges the time since the last change to the current stack.
+        now = perf_counter()
+        key = tuple(self._stack)
+        self.stacks[key] = self.stacks.get(key, 0.0) + now - self._mark
+        self._mark = now
+
+    def enter(self, name: str):
+        self.functions[name] = self.functions.get(name, 0) + 1
+        self._switch()
+        self._stack.append(name)
+
+    def leave(self):
+        self._switch()
+        self._stack.pop()
+
+    def opcode(self, op: str, seconds: float):
+        stats = self.opcodes.get(op)
+        if stats is None:
+            stats = self.opcodes[op] = [0, 0.0]
+        stats[0] += 1
+        stats[1] += seconds
+
+    def call(self, name: str):
+        # Called by evaluate on entering a callee. A call made by the innermost active evaluate
+        # invocation pushes a frame; a second one from the same invocation is
+        # a tail call and replaces it.
+        self.functions[name] = self.functions.get(name, 0) + 1
+        self._switch()
+        if len(self._stack) > self._entries[-1]:
+            self._stack[-1] = name
+        else:
+            self._stack.append(name)
+
+    def _tracer(self):
+        # A sys.setprofile function that sees every evaluate invocation: the
+        # node it was called with and how long it took, returns by exception
+        # included.
+        code = evaluator.evaluate.__code__
+        nodes = self.nodes
+        entries = self._entries
+        stack = self._stack
+        started = []
+
+        def trace(frame, event, arg):
+            if frame.f_code is not code:
+                return
+            if event == 'call':
+                entries.append(len(stack))
+                started.append((frame.f_locals['node_or_nodes'], perf_counter()))
+            elif event == 'return':
+                node, start = started.pop()
+                elapsed = perf_counter() - start
+                depth = entries.pop()
+                if len(stack) > depth:
+                    self._switch()
+                    del stack[depth:]
+                if not isinstance(node, list):
+                    stats = nodes.get(node)
+                    if stats is None:
+                        stats = nodes[node] = [0, 0.0]
+                    stats[0] += 1
+                    stats[1] += elapsed
+
+        return trace
+
+    def _run(self, ast, env):
+        previous = sys.getprofile()
+        sys.setprofile(self._tracer())
+        try:
+            return evaluator.evaluate(ast, env)
+        finally:
+            sys.setprofile(previous)
+
+    def evaluate(self, ast, env):
+        # Runs `evaluate` on a large-stack thread with this profiler set on
+        # env's global scope, then restores whatever was set before.
+        root = evaluator.global_env(env)
+        previous = root.profiler
+        root.profiler = self
+        self._mark = perf_counter()
+        try:
+            return evaluator.run_deep(self._run, ast, env)
+        finally:
+            self._switch()
+            root.profiler = previous
+
+    def start(self):
+        self._mark = perf_counter()
+
+    def stop(self):
+        self._switch()
+
+    def location(self, node) -> str:
+        position = self.locations.get(node)
+        return f"{position[0]}:{position[1]}" if position else "?"
+
+    def function_times(self) -> dict:
+        # name -> (self seconds, total seconds). Total counts each stack once
+        # even when the function appears in it more than once (recursion).
+        times = {}
+        for stack, seconds in self.stacks.items():
+            own = times.setdefault(stack[-1], [0.0, 0.0])
+            own[0] += seconds
+            for name in set(stack):
+                times.setdefault(name, [0.0, 0.0])[1] += seconds
+        return {name: tuple(pair) for name, pair in times.items()}
+
+    def collapsed(self) -> list:
+        # Lines in the collapsed-stack format read by flamegraph.pl,
+        # speedscope and inferno: frames joined by ';' and a count, here
+        # microseconds.
+        lines = []
+        for stack, seconds in sorted(self.stacks.items()):
+            micros = round(seconds * 1e6)
+            if micros:
+                lines.append(f"{';'.join(stack)} {micros}")
+        return lines
+
+    def write_collapsed(self, path: str):
+        with open(path, 'w') as f:
+            f.write("\n".join(self.collapsed()) + "\n")
+
+    def report(self, limit: int = 20) -> str:
+        lines = []
+        times = self.function_times()
+        if times:
+            lines.append(f"{'function':30} {'calls':>10} {'self ms':>10} {'total ms':>10}")
+            for name, (own, total) in sorted(times.items(), key=lambda item: -item[1][0])[:limit]:
+                calls = self.functions.get(name, '-')
+                lines.append(f"{name:30} {calls:>10} {own * 1000:10.2f} {total * 1000:10.2f}")
+        if self.nodes:
+            lines.append("")
+            lines.append(f"{'node':30} {'location':>10} {'count':>10} {'total ms':>10}")
+            ranked = sorted(self.nodes.items(), key=lambda item: -item[1][1])[:limit]
+            for node, (count, seconds) in ranked:
+                lines.append(f"{type(node).__name__:30} {self.location(node):>10} {count:>10} {seconds * 1000:10.2f}")
+        if self.opcodes:
+            lines.append("")
+            lines.append(f"{'opcode':30} {'count':>10} {'total ms':>10} {'avg ns':>10}")
+            for op, (count, seconds) in sorted(self.opcodes.items(), key=lambda item: -item[1][1])[:limit]:
+                lines.append(f"{op:30} {count:>10} {seconds * 1000:10.2f} {seconds / count * 1e9:10.0f}")
+        return "\n".join(lines)
@@ -0,0 +1,173 @@
+from collections import Counter
+from .ast_nodes import ASTNode, FunctionNode, CallNode, VariableNode, LetNode, BlockNode, RefNode, AssignRefNode, \
+    AssignNode, ClassNode, NewNode, MethodCallNode, FieldAccessNode, LambdaNode, ForNode, iter_child_nodes
+from .resolver import declared_names
+from .optimizer import mutated_names
+
+PURE_BUILTINS = ('map', 'filter', 'reduce', 'pmap', 'pfilter', 'preduce')
+IMPURE_NODES = (RefNode, AssignRefNode, NewNode, MethodCallNode, FieldAccessNode, ClassNode)
+
+
+class Scope:
+    def __init__(self, names, statements, mutated: set):
+        counts = Counter(names)
+        self.values = set(counts)
+        self.immutable = {name for name, count in counts.items() if count == 1 and name not in mutated}
+        self.functions = {}
+        for stmt in statements:
+            if isinstance(stmt, FunctionNode):
+                name, target = stmt.name, stmt
+            elif isinstance(stmt, LetNode) and isinstance(stmt.value, LambdaNode):
+                name, target = stmt.name, stmt.value
+            else:
+                continue
+            if name in self.immutable:
+                self.functions[name] = target
+
+
+def _statements(body) -> list:
+    if isinstance(body, list):
+        return body
+    return [body]
+
+
+# Marks each FunctionNode with `pure`: a pure function only reads its
+# parameters, its own locals and outer names that are bound once and never
+# reassigned or taken by `ref`, calls pure functions (or `map` with a pure
+# function), and touches no objects. Lambdas and nested functions are checked
+# the same way, and a function is only pure if everything it defines is.
+# Purity is the greatest fixpoint over the call graph, so recursion is fine.
+class PurityAnalyzer:
+    def __init__(self):
+        self.mutated = set()
+        self.scopes = []
+        self.active = []
+        self.impure = set()
+        self.deps = {}
+
+    def analyze(self, ast):
+        self.mutated = mutated_names(ast)
+        self.scopes = [Scope(declared_names(ast), _statements(ast), self.mutated)]
+        self.active = []
+        self.impure = set()
+        self.deps = {}
+        self._visit(ast)
+
+        pure = {func for func in self.deps if func not in self.impure}
+        changed = True
+        while changed:
+            changed = False
+            for func in list(pure):
+                if any(dep not in pure for dep in self.deps[func]):
+                    pure.discard(func)
+                    changed = True
+
+        for func in self.deps:
+            if isinstance(func, FunctionNode):
+                func.pure = func in pure
+        return ast
+
+    def _resolve(self, name: str):
+        for index in range(len(self.scopes) - 1, -1, -1):
+            if name in self.scopes[index].values:
+                return index, self.scopes[index]
+        return None, None
+
+    def _mark_impure(self):
+        for func, _ in self.active:
+            self.impure.add(func)
+
+    def _read(self, name: str):
+        index, scope = self._resolve(name)
+        if scope is None:
+            if name not in PURE_BUILTINS:
+                self._mark_impure()
+            return
+        target = scope.functions.get(name)
+        for func, first_scope in self.active:
+            if target is not None:
+                self.deps[func].add(target)
+            elif index < first_scope and name not in scope.immutable:
+                self.impure.add(func)
+
+    def _call(self, node: CallNode):
+        index, scope = self._resolve(node.name)
+        if scope is None:
+            if node.name not in PURE_BUILTINS or not node.args or not self._is_function(node.args[0]):
+                self._mark_impure()
+            return
+        target = scope.functions.get(node.name)
+        if target is None:
+            self._mark_impure()
+            return
+        for func, _ in self.active:
+            self.deps[func].add(target)
+
+    def _is_function(self, node) -> bool:
+        if isinstance(node, LambdaNode):
+            return True
+        if isinstance(node, VariableNode):
+            _, scope = self._resolve(node.name)
+            return scope is not None and node.name in scope.functions
+        return False
+
+    def _assign(self, name: str):
+        index, scope = self._resolve(name)
+        for func, first_scope in self.active:
+            if scope is None or index < first_scope:
+                self.impure.add(func)
+
+    def _enter(self, func, params, body):
+        for outer, _ in self.active:
+            self.deps[outer].add(func)
+        self.deps.setdefault(func, set())
+        self.scopes.append(Scope(list(params) + declared_names(body), _statements(body), self.mutated))
+        self.active.append((func, len(self.scopes) - 1))
+        self._visit(body)
+        self.active.pop()
+        self.scopes.pop()
+
+    def _visit(self, node):
+        if isinstance(node, list):
+            for child in node:
+                self._visit(child)
+
+        elif isinstance(node, FunctionNode):
+            self._enter(node, node.params, node.body)
+
+        elif isinstance(node, LambdaNode):
+            self._enter(node, [node.param], node.body)
+
+        elif isinstance(node, BlockNode):
+            self.scopes.append(Scope(declared_names(node.statements), node.statements, self.mutated))
+            self._visit(node.statements)
+            self.scopes.pop()
+
+        elif isinstance(node, ForNode):
+            self._visit(node.iterable)
+            statements = node.body.statements
+            self.scopes.append(Scope([node.name] + declared_names(statements), statements, self.mutated))
+            self._visit(statements)
+            self.scopes.pop()
+
+        elif isinstance(node, IMPURE_NODES):
+            self._mark_impure()
+
+        elif isinstance(node, VariableNode):
+            self._read(node.name)
+
+        elif isinstance(node, CallNode):
+            self._call(node)
+            self._visit(node.args)
+
+        elif isinstance(node, AssignNode):
+            self._assign(node.name)
+            self._visit(node.value)
+
+        elif isinstance(node, ASTNode):
+            for child in iter_child_nodes(node):
+                self._visit(child)
+
+
+def analyze_purity(ast):
+    return PurityAnalyzer().analyze(ast)
@@ -0,0 +1,185 @@
+from itertools import chain
+
+BITS = 5
+WIDTH = 1 << BITS
+MASK = WIDTH - 1
+
+
+# An immutable array stored as a 32-way trie of leaves plus a `tail` leaf
+# holding the last 1-32 elements, as in Clojure's PersistentVector. Reads
+# walk log32(n) levels; set() and append() copy only the nodes on one
+# root-to-leaf path and share everything else with the old vector, so an
+# update costs O(log32 n) and never changes a vector anyone else can see.
+# Nodes are plain lists that are never mutated once a vector holds them.
+# It indexes, iterates, prints and compares like the list it stands for.
+class PersistentVector:
+    __slots__ = ('count', 'shift', 'root', 'tail')
+
+    def __init__(self, count: int, shift: int, root: list, tail: list):
+        self.count = count
+        self.shift = shift
+        self.root = root
+        self.tail = tail
+
+    @classmethod
+    def from_list(cls, values) -> 'PersistentVector':
+        # Builds the trie bottom-up in O(n) instead of n appends.
+        values = list(values)
+        count = len(values)
+        tail_start = _tail_offset(count)
+        nodes = [values[i:i + WIDTH] for i in range(0, tail_start, WIDTH)]
+        shift = BITS
+        while len(nodes) > WIDTH:
+            nodes = [nodes[i:i + WIDTH] for i in range(0, len(nodes), WIDTH)]
+            shift += BITS
+        return cls(count, shift, nodes, values[tail_start:])
+
+    def _leaf(self, index: int) -> list:
+        if index >= _tail_offset(self.count):
+            return self.tail
+        node = self.root
+        for level in range(self.shift, 0, -BITS):
+            node = node[(index >> level) & MASK]
+        return node
+
+    def _check(self, index: int) -> int:
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError("vector index out of range")
+        return index
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.tolist()[index]
+        index = self._check(index)
+        return self._leaf(index)[index & MASK]
+
+    def set(self, index: int, value) -> 'PersistentVector':
+        index = self._check(index)
+        if index >= _tail_offset(self.count):
+            tail = self.tail[:]
+            tail[index & MASK] = value
+            return PersistentVector(self.count, self.shift, self.root, tail)
+        root = self.root[:]
+        node = root
+        for level in range(self.shift, 0, -BITS):
+            child = (index >> level) & MASK
+            node[child] = node[child][:]
+            node = node[child]
+        node[index & MASK] = value
+        return PersistentVector(self.count, self.shift, root, self.tail)
+
+    def append(self, value) -> 'PersistentVector':
+        count = self.count
+        if count - _tail_offset(count) < WIDTH:
+            return PersistentVector(count + 1, self.shift, self.root, self.tail + [value])
+        # the tail is full: it moves into the trie, which grows a level
+        # when the root has no room left
+        shift = self.shift
+        if (count >> BITS) > (1 << shift):
+            root = [self.root, _path(shift, self.tail)]
+            shift += BITS
+        else:
+            root = _push_tail(count, shift, self.root, self.tail)
+        return PersistentVector(count + 1, shift, root, [value])
+
+    def _leaves(self):
+        stack = [(self.root, self.shift)]
+        while stack:
+            node, level = stack.pop()
+            if level == 0:
+                yield node
+            else:
+                stack.extend((child, level - BITS) for child in reversed(node))
+        yield self.tail
+
+    def __iter__(self):
+        if self.count <= WIDTH:
+            return iter(self.tail)
+        return chain.from_iterable(self._leaves())
+
+    def tolist(self) -> list:
+        return list(self)
+
+    def __eq__(self, other):
+        return self.tolist() == _plain(other)
+
+    def __lt__(self, other):
+        return self.tolist() < _plain(other)
+
+    def __le__(self, other):
+        return self.tolist() <= _plain(other)
+
+    def __gt__(self, other):
+        return self.tolist() > _plain(other)
+
+    def __ge__(self, other):
+        return self.tolist() >= _plain(other)
+
+    def __add__(self, other):
+        if not isinstance(other, (list, PersistentVector)):
+            return self.tolist() + _plain(other)
+        # a short right side is appended, sharing this vector's trie
+        if len(other) <= WIDTH:
+            result = self
+            for value in other:
+                result = result.append(value)
+            return result
+        return PersistentVector.from_list(chain(self, other))
+
+    def __radd__(self, other):
+        if not isinstance(other, list):
+            return _plain(other) + self.tolist()
+        return PersistentVector.from_list(chain(other, self))
+
+    def __mul__(self, other):
+        return self.tolist() * other
+
+    __rmul__ = __mul__
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(self.tolist())
+
+    def __reduce__(self):
+        return PersistentVector.from_list, (self.tolist(),)
+
+
+def _tail_offset(count: int) -> int:
+    # Index of the first element in the tail.
+    return 0 if count < WIDTH else ((count - 1) >> BITS) << BITS
+
+
+def _path(level: int, leaf: list) -> list:
+    # A new branch of single-child nodes from level down to leaf.
+    node = leaf
+    for _ in range(0, level, BITS):
+        node = [node]
+    return node
+
+
+def _push_tail(count: int, level: int, parent: list, leaf: list) -> list:
+    # Copy of parent with leaf added as the rightmost leaf.
+    child = ((count - 1) >> level) & MASK
+    node = parent[:]
+    if level == BITS:
+        inserted = leaf
+    elif child < len(parent):
+        inserted = _push_tail(count, level - BITS, parent[child], leaf)
+    else:
+        inserted = _path(level - BITS, leaf)
+    if child < len(node):
+        node[child] = inserted
+    else:
+        node.append(inserted)
+    return node
+
+
+def _plain(value):
+    # NumArrays and vectors as lists
+    return value.tolist() if hasattr(value, 'tolist') else value
@@ -0,0 +1,417 @@
+from .ast_nodes import *
+from .arena import NodeArena
+from .register_vm import OPCODE, Prototype
+
+BINARY_OPS = {
+    'PLUS': 'ADD', 'MINUS': 'SUB', 'MUL': 'MUL', 'DIV': 'DIV',
+    'EQUALS': 'EQUALS', 'NOT_EQUALS': 'NOT_EQUALS', 'LESS': 'LESS', 'LESS_EQ': 'LESS_EQ',
+    'GREATER': 'GREATER', 'GREATER_EQ': 'GREATER_EQ',
+}
+COMPARE_OPS = ('EQUALS', 'NOT_EQUALS', 'LESS', 'LESS_EQ', 'GREATER', 'GREATER_EQ')
+EXPRESSION_NODES = (NumberNode, StringNode, BinaryOpNode, VariableNode, IfNode, CallNode, ArrayNode,
+                    LambdaNode, IndexNode, BlockNode)
+
+
+def _names(node, names: set):
+    # Every name read, called or assigned anywhere under node, including in
+    # nested functions.
+    if isinstance(node, (VariableNode, CallNode, AssignNode)):
+        names.add(node.name)
+    for child in iter_child_nodes(node):
+        _names(child, names)
+
+
+def _assigned(node, names: set):
+    # Names bound by let or assignment under node, outside nested functions.
+    if isinstance(node, (LetNode, AssignNode, FunctionNode)):
+        names.add(node.name)
+    if isinstance(node, (FunctionNode, LambdaNode)):
+        return
+    for child in iter_child_nodes(node):
+        _assigned(child, names)
+
+
+def _calls(node) -> bool:
+    # Whether evaluating node can call a function (and so rebind a name).
+    if isinstance(node, CallNode):
+        return True
+    if isinstance(node, (FunctionNode, LambdaNode)):
+        return False
+    return any(_calls(child) for child in iter_child_nodes(node))
+
+
+def _constants(node, values: list):
+    # Literal values a function body uses, outside nested functions.
+    if isinstance(node, (NumberNode, StringNode)):
+        values.append(node.value)
+    if isinstance(node, (FunctionNode, LambdaNode)):
+        return
+    for child in iter_child_nodes(node):
+        _constants(child, values)
+
+
+def _used_outside(node, region, name: str) -> bool:
+    # Whether name is bound or used anywhere under node except inside region.
+    if node is region:
+        return False
+    if isinstance(node, (VariableNode, CallNode, AssignNode, LetNode, FunctionNode)) and node.name == name:
+        return True
+    if isinstance(node, ForNode) and node.name == name:
+        return True
+    return any(_used_outside(child, region, name) for child in iter_child_nodes(node))
+
+
+def _register_locals(params: list, body) -> tuple:
+    # Which names of a function live in registers, and whether it needs an
+    # Environment of its own. A let-bound name gets a register when its
+    # first use in evaluation order is a let outside any `if` branch, so it
+    # is always bound before it is read; names read by nested functions
+    # stay in the Environment they capture. A loop body may run zero times,
+    # so a name it binds first (or a `for` variable) only gets a register
+    # when nothing outside the loop refers to it.
+    captured = set()
+    bound = set(params)
+    first = {}
+
+    def binding(name: str, definite: bool, loop) -> str:
+        if not definite or (loop is not None and _used_outside(body, loop, name)):
+            return 'use'
+        return 'let'
+
+    def visit(node, definite: bool, loop):
+        if isinstance(node, (FunctionNode, LambdaNode)):
+            _names(node.body, captured)
+            if isinstance(node, FunctionNode):
+                bound.add(node.name)
+                first.setdefault(node.name, binding(node.name, definite, loop))
+            return
+        if isinstance(node, IfNode):
+            visit(node.condition, definite, loop)
+            visit(node.then_branch, False, loop)
+            visit(node.else_branch, False, loop)
+            return
+        if isinstance(node, WhileNode):
+            visit(node.condition, definite, loop)
+            visit(node.body, definite, node.body)
+            return
+        if isinstance(node, ForNode):
+            visit(node.iterable, definite, loop)
+            bound.add(node.name)
+            first.setdefault(node.name, binding(node.name, definite, node.body))
+            visit(node.body, definite, node.body)
+            return
+        # a call looks its callee up before its arguments run, so a function
+        # they define must not give the name a register the call reads unset
+        if isinstance(node, CallNode):
+            first.setdefault(node.name, 'use')
+        for child in iter_child_nodes(node):
+            visit(child, definite, loop)
+        if isinstance(node, LetNode):
+            if node.value is not None:
+                bound.add(node.name)
+                first.setdefault(node.name, binding(node.name, definite, loop))
+        elif isinstance(node, (VariableNode, AssignNode)):
+            first.setdefault(node.name, 'use')
+
+    visit(body, True, None)
+    registers = [name for name in params if name not in captured]
+    registers += [name for name, kind in first.items()
+                  if kind == 'let' and name not in captured and name not in registers]
+    return registers, any(name not in registers for name in bound)
+
+
+# Per-function compilation state: the instruction list and the register
+# layout (parameters, constants, locals, then temporaries used like a stack).
+class _Function:
+    def __init__(self, name: str, params: list, locals_: list, constants: list, needs_scope: bool):
+        self.name = name
+        self.params = tuple(params)
+        self.code = []
+        self.needs_scope = needs_scope
+        self.constants = {}
+        tail = []
+        for value in [None] + constants:
+            key = (type(value), value)
+            if key not in self.constants:
+                self.constants[key] = len(params) + len(tail)
+                tail.append(value)
+        self.tail = tail
+        self.registers = {name: i for i, name in enumerate(params) if name in locals_}
+        for name in locals_:
+            if name not in self.registers and name not in params:
+                self.registers[name] = len(params) + len(tail)
+                tail.append(None)
+        self.names = {register: name for name, register in self.registers.items()}
+        self.top = len(params) + len(tail)
+        self.size = self.top
+
+    def constant(self, value) -> int:
+        return self.constants[(type(value), value)]
+
+    def temp(self, count: int = 1) -> int:
+        register = self.top
+        self.top += count
+        self.size = max(self.size, self.top)
+        return register
+
+    def emit(self, op: str, a=None, b=None, c=None) -> int:
+        self.code.append((OPCODE[op], a, b, c))
+        return len(self.code) - 1
+
+    def patch(self, pos: int, target: int):
+        op, a, b, c = self.code[pos]
+        if c is None and b is None:
+            self.code[pos] = (op, target, None, None)
+        elif c is None:
+            self.code[pos] = (op, a, target, None)
+        else:
+            self.code[pos] = (op, a, b, target)
+
+    def prototype(self) -> Prototype:
+        tail = self.tail + [None] * (self.size - len(self.params) - len(self.tail))
+        return Prototype(self.name, self.params, tuple(self.code), tail, self.needs_scope)
+
+
+# Compiles the AST into register-machine code for RegisterVM. Accepts the
+# same programs as Compiler and runs them with the same results.
+class RegisterCompiler:
+    def __init__(self):
+        self.function = None
+
+    def compile(self, node_or_nodes) -> Prototype:
+        if isinstance(node_or_nodes, NodeArena):
+            node_or_nodes = node_or_nodes.to_ast()
+        nodes = node_or_nodes if isinstance(node_or_nodes, list) else [node_or_nodes]
+        constants = []
+        _constants(nodes, constants)
+        # top-level names are globals, so nothing gets a register
+        self.function = _Function('<program>', [], [], constants, False)
+        for node in nodes:
+            mark = self.function.top
+            if isinstance(node, EXPRESSION_NODES):
+                self.function.emit('PRINT', self._expr(node))
+            else:
+                self._statement(node)
+            self.function.top = mark
+        self.function.emit('HALT')
+        return self.function.prototype()
+
+    def _compile_function(self, name: str, params: list, body, param_types: list = None) -> Prototype:
+        registers, needs_scope = _register_locals(params, body)
+        constants = []
+        _constants(body, constants)
+        outer = self.function
+        self.function = function = _Function(name, params, registers, constants, needs_scope)
+        try:
+            for i, param_type in enumerate(param_types or ()):
+                if param_type is not None:
+                    function.emit('CHECK', i, param_type)
+            for i, param in enumerate(params):
+                if param not in function.registers:
+                    function.emit('STORE_NAME', param, i)
+            function.emit('RET', self._value(body))
+            return function.prototype()
+        finally:
+            self.function = outer
+
+    def _target(self, dest):
+        return self.function.temp() if dest is None else dest
+
+    def _value(self, node, dest=None) -> int:
+        if isinstance(node, EXPRESSION_NODES):
+            return self._expr(node, dest)
+        self._statement(node)
+        return self._expr(NumberNode(None), dest)
+
+    def _operands(self, nodes: list) -> list:
+        # Registers holding each node's value, evaluated left to right. A
+        # local read directly from its register is copied first if a later
+        # operand assigns it, so the operation sees the earlier value.
+        registers = []
+        for i, node in enumerate(nodes):
+            register = self._value(node)
+            name = self.function.names.get(register)
+            if name is not None:
+                later = set()
+                _assigned(nodes[i + 1:], later)
+                if name in later:
+                    copy = self.function.temp()
+                    self.function.emit('MOVE', copy, register)
+                    register = copy
+            registers.append(register)
+        return registers
+
+    def _expr(self, node, dest=None) -> int:
+        function = self.function
+        if isinstance(node, (NumberNode, StringNode)):
+            register = function.constant(node.value)
+            if dest is None:
+                return register
+            function.emit('MOVE', dest, register)
+            return dest
+        elif isinstance(node, VariableNode):
+            register = function.registers.get(node.name)
+            if register is None:
+                register = self._target(dest)
+                function.emit('LOAD_NAME', register, node.name)
+            elif dest is not None and dest != register:
+                function.emit('MOVE', dest, register)
+                return dest
+            return register
+        elif isinstance(node, BinaryOpNode):
+            op = BINARY_OPS.get(node.op)
+            if op is None:
+                raise TypeError(f"Cannot compile node: {node}")
+            mark = function.top
+            left, right = self._operands([node.left, node.right])
+            function.top = mark
+            register = self._target(dest)
+            function.emit(op, register, left, right)
+            return register
+        elif isinstance(node, IfNode):
+            register = self._target(dest)
+            mark = function.top
+            jump = self._jump_unless(node.condition)
+            self._value(node.then_branch, register)
+            function.top = mark
+            skip = function.emit('JMP', 0)
+            function.patch(jump, len(function.code))
+            self._value(node.else_branch, register)
+            function.top = mark
+            function.patch(skip, len(function.code))
+            return register
+        elif isinstance(node, CallNode):
+            # The callee is looked up before the arguments run, so it is
+            # loaded first when they could rebind its name.
+            mark = function.top
+            callee = function.registers.get(node.name)
+            rebound = set()
+            _assigned(node.args, rebound)
+            if callee is None and (rebound or _calls(node.args)):
+                callee = function.temp()
+                function.emit('LOAD_NAME', callee, node.name)
+            elif callee is not None and node.name in rebound:
+                copy = function.temp()
+                function.emit('MOVE', copy, callee)
+                callee = copy
+            start = function.temp(len(node.args))
+            for i, arg in enumerate(node.args):
+                self._value(arg, start + i)
+            args = slice(start, start + len(node.args))
+            function.top = mark
+            register = self._target(dest)
+            if callee is None:
+                function.emit('CALL_NAME', register, node.name, args)
+            else:
+                function.emit('CALL', register, callee, args)
+            return register
+        elif isinstance(node, ArrayNode):
+            mark = function.top
+            start = function.temp(len(node.elements))
+            for i, element in enumerate(node.elements):
+                self._value(element, start + i)
+            function.top = mark
+            register = self._target(dest)
+            function.emit('ARRAY', register, slice(start, start + len(node.elements)))
+            return register
+        elif isinstance(node, IndexNode):
+            mark = function.top
+            array, index = self._operands([node.array, node.index])
+            function.top = mark
+            register = self._target(dest)
+            function.emit('INDEX', register, array, index)
+            return register
+        elif isinstance(node, LambdaNode):
+            proto = self._compile_function('<lambda>', [node.param], node.body)
+            register = self._target(dest)
+            function.emit('CLOSURE', register, proto)
+            return register
+        elif isinstance(node, BlockNode):
+            if not node.statements:
+                return self._expr(NumberNode(None), dest)
+            for stmt in node.statements[:-1]:
+                mark = function.top
+                if isinstance(stmt, EXPRESSION_NODES):
+                    self._expr(stmt)
+                else:
+                    self._statement(stmt)
+                function.top = mark
+            return self._value(node.statements[-1], dest)
+        raise TypeError(f"Cannot compile node: {node}")
+
+    def _statement(self, node):
+        function = self.function
+        mark = function.top
+        self._bind(node)
+        function.top = mark
+
+    def _bind(self, node):
+        function = self.function
+        if isinstance(node, (LetNode, AssignNode)):
+            if isinstance(node, LetNode) and node.value is None:
+                return
+            checked = isinstance(node, LetNode) and node.type_node and not node.proven
+            register = function.registers.get(node.name)
+            if register is not None:
+                self._value(node.value, register)
+                if checked:
+                    function.emit('CHECK', register, node.type_node.type_name)
+            else:
+                value = self._value(node.value)
+                if checked:
+                    function.emit('CHECK', value, node.type_node.type_name)
+                function.emit('STORE_NAME' if isinstance(node, LetNode) else 'ASSIGN_NAME', node.name, value)
+        elif isinstance(node, FunctionNode):
+            proto = self._compile_function(node.name, node.params, node.body, node.param_types)
+            register = function.registers.get(node.name)
+            if register is not None:
+                function.emit('CLOSURE', register, proto)
+            else:
+                register = function.temp()
+                function.emit('CLOSURE', register, proto)
+                function.emit('STORE_NAME', node.name, register)
+        elif isinstance(node, WhileNode):
+            start = len(function.code)
+            jump = self._jump_unless(node.condition)
+            self._loop_body(node.body)
+            function.emit('JMP', start)
+            function.patch(jump, len(function.code))
+        elif isinstance(node, ForNode):
+            iterator = function.temp()
+            function.emit('GET_ITER', iterator, self._value(node.iterable))
+            function.top = iterator + 1
+            register = function.registers.get(node.name)
+            value = function.temp() if register is None else register
+            start = function.emit('ITER_NEXT', value, iterator, 0)
+            if register is None:
+                function.emit('STORE_NAME', node.name, value)
+            self._loop_body(node.body)
+            function.emit('JMP', start)
+            function.patch(start, len(function.code))
+        elif isinstance(node, EXPRESSION_NODES):
+            self._expr(node)
+        else:
+            raise TypeError(f"Cannot compile node: {node}")
+
+    def _loop_body(self, body):
+        function = self.function
+        for stmt in body.statements:
+            mark = function.top
+            if isinstance(stmt, EXPRESSION_NODES):
+                self._expr(stmt)
+            else:
+                self._statement(stmt)
+            function.top = mark
+
+    def _jump_unless(self, condition) -> int:
+        # Emits a jump, to be patched, taken when condition is 0; compared
+        # operands fuse into one instruction.
+        function = self.function
+        mark = function.top
+        if isinstance(condition, BinaryOpNode) and condition.op in COMPARE_OPS:
+            left, right = self._operands([condition.left, condition.right])
+            jump = function.emit(condition.op + '_JZ', left, right, 0)
+        else:
+            jump = function.emit('JZ', self._value(condition), 0)
+        function.top = mark
+        return jump
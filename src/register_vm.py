@@ -0,0 +1,242 @@
+from .environment import Environment
+from .evaluator import check_type
+from .rope import STRING_TYPES, concat
+from .vm import BUILTINS, index_array, array_iter
+
+# Three-address instructions. Each is a tuple (opcode, a, b, c); the format
+# string names the operand kinds for disassembly: r register, n name,
+# t jump target, s register slice (call arguments, array elements),
+# p function prototype.
+FORMATS = {
+    'MOVE': 'rr',
+    'ADD': 'rrr', 'SUB': 'rrr', 'MUL': 'rrr', 'DIV': 'rrr',
+    'EQUALS': 'rrr', 'NOT_EQUALS': 'rrr', 'LESS': 'rrr', 'LESS_EQ': 'rrr', 'GREATER': 'rrr', 'GREATER_EQ': 'rrr',
+    # jump to t unless the comparison holds
+    'EQUALS_JZ': 'rrt', 'NOT_EQUALS_JZ': 'rrt', 'LESS_JZ': 'rrt', 'LESS_EQ_JZ': 'rrt',
+    'GREATER_JZ': 'rrt', 'GREATER_EQ_JZ': 'rrt',
+    'JMP': 't', 'JZ': 'rt',
+    'LOAD_NAME': 'rn', 'STORE_NAME': 'nr', 'ASSIGN_NAME': 'nr',
+    'CALL': 'rrs', 'CALL_NAME': 'rns', 'RET': 'r',
+    'CLOSURE': 'rp', 'ARRAY': 'rs', 'INDEX': 'rrr',
+    # check a register against a `let` or parameter annotation
+    'CHECK': 'rn',
+    # a = iter(b); then a = next(b), or jump to t once b is exhausted
+    'GET_ITER': 'rr', 'ITER_NEXT': 'rrt',
+    'PRINT': 'r', 'HALT': '',
+}
+OPCODES = list(FORMATS)
+OPCODE = {name: i for i, name in enumerate(OPCODES)}
+# ITER_NEXT's result when the iterator is exhausted
+_DONE = object()
+
+
+# One compiled function body, or the top-level program. Registers are laid
+# out as parameters, then constants, then locals and temporaries; `tail` is
+# the initial contents of everything after the parameters, so a call builds
+# its register file as `args + tail`. Functions with locals that nested
+# closures capture (or that are bound conditionally) keep those in an
+# Environment and set `needs_scope`.
+class Prototype:
+    def __init__(self, name: str, params: tuple, code: tuple, tail: list, needs_scope: bool):
+        self.name = name
+        self.params = params
+        self.code = code
+        self.tail = tail
+        self.needs_scope = needs_scope
+
+    @property
+    def register_count(self) -> int:
+        return len(self.params) + len(self.tail)
+
+    def prototypes(self) -> list:
+        # This prototype and every one nested in it, depth first.
+        found = [self]
+        for op, a, b, c in self.code:
+            if op == OPCODE['CLOSURE']:
+                found.extend(b.prototypes())
+        return found
+
+    def __repr__(self):
+        return f"Prototype({self.name}, {list(self.params)}, {len(self.code)} instructions)"
+
+
+def _operand(kind: str, value) -> str:
+    if kind == 'r':
+        return f"r{value}"
+    if kind == 't':
+        return f"@{value}"
+    if kind == 's':
+        return f"r{value.start}..r{value.stop - 1}" if value.stop > value.start else "()"
+    if kind == 'p':
+        return f"<{value.name}>"
+    return str(value)
+
+
+def disassemble(proto: Prototype) -> str:
+    lines = []
+    for function in proto.prototypes():
+        constants = {i + len(function.params): value for i, value in enumerate(function.tail) if value is not None}
+        lines.append(f"{function.name}({', '.join(function.params)}): {function.register_count} registers, "
+                     f"constants {constants}")
+        for pc, (op, a, b, c) in enumerate(function.code):
+            name = OPCODES[op]
+            operands = ", ".join(_operand(kind, value) for kind, value in zip(FORMATS[name], (a, b, c)))
+            lines.append(f"  {pc:4} {name} {operands}".rstrip())
+    return "\n".join(lines)
+
+
+class RegisterClosure:
+    def __init__(self, proto: Prototype, scope: Environment, vm: 'RegisterVM'):
+        self.proto = proto
+        self.name = proto.name
+        self.params = proto.params
+        self.scope = scope
+        self.vm = vm
+
+    def __call__(self, args):
+        return self.vm.invoke(self, args)
+
+    def __repr__(self):
+        return f"Closure({self.name}, {list(self.params)})"
+
+
+def _frame(closure: RegisterClosure, args: list):
+    proto = closure.proto
+    if len(args) != len(proto.params):
+        raise TypeError(f"Function {proto.name} expected {len(proto.params)} args, got {len(args)}")
+    scope = Environment(closure.scope) if proto.needs_scope else closure.scope
+    return proto.code, list(args) + proto.tail, scope
+
+
+# Runs RegisterCompiler output with the same results as VirtualMachine on
+# the stack compiler's code for the same AST.
+class RegisterVM:
+    def __init__(self):
+        self.env = dict(BUILTINS)
+        self.program = None
+
+    def global_scope(self):
+        scope = Environment()
+        scope.vars = self.env
+        return scope
+
+    def execute(self):
+        program = self.program
+        return self._run(program.code, [None] * len(program.params) + program.tail, self.global_scope())
+
+    def invoke(self, closure: RegisterClosure, args):
+        return self._run(*_frame(closure, args))
+
+    def _run(self, code, regs, scope):
+        (MOVE, ADD, SUB, MUL, DIV, EQUALS, NOT_EQUALS, LESS, LESS_EQ, GREATER, GREATER_EQ,
+         EQUALS_JZ, NOT_EQUALS_JZ, LESS_JZ, LESS_EQ_JZ, GREATER_JZ, GREATER_EQ_JZ,
+         JMP, JZ, LOAD_NAME, STORE_NAME, ASSIGN_NAME, CALL, CALL_NAME, RET,
+         CLOSURE, ARRAY, INDEX, CHECK, GET_ITER, ITER_NEXT, PRINT, HALT) = range(len(OPCODES))
+        frames = []
+        last_result = None
+        pc = 0
+
+        while True:
+            op, a, b, c = code[pc]
+            pc += 1
+
+            if op == MOVE:
+                regs[a] = regs[b]
+            elif op == LOAD_NAME:
+                regs[a] = scope.get(b)
+            elif op == ADD:
+                left = regs[b]
+                regs[a] = concat(left, regs[c]) if isinstance(left, STRING_TYPES) else left + regs[c]
+            elif op == SUB:
+                regs[a] = regs[b] - regs[c]
+            elif op == LESS_JZ:
+                if not regs[a] < regs[b]:
+                    pc = c
+            elif op == ITER_NEXT:
+                value = next(regs[b], _DONE)
+                if value is _DONE:
+                    pc = c
+                else:
+                    regs[a] = value
+            elif op == CALL_NAME or op == CALL:
+                func = scope.get(b) if op == CALL_NAME else regs[b]
+                args = regs[c]
+                if type(func) is RegisterClosure:
+                    proto = func.proto
+                    if len(args) != len(proto.params):
+                        raise TypeError(f"Function {proto.name} expected {len(proto.params)} args, got {len(args)}")
+                    frames.append((code, regs, scope, pc, a))
+                    code = proto.code
+                    regs = args + proto.tail
+                    scope = Environment(func.scope) if proto.needs_scope else func.scope
+                    pc = 0
+                elif callable(func):
+                    regs[a] = func(args)
+                else:
+                    raise TypeError(f"{func} is not a function")
+            elif op == RET:
+                value = regs[a]
+                if not frames:
+                    return value
+                code, regs, scope, pc, dest = frames.pop()
+                regs[dest] = value
+            elif op == JMP:
+                pc = a
+            elif op == MUL:
+                regs[a] = regs[b] * regs[c]
+            elif op == DIV:
+                divisor = regs[c]
+                if divisor == 0:
+                    raise ZeroDivisionError("Division by zero")
+                regs[a] = regs[b] / divisor
+            elif op == EQUALS_JZ:
+                if not regs[a] == regs[b]:
+                    pc = c
+            elif op == NOT_EQUALS_JZ:
+                if not regs[a] != regs[b]:
+                    pc = c
+            elif op == LESS_EQ_JZ:
+                if not regs[a] <= regs[b]:
+                    pc = c
+            elif op == GREATER_JZ:
+                if not regs[a] > regs[b]:
+                    pc = c
+            elif op == GREATER_EQ_JZ:
+                if not regs[a] >= regs[b]:
+                    pc = c
+            elif op == JZ:
+                if regs[a] == 0:
+                    pc = b
+            elif op == EQUALS:
+                regs[a] = 1 if regs[b] == regs[c] else 0
+            elif op == NOT_EQUALS:
+                regs[a] = 1 if regs[b] != regs[c] else 0
+            elif op == LESS:
+                regs[a] = 1 if regs[b] < regs[c] else 0
+            elif op == LESS_EQ:
+                regs[a] = 1 if regs[b] <= regs[c] else 0
+            elif op == GREATER:
+                regs[a] = 1 if regs[b] > regs[c] else 0
+            elif op == GREATER_EQ:
+                regs[a] = 1 if regs[b] >= regs[c] else 0
+            elif op == STORE_NAME:
+                scope.vars[a] = regs[b]
+            elif op == ASSIGN_NAME:
+                scope.assign(a, regs[b])
+            elif op == INDEX:
+                regs[a] = index_array(regs[b], regs[c])
+            elif op == ARRAY:
+                regs[a] = regs[b]
+            elif op == CLOSURE:
+                regs[a] = RegisterClosure(b, scope, self)
+            elif op == PRINT:
+                last_result = regs[a]
+                print(last_result)
+            elif op == HALT:
+                return last_result
+            elif op == CHECK:
+                check_type(b, regs[a])
+            elif op == GET_ITER:
+                regs[a] = array_iter(regs[b])
+            else:
+                raise ValueError(f"Unknown opcode: {op}")
@@ -0,0 +1,222 @@
+from .ast_nodes import ASTNode, NumberNode, StringNode, BinaryOpNode, FunctionNode, CallNode, IfNode, VariableNode, \
+    LetNode, BlockNode, RefNode, AssignRefNode, AssignNode, ClassNode, NewNode, MethodCallNode, FieldAccessNode, \
+    ArrayNode, LambdaNode, IndexNode, WhileNode, ForNode
+
+
+class ScopeLayout:
+    def __init__(self, params=()):
+        self.slots = {}
+        for param in params:
+            self.declare(param)
+        self.param_count = len(params) if len(self.slots) == len(params) else None
+
+    def declare(self, name: str) -> int:
+        if name not in self.slots:
+            self.slots[name] = len(self.slots)
+        return self.slots[name]
+
+    @property
+    def size(self) -> int:
+        return len(self.slots)
+
+    def __repr__(self):
+        return f"ScopeLayout({list(self.slots)})"
+
+
+def _declarations(node, names: list):
+    # Names bound in the scope that evaluates `node`, without descending into
+    # nodes that open a scope of their own.
+    if isinstance(node, list):
+        for child in node:
+            _declarations(child, names)
+    elif isinstance(node, LetNode):
+        if node.value is not None:
+            _declarations(node.value, names)
+        names.append(node.name)
+    elif isinstance(node, (FunctionNode, ClassNode)):
+        names.append(node.name)
+    elif isinstance(node, BlockNode):
+        if not node.scoped:
+            _declarations(node.statements, names)
+    elif isinstance(node, LambdaNode):
+        pass
+    elif isinstance(node, BinaryOpNode):
+        _declarations(node.left, names)
+        _declarations(node.right, names)
+    elif isinstance(node, IfNode):
+        _declarations(node.condition, names)
+        _declarations(node.then_branch, names)
+        _declarations(node.else_branch, names)
+    elif isinstance(node, (CallNode, NewNode)):
+        _declarations(node.args, names)
+    elif isinstance(node, MethodCallNode):
+        _declarations(node.obj, names)
+        _declarations(node.args, names)
+    elif isinstance(node, FieldAccessNode):
+        _declarations(node.obj, names)
+    elif isinstance(node, ArrayNode):
+        _declarations(node.elements, names)
+    elif isinstance(node, IndexNode):
+        _declarations(node.array, names)
+        _declarations(node.index, names)
+    elif isinstance(node, RefNode):
+        _declarations(node.expr, names)
+    elif isinstance(node, AssignRefNode):
+        _declarations(node.ref_expr, names)
+        _declarations(node.value, names)
+    elif isinstance(node, AssignNode):
+        _declarations(node.value, names)
+    elif isinstance(node, WhileNode):
+        _declarations(node.condition, names)
+    elif isinstance(node, ForNode):
+        _declarations(node.iterable, names)
+
+
+def declared_names(node) -> list:
+    names = []
+    _declarations(node, names)
+    return names
+
+
+# Annotates variable references with (depth, slot) lexical addresses.
+# The top-level scope stays a dict-backed Environment, so names that resolve
+# there get a depth but no slot. Class methods run in an environment built
+# from the caller's scope at call time and are left unannotated.
+class Resolver:
+    def __init__(self):
+        self.scopes = []
+
+    def resolve(self, ast):
+        self.scopes = [None]
+        self._visit(ast)
+        return ast
+
+    def _open_scope(self, body, params=()) -> ScopeLayout:
+        layout = ScopeLayout(params)
+        for name in declared_names(body):
+            layout.declare(name)
+        return layout
+
+    def _lookup(self, name: str):
+        depth = 0
+        for layout in reversed(self.scopes):
+            if layout is None:
+                return depth, None
+            if name in layout.slots:
+                return depth, layout.slots[name]
+            depth += 1
+        return None, None
+
+    def _local_slot(self, name: str):
+        layout = self.scopes[-1]
+        return layout.slots[name] if layout is not None else None
+
+    def _visit(self, node):
+        if isinstance(node, list):
+            for child in node:
+                self._visit(child)
+
+        elif isinstance(node, (NumberNode, StringNode)):
+            pass
+
+        elif isinstance(node, VariableNode):
+            node.depth, node.slot = self._lookup(node.name)
+
+        elif isinstance(node, AssignNode):
+            self._visit(node.value)
+            node.depth, node.slot = self._lookup(node.name)
+
+        elif isinstance(node, LetNode):
+            if node.value is not None:
+                self._visit(node.value)
+            node.slot = self._local_slot(node.name)
+
+        elif isinstance(node, BinaryOpNode):
+            self._visit(node.left)
+            self._visit(node.right)
+
+        elif isinstance(node, IfNode):
+            self._visit(node.condition)
+            self._visit(node.then_branch)
+            self._visit(node.else_branch)
+
+        elif isinstance(node, BlockNode):
+            # an unscoped block (see escape.analyze_scopes) runs in the
+            # enclosing scope, whose layout already holds its names
+            if node.scoped:
+                node.layout = self._open_scope(node.statements)
+                self.scopes.append(node.layout)
+                self._visit(node.statements)
+                self.scopes.pop()
+            else:
+                self._visit(node.statements)
+
+        elif isinstance(node, WhileNode):
+            self._visit(node.condition)
+            node.layout = self._open_scope(node.body.statements)
+            # a body that declares nothing runs in the enclosing scope (see
+            # evaluator.loop_scoping)
+            if node.layout.size:
+                self.scopes.append(node.layout)
+                self._visit(node.body.statements)
+                self.scopes.pop()
+            else:
+                self._visit(node.body.statements)
+
+        elif isinstance(node, ForNode):
+            self._visit(node.iterable)
+            node.layout = self._open_scope(node.body.statements, [node.name])
+            self.scopes.append(node.layout)
+            self._visit(node.body.statements)
+            self.scopes.pop()
+
+        elif isinstance(node, FunctionNode):
+            node.slot = self._local_slot(node.name)
+            node.layout = self._open_scope(node.body, node.params)
+            self.scopes.append(node.layout)
+            self._visit(node.body)
+            self.scopes.pop()
+
+        elif isinstance(node, LambdaNode):
+            node.layout = self._open_scope(node.body, [node.param])
+            self.scopes.append(node.layout)
+            self._visit(node.body)
+            self.scopes.pop()
+
+        elif isinstance(node, CallNode):
+            node.depth, node.slot = self._lookup(node.name)
+            self._visit(node.args)
+
+        elif isinstance(node, ClassNode):
+            node.slot = self._local_slot(node.name)
+
+        elif isinstance(node, NewNode):
+            self._visit(node.args)
+
+        elif isinstance(node, MethodCallNode):
+            self._visit(node.obj)
+            self._visit(node.args)
+
+        elif isinstance(node, FieldAccessNode):
+            self._visit(node.obj)
+
+        elif isinstance(node, ArrayNode):
+            self._visit(node.elements)
+
+        elif isinstance(node, IndexNode):
+            self._visit(node.array)
+            self._visit(node.index)
+
+        elif isinstance(node, RefNode):
+            self._visit(node.expr)
+
+        elif isinstance(node, AssignRefNode):
+            self._visit(node.ref_expr)
+            self._visit(node.value)
+
+        elif not isinstance(node, ASTNode):
+            raise TypeError(f"Cannot resolve node: {node}")
+
+
+def resolve(ast):
+    return Resolver().resolve(ast)
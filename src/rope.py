@@ -0,0 +1,167 @@
+# Concatenations shorter than this produce plain strs, and appending a
+# short str to a rope whose edge piece is short copies the two into one
+# piece, so a string built one character at a time has one node per
+# ROPE_CHUNK characters rather than one per character.
+ROPE_CHUNK = 256
+
+
+# A string built by `+` that has not been looked at yet. Concatenation
+# links the two sides in O(1) instead of copying them; the characters are
+# joined once, the first time the rope is printed, compared, hashed,
+# indexed or converted with str(), and the result replaces the children.
+# It prints, compares and hashes like the str it stands for.
+class Rope:
+    __slots__ = ('left', 'right', 'length', 'flat')
+
+    def __init__(self, left, right, length: int):
+        self.left = left
+        self.right = right
+        self.length = length
+        self.flat = None
+
+    def __str__(self) -> str:
+        if self.flat is None:
+            self.flat = _join(self)
+            self.left = self.right = None
+        return self.flat
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        return str(self)[index]
+
+    def __iter__(self):
+        return iter(str(self))
+
+    def __contains__(self, item):
+        return str(item) in str(self)
+
+    # with anything but a string, these and the arithmetic and ordering
+    # operators below act as str would, raising str's own TypeError
+    def __add__(self, other):
+        if not isinstance(other, STRING_TYPES):
+            return str(self) + other
+        return concat(self, other)
+
+    def __radd__(self, other):
+        if not isinstance(other, STRING_TYPES):
+            return other + str(self)
+        return concat(other, self)
+
+    def __mul__(self, other):
+        return str(self) * other
+
+    def __rmul__(self, other):
+        return other * str(self)
+
+    def __sub__(self, other):
+        return str(self) - other
+
+    def __rsub__(self, other):
+        return other - str(self)
+
+    def __truediv__(self, other):
+        return str(self) / other
+
+    def __rtruediv__(self, other):
+        return other / str(self)
+
+    def __eq__(self, other):
+        if not isinstance(other, STRING_TYPES):
+            return NotImplemented
+        return self.length == len(other) and str(self) == str(other)
+
+    def __ne__(self, other):
+        if not isinstance(other, STRING_TYPES):
+            return NotImplemented
+        return not self == other
+
+    def __lt__(self, other):
+        if not isinstance(other, STRING_TYPES):
+            return str(self) < other
+        return str(self) < str(other)
+
+    def __le__(self, other):
+        if not isinstance(other, STRING_TYPES):
+            return str(self) <= other
+        return str(self) <= str(other)
+
+    def __gt__(self, other):
+        if not isinstance(other, STRING_TYPES):
+            return str(self) > other
+        return str(self) > str(other)
+
+    def __ge__(self, other):
+        if not isinstance(other, STRING_TYPES):
+            return str(self) >= other
+        return str(self) >= str(other)
+
+    def __hash__(self):
+        return hash(str(self))
+
+    def __format__(self, spec):
+        return format(str(self), spec)
+
+    def __repr__(self):
+        return repr(str(self))
+
+    def __reduce__(self):
+        # pickles (for the process pool and the server) as the plain str
+        return str, (str(self),)
+
+
+STRING_TYPES = (str, Rope)
+
+
+def _piece(value):
+    # A rope's flattened text stands in for it once it has been observed.
+    if type(value) is Rope and value.flat is not None:
+        return value.flat
+    return value
+
+
+def _join(rope: Rope) -> str:
+    # Left-to-right walk with an explicit stack: ropes built by a long
+    # chain of appends are as deep as the chain.
+    parts = []
+    stack = [rope]
+    while stack:
+        node = _piece(stack.pop())
+        if type(node) is Rope:
+            stack.append(node.right)
+            stack.append(node.left)
+        else:
+            parts.append(node)
+    return ''.join(parts)
+
+
+def concat(left, right):
+    # `left + right` for two strs or ropes. Anything else goes to Python's
+    # `+`, which raises the usual TypeError.
+    if not isinstance(right, STRING_TYPES) or not isinstance(left, STRING_TYPES):
+        return left + right
+    left, right = _piece(left), _piece(right)
+    length = len(left) + len(right)
+    if length < ROPE_CHUNK:
+        # only strs are this short
+        return left + right
+    if type(right) is str and len(right) < ROPE_CHUNK and type(left) is Rope:
+        edge = _piece(left.right)
+        if type(edge) is str and len(edge) + len(right) <= ROPE_CHUNK:
+            return Rope(left.left, edge + right, length)
+    elif type(left) is str and len(left) < ROPE_CHUNK and type(right) is Rope:
+        edge = _piece(right.left)
+        if type(edge) is str and len(left) + len(edge) <= ROPE_CHUNK:
+            return Rope(left + edge, right.right, length)
+    if not left:
+        return right
+    if not right:
+        return left
+    return Rope(left, right, length)
+
+
+def flatten(value):
+    # value with any rope replaced by its str, for results leaving the
+    # interpreter.
+    return str(value) if type(value) is Rope else value
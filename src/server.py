@@ -0,0 +1,300 @@
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import io
+import json
+import math
+import multiprocessing
+import os
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any
+
+from . import nit
+from .bytecode import compile_source
+from .evaluator import MemoCache, MISSING, run_deep
+from .limits import Limits, DeadlineExceeded
+from .numarray import NumArray
+from .pvector import PersistentVector
+from .rope import Rope
+from .vm import VirtualMachine
+
+# Script-execution server. Clients send one JSON request per line over TCP
+# or a Unix socket and get one JSON response per line:
+#
+#   {"id": 1, "source": "price * qty", "bindings": {"price": 3, "qty": 4}}
+#   {"id": 1, "ok": true, "result": 12, "program": "5c0f...", "steps": 4}
+#
+# A response's "program" ID can replace "source" in later requests. Other
+# request fields: "engine" ("evaluate" or "vm"), "max_steps" and "timeout"
+# (seconds), which can only lower the server's limits. Failures come back as
+#   {"id": 1, "ok": false, "error": {"type": "StepLimitExceeded", "message": ...}}
+# Requests on one connection run concurrently, so responses can arrive out
+# of order; match them by "id". A request line longer than the server's
+# line limit is skipped and answered with an error whose "id" is null.
+# Scripts run on a pool of worker processes, so a script that overruns its
+# timeout by the grace period can be killed along with its pool; scripts
+# running in the same pool at the time are run again on a fresh one.
+
+DEFAULT_MAX_STEPS = 10_000_000
+DEFAULT_TIMEOUT = 5.0
+# How long past a request's timeout the server waits for a worker before
+# answering DeadlineExceeded itself, for work the step counter cannot
+# interrupt (a single huge builtin call)
+DEFAULT_GRACE = 1.0
+DEFAULT_PROGRAMS = 1024
+DEFAULT_LINE_LIMIT = 1 << 20
+ENGINES = ('evaluate', 'vm')
+
+
+def program_id(source: str) -> str:
+    return hashlib.sha256(source.encode()).hexdigest()[:16]
+
+
+def to_json(value: Any) -> Any:
+    if value is None or isinstance(value, (int, float, str)):
+        return value
+    if isinstance(value, (list, NumArray, PersistentVector)):
+        return [to_json(item) for item in value]
+    if isinstance(value, Rope):
+        return str(value)
+    return repr(value)
+
+
+# Runs in a worker process: programs stay compiled in nit's cache, and VM
+# code in _vm_code, across the requests a worker serves.
+_vm_code = MemoCache(nit.DEFAULT_CACHE_SIZE)
+
+
+def run_script(source: str, bindings: dict, engine: str, max_steps: int, timeout: float) -> tuple:
+    limits = Limits(max_steps, timeout)
+    if engine == 'vm':
+        code = _vm_code.get(source)
+        if code is MISSING:
+            code = compile_source(source)
+            _vm_code.put(source, code)
+        vm = VirtualMachine(limits=limits)
+        vm.code = code
+        vm.env.update(bindings)
+        # top-level expressions are printed by the VM; keep them out of the
+        # worker's output
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = run_deep(vm.execute)
+    else:
+        result = nit.compile(source).run(bindings, limits)
+    return to_json(result), limits.steps
+
+
+class ScriptServer:
+    def __init__(self, workers: int = None, max_steps: int = DEFAULT_MAX_STEPS,
+                 timeout: float = DEFAULT_TIMEOUT, grace: float = DEFAULT_GRACE,
+                 programs: int = DEFAULT_PROGRAMS, line_limit: int = DEFAULT_LINE_LIMIT):
+        self.workers = workers or os.cpu_count()
+        self.max_steps = max_steps
+        self.timeout = timeout
+        self.grace = grace
+        # program ID -> source, least recently used evicted first
+        self.programs = MemoCache(programs)
+        self.line_limit = line_limit
+        self.pool = None
+        # pools killed for an overrunning script
+        self.killed = weakref.WeakSet()
+        self.server = None
+        # writer -> the task serving that connection
+        self.connections = {}
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0, path: str = None):
+        # Listens on path (a Unix socket) if given, else on host:port; port 0
+        # picks a free port, see address().
+        # Spawned rather than forked, like parallel's pool: the event loop
+        # process may have threads.
+        self.pool = self._new_pool()
+        if path is not None:
+            self.server = await asyncio.start_unix_server(self._client, path=path, limit=self.line_limit)
+        else:
+            self.server = await asyncio.start_server(self._client, host, port, limit=self.line_limit)
+        return self.server
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+
+    def _kill(self, pool: ProcessPoolExecutor):
+        # A running task cannot be cancelled, so its workers are killed;
+        # later requests get a fresh pool, and the killed pool's other
+        # tasks fail with BrokenProcessPool.
+        if self.pool is pool:
+            self.pool = self._new_pool()
+        self.killed.add(pool)
+        for process in list((pool._processes or {}).values()):
+            process.kill()
+        pool.shutdown(wait=False)
+
+    def address(self):
+        return self.server.sockets[0].getsockname()
+
+    async def serve_forever(self):
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            handlers = list(self.connections.values())
+            for writer in list(self.connections):
+                writer.close()
+            await asyncio.gather(*handlers, return_exceptions=True)
+            await self.server.wait_closed()
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+
+    async def _client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        tasks = set()
+        self.connections[writer] = asyncio.current_task()
+        try:
+            while True:
+                try:
+                    line = await reader.readuntil(b'\n')
+                except asyncio.IncompleteReadError as e:
+                    line = e.partial
+                except asyncio.LimitOverrunError:
+                    await self._skip_line(reader)
+                    message = f"Request line longer than {self.line_limit} bytes"
+                    writer.write(json.dumps({'id': None, 'ok': False, 'error': {
+                        'type': 'ValueError', 'message': message}}).encode() + b'\n')
+                    await writer.drain()
+                    continue
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                task = asyncio.ensure_future(self._respond(line, writer))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.connections.pop(writer, None)
+            for task in tasks:
+                task.cancel()
+            writer.close()
+
+    async def _skip_line(self, reader: asyncio.StreamReader):
+        # Drops the rest of an overlong line, up to and including its newline.
+        while True:
+            try:
+                await reader.readuntil(b'\n')
+                return
+            except asyncio.LimitOverrunError as e:
+                await reader.readexactly(e.consumed)
+
+    async def _respond(self, line: bytes, writer: asyncio.StreamWriter):
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            request = None
+            response = {'id': None, 'ok': False, 'error': {'type': 'ValueError', 'message': f"Invalid JSON: {e}"}}
+        if request is not None:
+            response = await self.handle(request)
+        writer.write(json.dumps(response).encode() + b'\n')
+        await writer.drain()
+
+    async def handle(self, request: Any) -> dict:
+        request_id = request.get('id') if isinstance(request, dict) else None
+        try:
+            source, bindings, engine, max_steps, timeout = self._parse(request)
+            pid = program_id(source)
+            self.programs.put(pid, source)
+            result, steps = await self._run(source, bindings, engine, max_steps, timeout)
+        except Exception as e:
+            # script errors, limits, bad requests, and a broken worker pool
+            return {'id': request_id, 'ok': False, 'error': {'type': type(e).__name__, 'message': str(e)}}
+        return {'id': request_id, 'ok': True, 'result': result, 'program': pid, 'steps': steps}
+
+    async def _run(self, source: str, bindings: dict, engine: str, max_steps: int, timeout: float) -> tuple:
+        while True:
+            pool = self.pool
+            future = pool.submit(run_script, source, bindings, engine, max_steps, timeout)
+            try:
+                return await asyncio.wait_for(asyncio.wrap_future(future),
+                                              None if timeout is None else timeout + self.grace)
+            except asyncio.TimeoutError:
+                # a script still queued was just cancelled
+                if future.running():
+                    self._kill(pool)
+                raise DeadlineExceeded(f"Timeout of {timeout}s exceeded") from None
+            except BrokenProcessPool:
+                if pool in self.killed:
+                    # killed for another request's script
+                    continue
+                # a worker died (out of memory, killed); later requests get
+                # a fresh pool
+                if self.pool is pool:
+                    self.pool = self._new_pool()
+                raise
+
+    def _parse(self, request: Any) -> tuple:
+        if not isinstance(request, dict):
+            raise ValueError("Request must be a JSON object")
+        if 'source' in request:
+            source = request['source']
+            if not isinstance(source, str):
+                raise TypeError("source must be a string")
+        elif 'program' in request:
+            source = self.programs.get(request['program'])
+            if source is MISSING:
+                raise LookupError(f"Unknown program {request['program']!r}; send its source again")
+        else:
+            raise ValueError("Request needs a source or a program")
+        bindings = request.get('bindings') or {}
+        if not isinstance(bindings, dict):
+            raise TypeError("bindings must be an object")
+        engine = request.get('engine', 'evaluate')
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine {engine!r}")
+        max_steps = self._limit(request, 'max_steps', self.max_steps)
+        timeout = self._limit(request, 'timeout', self.timeout)
+        return source, bindings, engine, max_steps, timeout
+
+    def _limit(self, request: dict, key: str, ceiling):
+        value = request.get(key)
+        if value is None:
+            return ceiling
+        # json.loads accepts NaN and Infinity, which no limit check would trip
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value) \
+                or value <= 0:
+            raise ValueError(f"{key} must be a positive number")
+        return value if ceiling is None else min(value, ceiling)
+
+
+async def serve(args):
+    server = ScriptServer(args.workers, args.max_steps, args.timeout, line_limit=args.line_limit)
+    await server.start(args.host, args.port, args.unix)
+    print(f"Serving on {args.unix or server.address()}", flush=True)
+    try:
+        await server.serve_forever()
+    finally:
+        await server.close()
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description="Run NITLang scripts for JSON-lines clients.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7070)
+    parser.add_argument('--unix', help="listen on this Unix socket path instead of TCP")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument('--max-steps', type=int, default=DEFAULT_MAX_STEPS)
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, help="seconds per request")
+    parser.add_argument('--line-limit', type=int, default=DEFAULT_LINE_LIMIT, help="longest request line in bytes")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
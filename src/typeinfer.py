@@ -0,0 +1,166 @@
+from .ast_nodes import NumberNode, StringNode, BinaryOpNode, FunctionNode, IfNode, VariableNode, LetNode, \
+    BlockNode, ClassNode, LambdaNode, ForNode, CallNode, iter_child_nodes
+from .optimizer import mutated_names
+
+INT = 'int'
+STRING = 'string'
+# `bool` values are checked as ints
+ANNOTATIONS = {'int': INT, 'bool': INT, 'string': STRING}
+COMPARISON_OPS = ('EQUALS', 'NOT_EQUALS', 'LESS', 'LESS_EQ', 'GREATER', 'GREATER_EQ')
+
+
+# Local type inference from `int`/`bool`/`string` annotations. Within one
+# function body (or the top-level program) it follows, in evaluation order,
+# which names hold an int or a string: annotated parameters and lets, which
+# are checked when bound, and lets whose value has a known type. Names that
+# are ever assigned or taken by `ref` stay untyped, and so do names from
+# enclosing functions, which may be rebound before the function runs. It
+# marks
+#   - BinaryOpNode.operand_type, 'int' or 'string' when both operands have
+#     that type, so compilers can emit ADD_INT, LESS_INT, CONCAT_STR, ...
+#     and evaluate can skip its float check
+#   - LetNode.proven, when the value has the annotated type, so the runtime
+#     check is dropped
+#   - CallNode.arg_types, the type of each argument (None where unknown),
+#     and FunctionNode.checked_types, the types its parameter annotations
+#     check, so calls can skip the callee's parameter checks when they match
+class TypeInference:
+    def __init__(self):
+        self.mutated = set()
+        self.scopes = []
+
+    def infer(self, ast):
+        self.mutated = mutated_names(ast)
+        self.scopes = [{}]
+        self._visit(ast)
+        return ast
+
+    def _lookup(self, name: str, scopes=None):
+        for scope in reversed(self.scopes if scopes is None else scopes):
+            if name in scope:
+                return scope[name]
+        return None
+
+    def _bind(self, name: str, type_name):
+        self.scopes[-1][name] = None if name in self.mutated else type_name
+
+    def _branch(self, node, scope: dict):
+        # Visits an `if` branch on a copy of the innermost scope, since a
+        # `let` directly in the branch binds there only when it runs.
+        self.scopes[-1] = dict(scope)
+        try:
+            return self._visit(node), self.scopes[-1]
+        finally:
+            self.scopes[-1] = scope
+
+    def _function(self, params: list, param_types, body):
+        outer = self.scopes
+        self.scopes = [{}]
+        for param, annotation in zip(params, param_types or [None] * len(params)):
+            self._bind(param, ANNOTATIONS.get(annotation))
+        try:
+            self._visit(body)
+        finally:
+            self.scopes = outer
+
+    def _visit(self, node):
+        if isinstance(node, list):
+            result = None
+            for stmt in node:
+                result = self._visit(stmt)
+            return result
+
+        if isinstance(node, NumberNode):
+            return INT if type(node.value) is int else None
+
+        if isinstance(node, StringNode):
+            return STRING
+
+        if isinstance(node, VariableNode):
+            return self._lookup(node.name)
+
+        if isinstance(node, BinaryOpNode):
+            left = self._visit(node.left)
+            right = self._visit(node.right)
+            node.operand_type = left if left is not None and left == right else None
+            if node.op in COMPARISON_OPS:
+                return INT
+            if node.op == 'PLUS' or (node.op in ('MINUS', 'MUL') and node.operand_type == INT):
+                return node.operand_type
+            return None
+
+        if isinstance(node, CallNode):
+            arg_types = tuple(self._visit(arg) for arg in node.args)
+            node.arg_types = arg_types if any(arg_types) else None
+            return None
+
+        if isinstance(node, IfNode):
+            self._visit(node.condition)
+            scope = self.scopes[-1]
+            then_type, then_scope = self._branch(node.then_branch, scope)
+            else_type, else_scope = self._branch(node.else_branch, scope)
+            # after the `if`, a name keeps its type only if both paths agree
+            for name in then_scope.keys() | else_scope.keys():
+                then_name = then_scope[name] if name in then_scope else self._lookup(name, self.scopes[:-1])
+                else_name = else_scope[name] if name in else_scope else self._lookup(name, self.scopes[:-1])
+                scope[name] = then_name if then_name == else_name else None
+            return then_type if then_type == else_type else None
+
+        if isinstance(node, BlockNode):
+            self.scopes.append({})
+            try:
+                result = self._visit(node.statements)
+            finally:
+                self.scopes.pop()
+            return result
+
+        if isinstance(node, ForNode):
+            self._visit(node.iterable)
+            # array elements can have any type
+            self.scopes.append({node.name: None})
+            try:
+                self._visit(node.body.statements)
+            finally:
+                self.scopes.pop()
+            return None
+
+        if isinstance(node, LetNode):
+            if node.value is None:
+                return None
+            value_type = self._visit(node.value)
+            if node.type_node:
+                declared = ANNOTATIONS.get(node.type_node.type_name)
+                node.proven = declared is not None and value_type == declared
+                self._bind(node.name, declared)
+            else:
+                self._bind(node.name, value_type)
+            return None
+
+        if isinstance(node, FunctionNode):
+            self._bind(node.name, None)
+            if node.param_types is not None:
+                node.checked_types = tuple(ANNOTATIONS.get(t) for t in node.param_types)
+            self._function(node.params, node.param_types, node.body)
+            return None
+
+        if isinstance(node, LambdaNode):
+            self._function([node.param], None, node.body)
+            return None
+
+        if isinstance(node, ClassNode):
+            self._bind(node.name, None)
+            # methods can run with missing arguments, which leaves a
+            # parameter unbound, so their parameters stay untyped
+            for field in node.fields:
+                self._function([], None, field)
+            for method in node.methods.values():
+                self._function(method.params, None, method.body)
+            return None
+
+        for child in iter_child_nodes(node):
+            self._visit(child)
+        return None
+
+
+def infer_types(ast):
+    return TypeInference().infer(ast)
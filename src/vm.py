@@ -1,3 +1,13 @@
+import operator
+from time import perf_counter
+from .environment import Environment
+from .evaluator import builtin_map, builtin_filter, builtin_reduce, check_type, check_args
+from .numarray import ARRAY_TYPES
+from .parallel import parallel_builtins
+from .rope import STRING_TYPES, concat
+from .typeinfer import ANNOTATIONS
+
+
 class VMInstruction:
     def __init__(self, op: str, operand=None):
         self.op = op
@@ -9,11 +19,201 @@ class VMInstruction:
         return self.op
 
 
+OPCODES = [
+    'LOAD', 'ADD', 'SUB', 'MUL', 'DIV',
+    'EQUALS', 'NOT_EQUALS', 'LESS', 'LESS_EQ', 'GREATER', 'GREATER_EQ',
+    'PRINT', 'STORE', 'LOAD_VAR', 'JMP', 'JZ', 'JNZ',
+    'POP', 'ASSIGN', 'CALL', 'RET', 'MAKE_CLOSURE', 'BUILD_ARRAY', 'INDEX',
+    # typed operators, emitted for operands proven by typeinfer.infer_types
+    'ADD_INT', 'SUB_INT', 'MUL_INT', 'CONCAT_STR',
+    'EQUALS_INT', 'NOT_EQUALS_INT', 'LESS_INT', 'LESS_EQ_INT', 'GREATER_INT', 'GREATER_EQ_INT',
+    'CHECK_TYPE',
+    # loops: GET_ITER replaces an array with an iterator over it; ITER_NEXT
+    # pushes the iterator's next item, or pops the iterator and jumps once
+    # it is exhausted
+    'GET_ITER', 'ITER_NEXT',
+    # superinstructions, only produced by assemble()
+    'LOAD_VAR_LOAD_ADD', 'LOAD_VAR_LOAD_SUB', 'LOAD_VAR_LOAD_ADD_STORE', 'LOAD_VAR_LOAD_VAR',
+    'COMPARE_JZ', 'LOAD_VAR_LOAD_COMPARE_JZ', 'ITER_NEXT_STORE',
+]
+OPCODE = {name: i for i, name in enumerate(OPCODES)}
+
+COMPARE_OPS = {
+    'EQUALS': operator.eq,
+    'NOT_EQUALS': operator.ne,
+    'LESS': operator.lt,
+    'LESS_EQ': operator.le,
+    'GREATER': operator.gt,
+    'GREATER_EQ': operator.ge,
+}
+# Typed comparisons do the same work as the generic ones, so they share
+# their handlers; assemble() rewrites them before fusing. Typed arithmetic
+# has its own handlers, which skip ADD's string check.
+GENERIC_OPS = {
+    'EQUALS_INT': 'EQUALS', 'NOT_EQUALS_INT': 'NOT_EQUALS', 'LESS_INT': 'LESS', 'LESS_EQ_INT': 'LESS_EQ',
+    'GREATER_INT': 'GREATER', 'GREATER_EQ_INT': 'GREATER_EQ',
+}
+JUMP_OPS = ('JMP', 'JZ', 'JNZ', 'ITER_NEXT')
+BUILTINS = {
+    'map': builtin_map,
+    'filter': builtin_filter,
+    'reduce': builtin_reduce,
+    **parallel_builtins(),
+}
+FUSABLE_OPS = {'LOAD_VAR', 'ITER_NEXT'} | set(COMPARE_OPS)
+# ITER_NEXT's result when the iterator is exhausted
+_DONE = object()
+
+
+def _opcodes(*names):
+    return tuple(OPCODE[name] for name in names)
+
+
+# the opcodes _run_fast dispatches on, unpacked into its locals per call
+_FAST_OPCODES = _opcodes('LOAD', 'ADD', 'SUB', 'MUL', 'DIV', 'EQUALS', 'NOT_EQUALS', 'LESS', 'LESS_EQ', 'GREATER',
+    'GREATER_EQ', 'PRINT', 'STORE', 'LOAD_VAR', 'JMP', 'JZ', 'JNZ', 'POP', 'ASSIGN', 'CALL', 'RET', 'MAKE_CLOSURE',
+    'BUILD_ARRAY', 'INDEX', 'CHECK_TYPE', 'LOAD_VAR_LOAD_ADD', 'LOAD_VAR_LOAD_SUB', 'LOAD_VAR_LOAD_ADD_STORE',
+    'LOAD_VAR_LOAD_VAR', 'COMPARE_JZ', 'LOAD_VAR_LOAD_COMPARE_JZ', 'GET_ITER', 'ITER_NEXT', 'ITER_NEXT_STORE',
+    'ADD_INT', 'SUB_INT', 'MUL_INT', 'CONCAT_STR')
+
+
+def _fuse(ops, operands, i, targets):
+    op = ops[i]
+    n = len(ops)
+    if op == 'LOAD_VAR' and i + 1 < n and i + 1 not in targets:
+        following = ops[i + 1]
+        if following == 'LOAD' and i + 2 < n and i + 2 not in targets:
+            name, const = operands[i], operands[i + 1]
+            third = ops[i + 2]
+            fourth = ops[i + 3] if i + 3 < n and i + 3 not in targets else None
+            if third in COMPARE_OPS and fourth == 'JZ':
+                return 4, 'LOAD_VAR_LOAD_COMPARE_JZ', (name, const, COMPARE_OPS[third], operands[i + 3])
+            # string appends stay on ADD, which builds ropes
+            numeric = not isinstance(const, str)
+            adds = third == 'ADD_INT' or (third == 'ADD' and numeric)
+            if adds and fourth in ('STORE', 'ASSIGN'):
+                return 4, 'LOAD_VAR_LOAD_ADD_STORE', (name, const, operands[i + 3], fourth == 'ASSIGN')
+            if adds:
+                return 3, 'LOAD_VAR_LOAD_ADD', (name, const)
+            if third in ('SUB', 'SUB_INT'):
+                return 3, 'LOAD_VAR_LOAD_SUB', (name, const)
+        elif following == 'LOAD_VAR':
+            return 2, 'LOAD_VAR_LOAD_VAR', (operands[i], operands[i + 1])
+    elif op in COMPARE_OPS and i + 1 < n and ops[i + 1] == 'JZ' and i + 1 not in targets:
+        return 2, 'COMPARE_JZ', (COMPARE_OPS[op], operands[i + 1])
+    elif op == 'ITER_NEXT' and i + 1 < n and ops[i + 1] == 'STORE' and i + 1 not in targets:
+        return 2, 'ITER_NEXT_STORE', (operands[i + 1], operands[i])
+    return 1, op, operands[i]
+
+
+def assemble(code):
+    ops = [GENERIC_OPS.get(inst.op, inst.op) for inst in code]
+    operands = [inst.operand for inst in code]
+    targets = {operand for op, operand in zip(ops, operands) if op in JUMP_OPS}
+    targets.update(operand[2] for op, operand in zip(ops, operands) if op == 'MAKE_CLOSURE')
+    fusable = FUSABLE_OPS
+
+    program_ops = []
+    program_args = []
+    new_index = {}
+    i = 0
+    n = len(ops)
+    while i < n:
+        if i in targets:
+            new_index[i] = len(program_ops)
+        op = ops[i]
+        if op in fusable:
+            width, op, operand = _fuse(ops, operands, i, targets)
+        else:
+            width, operand = 1, operands[i]
+        opcode = OPCODE.get(op)
+        if opcode is None:
+            raise ValueError(f"Unknown instruction: {code[i]}")
+        program_ops.append(opcode)
+        program_args.append(operand)
+        i += width
+    new_index[n] = len(program_ops)
+
+    compare_jz, fused_compare_jz = OPCODE['COMPARE_JZ'], OPCODE['LOAD_VAR_LOAD_COMPARE_JZ']
+    make_closure, iter_next_store = OPCODE['MAKE_CLOSURE'], OPCODE['ITER_NEXT_STORE']
+    relocate = {OPCODE[op] for op in JUMP_OPS}
+    for i, op in enumerate(program_ops):
+        if op in relocate:
+            program_args[i] = new_index[program_args[i]]
+        elif op == compare_jz:
+            compare, target = program_args[i]
+            program_args[i] = (compare, new_index[target])
+        elif op == fused_compare_jz:
+            name, const, compare, target = program_args[i]
+            program_args[i] = (name, const, compare, new_index[target])
+        elif op == make_closure:
+            name, params, entry, param_types = program_args[i]
+            program_args[i] = (name, params, new_index[entry], param_types)
+        elif op == iter_next_store:
+            name, target = program_args[i]
+            program_args[i] = (name, new_index[target])
+    return tuple(program_ops), tuple(program_args)
+
+
+def index_array(array_val, index_val):
+    if not isinstance(array_val, ARRAY_TYPES):
+        raise TypeError("Indexing only supported on arrays")
+    if not isinstance(index_val, int):
+        raise TypeError("Array index must be an integer")
+    if index_val < 0 or index_val >= len(array_val):
+        raise IndexError(f"Array index {index_val} out of bounds")
+    return array_val[index_val]
+
+
+def array_iter(iterable):
+    if not isinstance(iterable, ARRAY_TYPES):
+        raise TypeError("Can only loop over arrays")
+    return iter(iterable)
+
+
+def func_scope(func, args, arg_types=None):
+    if len(args) != len(func.params):
+        raise TypeError(f"Function {func.name} expected {len(func.params)} args, got {len(args)}")
+    # arg_types are the argument types infer_types proved at the call site;
+    # when they are exactly the annotated types the checks cannot fail
+    if func.param_types is not None and arg_types != func.checked_types:
+        check_args(func.param_types, args)
+    scope = Environment(func.scope)
+    scope.vars.update(zip(func.params, args))
+    return scope
+
+
+class Closure:
+    def __init__(self, name: str, params: tuple, entry: int, scope: Environment, vm: 'VirtualMachine',
+                 param_types: tuple = None):
+        self.name = name
+        self.params = params
+        self.entry = entry
+        self.scope = scope
+        self.vm = vm
+        self.param_types = param_types
+        self.checked_types = None if param_types is None else tuple(ANNOTATIONS.get(t) for t in param_types)
+
+    def __call__(self, args):
+        return self.vm.invoke(self, args)
+
+    def __repr__(self):
+        return f"Closure({self.name}, {list(self.params)})"
+
+
 class VirtualMachine:
-    def __init__(self):
+    def __init__(self, fast: bool = False, profiler=None, limits=None):
         self.stack = []
-        self.env = {}
+        self.env = dict(BUILTINS)
+        if limits is not None:
+            # pool workers could not charge their work to limits
+            self.env.update(pmap=builtin_map, pfilter=builtin_filter, preduce=builtin_reduce)
         self.code = []
+        self.fast = fast
+        self.profiler = profiler
+        self.limits = limits
+        self.scope = None
+        self._assembled = None
 
     def load(self, value):
         self.stack.append(value)
@@ -21,7 +221,7 @@ class VirtualMachine:
     def add(self):
         b = self.stack.pop()
         a = self.stack.pop()
-        self.stack.append(a + b)
+        self.stack.append(concat(a, b) if isinstance(a, STRING_TYPES) else a + b)
 
     def sub(self):
         b = self.stack.pop()
@@ -33,6 +233,22 @@ class VirtualMachine:
         a = self.stack.pop()
         self.stack.append(a * b)
 
+    def add_int(self):
+        b = self.stack.pop()
+        self.stack.append(self.stack.pop() + b)
+
+    def sub_int(self):
+        b = self.stack.pop()
+        self.stack.append(self.stack.pop() - b)
+
+    def mul_int(self):
+        b = self.stack.pop()
+        self.stack.append(self.stack.pop() * b)
+
+    def concat_str(self):
+        b = self.stack.pop()
+        self.stack.append(concat(self.stack.pop(), b))
+
     def div(self):
         b = self.stack.pop()
         a = self.stack.pop()
@@ -75,11 +291,84 @@ class VirtualMachine:
         print(result)
         return result
 
+    def check_type(self, type_name):
+        check_type(type_name, self.stack[-1])
+
     def store(self, name):
-        self.env[name] = self.stack.pop()
+        self.scope.vars[name] = self.stack.pop()
+
+    def assign(self, name):
+        self.scope.assign(name, self.stack.pop())
 
     def load_var(self, name):
-        self.stack.append(self.env[name])
+        self.stack.append(self.scope.get(name))
+
+    def pop(self):
+        self.stack.pop()
+
+    def make_closure(self, operand):
+        name, params, entry, param_types = operand
+        self.stack.append(Closure(name, params, entry, self.scope, self, param_types))
+
+    def build_array(self, count):
+        start = len(self.stack) - count
+        elements = self.stack[start:]
+        del self.stack[start:]
+        self.stack.append(elements)
+
+    def index(self):
+        index_val = self.stack.pop()
+        array_val = self.stack.pop()
+        self.stack.append(index_array(array_val, index_val))
+
+    def get_iter(self):
+        self.stack.append(array_iter(self.stack.pop()))
+
+    def iter_next(self, target):
+        value = next(self.stack[-1], _DONE)
+        if value is _DONE:
+            self.stack.pop()
+            return target
+        self.stack.append(value)
+        return None
+
+    def call(self, operand, return_ip, frames):
+        argc, arg_types = operand
+        start = len(self.stack) - argc
+        args = self.stack[start:]
+        del self.stack[start:]
+        func = self.stack.pop()
+        if isinstance(func, Closure):
+            frames.append((return_ip, self.scope))
+            self.scope = func_scope(func, args, arg_types)
+            return func.entry
+        if callable(func):
+            self.stack.append(func(args))
+            return return_ip
+        raise TypeError(f"{func} is not a function")
+
+    def invoke(self, closure, args):
+        saved_scope = self.scope
+        self.scope = func_scope(closure, args)
+        try:
+            if self.profiler is not None:
+                self.profiler.enter(closure.name)
+                try:
+                    return self._run_profiled(closure.entry)
+                finally:
+                    self.profiler.leave()
+            if self.limits is not None:
+                return self._run_limited(closure.entry)
+            if self.fast:
+                return self._run_fast(closure.entry)
+            return self._run(closure.entry)
+        finally:
+            self.scope = saved_scope
+
+    def global_scope(self):
+        scope = Environment()
+        scope.vars = self.env
+        return scope
 
     def jump(self, target):
         return target
@@ -97,8 +386,26 @@ class VirtualMachine:
         return None
 
     def execute(self):
-        ip = 0
+        if self.profiler is not None:
+            self.scope = self.global_scope()
+            self.profiler.start()
+            try:
+                return self._run_profiled(0)
+            finally:
+                self.profiler.stop()
+        if self.limits is not None:
+            self.scope = self.global_scope()
+            self.limits.start()
+            return self._run_limited(0)
+        if self.fast:
+            return self.execute_fast()
+
+        self.scope = self.global_scope()
+        return self._run(0)
+
+    def _run(self, ip):
         last_result = None
+        frames = []
 
         while ip < len(self.code):
             inst = self.code[ip]
@@ -106,6 +413,15 @@ class VirtualMachine:
             if inst.op == 'LOAD':
                 self.load(inst.operand)
                 ip += 1
+            elif inst.op == 'ADD_INT':
+                self.add_int()
+                ip += 1
+            elif inst.op == 'SUB_INT':
+                self.sub_int()
+                ip += 1
+            elif inst.op == 'LESS_INT':
+                self.less()
+                ip += 1
             elif inst.op == 'ADD':
                 self.add()
                 ip += 1
@@ -136,6 +452,16 @@ class VirtualMachine:
             elif inst.op == 'GREATER_EQ':
                 self.greater_eq()
                 ip += 1
+            elif inst.op == 'MUL_INT':
+                self.mul_int()
+                ip += 1
+            elif inst.op == 'CONCAT_STR':
+                self.concat_str()
+                ip += 1
+            elif inst.op in GENERIC_OPS:
+                # the remaining typed comparisons
+                getattr(self, GENERIC_OPS[inst.op].lower())()
+                ip += 1
             elif inst.op == 'PRINT':
                 last_result = self.print()
                 ip += 1
@@ -159,7 +485,327 @@ class VirtualMachine:
                     ip = target
                 else:
                     ip += 1
+            elif inst.op == 'POP':
+                self.pop()
+                ip += 1
+            elif inst.op == 'ASSIGN':
+                self.assign(inst.operand)
+                ip += 1
+            elif inst.op == 'MAKE_CLOSURE':
+                self.make_closure(inst.operand)
+                ip += 1
+            elif inst.op == 'CALL':
+                ip = self.call(inst.operand, ip + 1, frames)
+            elif inst.op == 'RET':
+                if not frames:
+                    return self.stack.pop()
+                ip, self.scope = frames.pop()
+            elif inst.op == 'BUILD_ARRAY':
+                self.build_array(inst.operand)
+                ip += 1
+            elif inst.op == 'INDEX':
+                self.index()
+                ip += 1
+            elif inst.op == 'CHECK_TYPE':
+                self.check_type(inst.operand)
+                ip += 1
+            elif inst.op == 'GET_ITER':
+                self.get_iter()
+                ip += 1
+            elif inst.op == 'ITER_NEXT':
+                target = self.iter_next(inst.operand)
+                if target is not None:
+                    ip = target
+                else:
+                    ip += 1
             else:
                 raise ValueError(f"Unknown instruction: {inst}")
 
-        return last_result
\ No newline at end of file
+        return last_result
+
+    def _handlers(self) -> tuple:
+        # Methods for the instructions that neither jump nor call: those
+        # taking their operand, and those without one.
+        simple = {
+            'LOAD': self.load, 'STORE': self.store, 'LOAD_VAR': self.load_var, 'ASSIGN': self.assign,
+            'MAKE_CLOSURE': self.make_closure, 'BUILD_ARRAY': self.build_array, 'CHECK_TYPE': self.check_type,
+        }
+        nullary = {
+            'ADD': self.add, 'SUB': self.sub, 'MUL': self.mul, 'DIV': self.div,
+            'EQUALS': self.equals, 'NOT_EQUALS': self.not_equals, 'LESS': self.less, 'LESS_EQ': self.less_eq,
+            'GREATER': self.greater, 'GREATER_EQ': self.greater_eq, 'POP': self.pop, 'INDEX': self.index,
+            'GET_ITER': self.get_iter, 'ADD_INT': self.add_int, 'SUB_INT': self.sub_int, 'MUL_INT': self.mul_int,
+            'CONCAT_STR': self.concat_str,
+        }
+        nullary.update((op, nullary[generic]) for op, generic in GENERIC_OPS.items())
+        return simple, nullary
+
+    def _run_profiled(self, ip):
+        # _run's semantics with every instruction timed and closure calls
+        # recorded as profiler frames. Only used when a profiler is set, so
+        # _run and _run_fast stay free of profiling checks.
+        profiler = self.profiler
+        simple, nullary = self._handlers()
+        last_result = None
+        frames = []
+
+        while ip < len(self.code):
+            inst = self.code[ip]
+            op = inst.op
+            start = perf_counter()
+            if op in nullary:
+                nullary[op]()
+                ip += 1
+            elif op in simple:
+                simple[op](inst.operand)
+                ip += 1
+            elif op == 'PRINT':
+                last_result = self.print()
+                ip += 1
+            elif op == 'JMP':
+                ip = inst.operand
+            elif op == 'JZ' or op == 'JNZ' or op == 'ITER_NEXT':
+                jump = self.jump_if_zero if op == 'JZ' else self.jump_if_not_zero if op == 'JNZ' else self.iter_next
+                target = jump(inst.operand)
+                ip = target if target is not None else ip + 1
+            elif op == 'CALL':
+                func = self.stack[-1 - inst.operand[0]]
+                depth = len(frames)
+                ip = self.call(inst.operand, ip + 1, frames)
+                if len(frames) > depth:
+                    profiler.enter(func.name)
+            elif op == 'RET':
+                profiler.opcode(op, perf_counter() - start)
+                if not frames:
+                    return self.stack.pop()
+                ip, self.scope = frames.pop()
+                profiler.leave()
+                continue
+            else:
+                raise ValueError(f"Unknown instruction: {inst}")
+            profiler.opcode(op, perf_counter() - start)
+
+        return last_result
+
+    def _run_limited(self, ip):
+        # _run's semantics with each instruction charged to self.limits,
+        # which raises once its step budget or timeout runs out.
+        step = self.limits.step
+        simple, nullary = self._handlers()
+        last_result = None
+        frames = []
+
+        while ip < len(self.code):
+            step()
+            inst = self.code[ip]
+            op = inst.op
+            if op in nullary:
+                nullary[op]()
+                ip += 1
+            elif op in simple:
+                simple[op](inst.operand)
+                ip += 1
+            elif op == 'PRINT':
+                last_result = self.print()
+                ip += 1
+            elif op == 'JMP':
+                ip = inst.operand
+            elif op == 'JZ' or op == 'JNZ' or op == 'ITER_NEXT':
+                jump = self.jump_if_zero if op == 'JZ' else self.jump_if_not_zero if op == 'JNZ' else self.iter_next
+                target = jump(inst.operand)
+                ip = target if target is not None else ip + 1
+            elif op == 'CALL':
+                ip = self.call(inst.operand, ip + 1, frames)
+            elif op == 'RET':
+                if not frames:
+                    return self.stack.pop()
+                ip, self.scope = frames.pop()
+            else:
+                raise ValueError(f"Unknown instruction: {inst}")
+
+        return last_result
+
+    def assembled(self):
+        if self._assembled is None or self._assembled[0] is not self.code:
+            self._assembled = (self.code, assemble(self.code))
+        return self._assembled[1]
+
+    def execute_fast(self):
+        self.scope = self.global_scope()
+        return self._run_fast(0)
+
+    def _run_fast(self, ip):
+        ops, args = self.assembled()
+        stack = self.stack
+        push = stack.append
+        pop = stack.pop
+        scope = self.scope
+        local_vars = scope.vars
+        frames = []
+
+        (LOAD, ADD, SUB, MUL, DIV, EQUALS, NOT_EQUALS, LESS, LESS_EQ, GREATER, GREATER_EQ, PRINT, STORE, LOAD_VAR,
+         JMP, JZ, JNZ, POP, ASSIGN, CALL, RET, MAKE_CLOSURE, BUILD_ARRAY, INDEX, CHECK_TYPE, LOAD_VAR_LOAD_ADD,
+         LOAD_VAR_LOAD_SUB, LOAD_VAR_LOAD_ADD_STORE, LOAD_VAR_LOAD_VAR, COMPARE_JZ, LOAD_VAR_LOAD_COMPARE_JZ,
+         GET_ITER, ITER_NEXT, ITER_NEXT_STORE, ADD_INT, SUB_INT, MUL_INT, CONCAT_STR) = _FAST_OPCODES
+        done = _DONE
+
+        end = len(ops)
+        last_result = None
+
+        while ip < end:
+            op = ops[ip]
+            arg = args[ip]
+            ip += 1
+
+            if op == LOAD_VAR_LOAD_COMPARE_JZ:
+                name, const, compare, target = arg
+                value = local_vars[name] if name in local_vars else scope.get(name)
+                if not compare(value, const):
+                    ip = target
+            elif op == LOAD_VAR:
+                push(local_vars[arg] if arg in local_vars else scope.get(arg))
+            elif op == LOAD:
+                push(arg)
+            elif op == LOAD_VAR_LOAD_ADD_STORE:
+                name, const, dest, is_assign = arg
+                value = (local_vars[name] if name in local_vars else scope.get(name)) + const
+                if is_assign and dest not in local_vars:
+                    scope.assign(dest, value)
+                else:
+                    local_vars[dest] = value
+            elif op == STORE:
+                local_vars[arg] = pop()
+            elif op == JMP:
+                ip = arg
+            elif op == LOAD_VAR_LOAD_ADD:
+                name = arg[0]
+                push((local_vars[name] if name in local_vars else scope.get(name)) + arg[1])
+            elif op == LOAD_VAR_LOAD_SUB:
+                name = arg[0]
+                push((local_vars[name] if name in local_vars else scope.get(name)) - arg[1])
+            elif op == LOAD_VAR_LOAD_VAR:
+                first, second = arg
+                push(local_vars[first] if first in local_vars else scope.get(first))
+                push(local_vars[second] if second in local_vars else scope.get(second))
+            elif op == COMPARE_JZ:
+                b = pop()
+                if not arg[0](pop(), b):
+                    ip = arg[1]
+            elif op == ITER_NEXT_STORE:
+                value = next(stack[-1], done)
+                if value is done:
+                    pop()
+                    ip = arg[1]
+                else:
+                    local_vars[arg[0]] = value
+            elif op == CALL:
+                argc, arg_types = arg
+                if argc:
+                    call_args = stack[-argc:]
+                    del stack[-argc:]
+                else:
+                    call_args = []
+                func = pop()
+                if type(func) is Closure:
+                    frames.append((ip, scope))
+                    scope = func_scope(func, call_args, arg_types)
+                    local_vars = scope.vars
+                    ip = func.entry
+                elif callable(func):
+                    self.scope = scope
+                    push(func(call_args))
+                else:
+                    raise TypeError(f"{func} is not a function")
+            elif op == RET:
+                if not frames:
+                    return pop()
+                ip, scope = frames.pop()
+                local_vars = scope.vars
+            elif op == ADD_INT:
+                b = pop()
+                push(pop() + b)
+            elif op == SUB_INT:
+                b = pop()
+                push(pop() - b)
+            elif op == ADD:
+                b = pop()
+                a = pop()
+                push(concat(a, b) if isinstance(a, STRING_TYPES) else a + b)
+            elif op == SUB:
+                b = pop()
+                push(pop() - b)
+            elif op == MUL:
+                b = pop()
+                push(pop() * b)
+            elif op == DIV:
+                b = pop()
+                if b == 0:
+                    raise ZeroDivisionError("Division by zero")
+                push(pop() / b)
+            elif op == JZ:
+                if pop() == 0:
+                    ip = arg
+            elif op == JNZ:
+                if pop() != 0:
+                    ip = arg
+            elif op == POP:
+                pop()
+            elif op == ASSIGN:
+                if arg in local_vars:
+                    local_vars[arg] = pop()
+                else:
+                    scope.assign(arg, pop())
+            elif op == INDEX:
+                index_val = pop()
+                push(index_array(pop(), index_val))
+            elif op == MAKE_CLOSURE:
+                name, params, entry, param_types = arg
+                push(Closure(name, params, entry, scope, self, param_types))
+            elif op == BUILD_ARRAY:
+                if arg:
+                    elements = stack[-arg:]
+                    del stack[-arg:]
+                else:
+                    elements = []
+                push(elements)
+            elif op == PRINT:
+                last_result = self.print()
+            elif op == EQUALS:
+                b = pop()
+                push(1 if pop() == b else 0)
+            elif op == NOT_EQUALS:
+                b = pop()
+                push(1 if pop() != b else 0)
+            elif op == LESS:
+                b = pop()
+                push(1 if pop() < b else 0)
+            elif op == LESS_EQ:
+                b = pop()
+                push(1 if pop() <= b else 0)
+            elif op == GREATER:
+                b = pop()
+                push(1 if pop() > b else 0)
+            elif op == GREATER_EQ:
+                b = pop()
+                push(1 if pop() >= b else 0)
+            elif op == MUL_INT:
+                b = pop()
+                push(pop() * b)
+            elif op == CONCAT_STR:
+                b = pop()
+                push(concat(pop(), b))
+            elif op == CHECK_TYPE:
+                check_type(arg, stack[-1])
+            elif op == GET_ITER:
+                push(array_iter(pop()))
+            elif op == ITER_NEXT:
+                value = next(stack[-1], done)
+                if value is done:
+                    pop()
+                    ip = arg
+                else:
+                    push(value)
+            else:
+                raise ValueError(f"Unknown opcode: {op}")
+
+        return last_result
@@ -0,0 +1,69 @@
+import contextlib
+import io
+
+from src import closure_compiler
+from src.lexer import tokenize
+from src.parser import Parser
+from src.optimizer import optimize
+from src.escape import analyze_scopes
+from src.resolver import resolve
+from src.typeinfer import infer_types
+from src.purity import analyze_purity
+from src.compiler import Compiler
+from src.vm import VirtualMachine
+from src.register_compiler import RegisterCompiler
+from src.register_vm import RegisterVM
+from src.evaluator import evaluate, create_global_env, run_deep
+
+ENGINES = ('evaluate', 'jit', 'closure', 'vm', 'vm_fast', 'registers')
+# engines that implement objects, refs and element assignment
+AST_ENGINES = ('evaluate', 'jit', 'closure')
+
+
+# Runs source the way main.py runs each engine, with the JIT translating
+# every function on its first call, and returns the last statement's value.
+def run(engine: str, source: str):
+    ast = optimize(Parser(tokenize(source)).parse())
+    if engine in ('evaluate', 'jit'):
+        ast = analyze_purity(infer_types(resolve(analyze_scopes(ast))))
+        env = create_global_env(jit=engine == 'jit', jit_threshold=1)
+        return run_deep(evaluate, ast, env)
+    if engine == 'closure':
+        program = closure_compiler.compile_node(infer_types(analyze_scopes(ast)))
+        return run_deep(program, create_global_env())
+    if engine == 'registers':
+        vm = RegisterVM()
+        vm.program = RegisterCompiler().compile(infer_types(ast))
+    else:
+        vm = VirtualMachine(fast=engine == 'vm_fast')
+        vm.code = Compiler().compile(infer_types(ast))
+    with contextlib.redirect_stdout(io.StringIO()):
+        return run_deep(vm.execute)
+
+
+def plain(value):
+    # Ropes, NumArrays and vectors as the strs and lists they stand for.
+    if hasattr(value, 'tolist'):
+        return [plain(item) for item in value.tolist()]
+    if isinstance(value, list):
+        return [plain(item) for item in value]
+    if type(value).__name__ == 'Rope':
+        return str(value)
+    return value
+
+
+# The result of source in each engine, or the type of the error it raised;
+# engines word their error messages differently.
+def outcomes(source: str, engines=ENGINES) -> dict:
+    results = {}
+    for engine in engines:
+        try:
+            results[engine] = plain(run(engine, source))
+        except Exception as e:
+            results[engine] = type(e)
+    return results
+
+
+def assert_agree(source: str, expected, engines=ENGINES):
+    results = outcomes(source, engines)
+    assert results == {engine: expected for engine in engines}, results
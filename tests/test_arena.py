@@ -0,0 +1,42 @@
+from src.ast_nodes import ASTNode
+from src.arena import to_arena
+from src.lexer import tokenize
+from src.parser import Parser
+from src.compiler import Compiler
+from src.vm import VirtualMachine
+from src.register_compiler import RegisterCompiler
+from src.register_vm import RegisterVM
+from src.evaluator import evaluate, create_global_env
+
+SOURCE = ("func fib(n) = if n < 2 then n else fib(n - 1) + fib(n - 2)\n"
+          "class P { let x = 1\nfunc get() = x }\nlet xs = map(lambda x -> x * 2, [1, 2, 3])\n"
+          "for x in xs { let y = x }\nfib(10) + xs[2]")
+
+
+def parse(source: str):
+    return Parser(tokenize(source)).parse()
+
+
+def test_round_trip():
+    ast = parse(SOURCE)
+    assert repr(to_arena(ast).to_ast()) == repr(ast)
+
+
+def test_engines_run_arenas():
+    arena = to_arena(parse(SOURCE))
+    assert evaluate(arena, create_global_env()) == 61
+    vm = VirtualMachine()
+    vm.code = Compiler().compile(to_arena(parse("func fib(n) = if n < 2 then n else fib(n - 1) + fib(n - 2)\nfib(10)")))
+    assert vm.execute() == 55
+    register_vm = RegisterVM()
+    register_vm.program = RegisterCompiler().compile(to_arena(parse("let a = 3\na * 4")))
+    assert register_vm.execute() == 12
+
+
+def test_arena_does_not_keep_the_tree():
+    arena = to_arena(parse(SOURCE))
+    evaluate(arena, create_global_env())
+    fields = list(vars(arena).values())
+    held = fields + [item for field in fields if isinstance(field, list) for item in field]
+    assert not any(isinstance(obj, ASTNode) for obj in held)
+    assert arena.to_ast() is not arena.to_ast()
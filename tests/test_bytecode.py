@@ -0,0 +1,45 @@
+import ast
+import inspect
+
+import pytest
+
+from src import bytecode
+from src.bytecode import BytecodeCache, compile_source, dumps, loads
+
+SOURCE = 'func fib(n) = if n < 2 then n else fib(n - 1) + fib(n - 2)\nlet s = "a" + "b"\nfib(10)'
+
+
+def test_round_trip():
+    instructions = compile_source(SOURCE)
+    assert [(i.op, i.operand) for i in loads(dumps(instructions))] == \
+        [(i.op, i.operand) for i in instructions]
+
+
+def test_cache_hit(tmp_path):
+    first = BytecodeCache(str(tmp_path))
+    first.compile(SOURCE)
+    second = BytecodeCache(str(tmp_path))
+    second.compile(SOURCE)
+    assert (first.misses, second.hits) == (1, 1)
+
+
+def test_other_compiler_version_is_stale(tmp_path, monkeypatch):
+    BytecodeCache(str(tmp_path)).compile(SOURCE)
+    monkeypatch.setattr(bytecode, 'COMPILER_DIGEST', b'\0' * 8)
+    cache = BytecodeCache(str(tmp_path))
+    cache.compile(SOURCE)
+    assert (cache.hits, cache.misses) == (0, 1)
+    with pytest.raises(ValueError):
+        loads(dumps(compile_source(SOURCE)).replace(bytecode.COMPILER_DIGEST, b'\1' * 8, 1))
+
+
+def test_toolchain_covers_compile_imports():
+    # every src module the front end, optimizer, type inference and compiler
+    # import is hashed into the compiler digest; vm only through its opcodes
+    names = {module.__name__.rsplit('.', 1)[1] for module in bytecode.TOOLCHAIN}
+    for module in bytecode.TOOLCHAIN:
+        if module.__name__ == 'src.evaluator':
+            continue
+        for node in ast.walk(ast.parse(inspect.getsource(module))):
+            if isinstance(node, ast.ImportFrom) and node.level == 1:
+                assert node.module in names | {'vm'}, f"{module.__name__} imports {node.module}"
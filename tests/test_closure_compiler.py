@@ -0,0 +1,52 @@
+import pytest
+
+from src import closure_compiler
+from src.lexer import tokenize
+from src.parser import Parser
+from src.optimizer import optimize
+from src.escape import analyze_scopes
+from src.typeinfer import infer_types
+from src.evaluator import create_global_env
+from tests.engines import assert_agree
+
+
+def compiled(source: str):
+    # on the calling thread's default stack, without run_deep
+    ast = infer_types(analyze_scopes(optimize(Parser(tokenize(source)).parse())))
+    return closure_compiler.compile_node(ast)(create_global_env())
+
+
+def test_tail_call_runs_in_constant_stack():
+    source = "func f(n, acc) = if n == 0 then acc else f(n - 1, acc + 1)\nf(100000, 0)"
+    assert compiled(source) == 100000
+
+
+def test_mutual_tail_calls():
+    source = ("func odd(n) = if n == 0 then 0 else even(n - 1)\n"
+              "func even(n) = if n == 0 then 1 else odd(n - 1)\neven(10001)")
+    assert compiled(source) == 0
+
+
+def test_tail_call_from_block():
+    source = 'func b(n, s) = if n == 0 then s else { let t = s + "ab"\nb(n - 1, t) }\nb(3000, "")'
+    assert str(compiled(source)) == "ab" * 3000
+
+
+def test_lambda_tail_call():
+    assert compiled("let g = lambda n -> if n == 0 then 7 else g(n - 1)\ng(50000)") == 7
+
+
+def test_non_tail_recursion():
+    assert_agree("func fact(n) = if n == 0 then 1 else n * fact(n - 1)\nfact(3000) > 0", 1)
+
+
+@pytest.mark.parametrize("source", [
+    "reduce(lambda x -> x, [1, 2], 0)",
+    "let g = lambda x -> x\ng(1, 2)",
+])
+def test_lambda_arity(source):
+    assert_agree(source, TypeError)
+
+
+def test_lambda_in_builtins():
+    assert_agree("let ys = map(lambda x -> x * 2, [1, 2, 3])\nreduce(lambda a -> a, [], 5) + ys[2]", 11)
@@ -0,0 +1,38 @@
+import pytest
+
+from src.lexer import tokenize
+from src.parser import Parser
+from src.resolver import resolve
+from src.evaluator import evaluate, create_global_env
+from src.inline_cache import POLYMORPHIC_LIMIT, inline_cache_stats
+from tests.engines import assert_agree, AST_ENGINES
+
+
+def site_states(classes: int) -> dict:
+    # One method-call and one field-access site, reached with `classes`
+    # different shapes, twice each.
+    source = "".join(f"class C{i} {{ let x = {i}\nfunc get() = x }}\n" for i in range(classes))
+    source += "func call(o) = o.get() + o.x\n"
+    source += "".join(f"call(new C{i}({i}))\ncall(new C{i}({i}))\n" for i in range(classes))
+    ast = resolve(Parser(tokenize(source)).parse())
+    evaluate(ast, create_global_env())
+    stats = inline_cache_stats(ast)
+    return {kind: {state for state in ('monomorphic', 'polymorphic', 'megamorphic') if state in stats[kind]}
+            for kind in ('field', 'method')}
+
+
+@pytest.mark.parametrize("classes, state", [
+    (1, 'monomorphic'),
+    (2, 'polymorphic'),
+    (1 + POLYMORPHIC_LIMIT, 'polymorphic'),
+    (2 + POLYMORPHIC_LIMIT, 'megamorphic'),
+])
+def test_site_state(classes, state):
+    assert site_states(classes) == {'field': {state}, 'method': {state}}
+
+
+def test_megamorphic_site_results():
+    source = "".join(f"class C{i} {{ let x = {i}\nfunc get() = x * 2 }}\n" for i in range(8))
+    source += "func call(o) = o.get() + o.x\n"
+    source += " + ".join(f"call(new C{i}({i}))" for i in range(8))
+    assert_agree(source, 3 * sum(range(8)), AST_ENGINES)
@@ -0,0 +1,78 @@
+import io
+import mmap
+
+import pytest
+
+from src.lexer import iter_tokens, tokenize
+
+SOURCE = ('func fib(n: int) = if n <= 1 then n else fib(n - 1) + fib(n - 2)\n'
+          'let s = "multi\nline string" + "x"\n'
+          '  let ratio = 12.5 / .25 != 3.\n'
+          'let xs = [1, 2, 3]\nxs[0] := 10\nlet f = lambda x -> x >= 100\n\n'
+          'class Point { let x = 0 }\nlet r = ref xs; new Point(1).x == 1\n')
+
+
+def fields(tokens) -> list:
+    return [(token.type, token.value, token.line, token.column) for token in tokens]
+
+
+def test_positions():
+    tokens = fields(tokenize('let a = 1\n  "x\ny" b\nc'))
+    assert tokens == [('LET', 'let', 1, 1), ('IDENTIFIER', 'a', 1, 5), ('ASSIGN', '=', 1, 7), ('NUMBER', 1, 1, 9),
+                      ('STRING', 'x\ny', 2, 3), ('IDENTIFIER', 'b', 3, 4), ('IDENTIFIER', 'c', 4, 1)]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 7, 64])
+def test_chunked_text_matches_tokenize(chunk_size):
+    assert fields(iter_tokens(io.StringIO(SOURCE), chunk_size)) == fields(tokenize(SOURCE))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 7, 64])
+def test_chunked_bytes_match_tokenize(chunk_size):
+    assert fields(iter_tokens(io.BytesIO(SOURCE.encode()), chunk_size)) == fields(tokenize(SOURCE))
+
+
+def test_bytes_and_mmap_sources(tmp_path):
+    expected = fields(tokenize(SOURCE))
+    assert fields(iter_tokens(SOURCE.encode())) == expected
+    assert fields(iter_tokens(bytearray(SOURCE.encode()))) == expected
+    path = tmp_path / "program.txt"
+    path.write_bytes(SOURCE.encode())
+    with open(path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        assert fields(iter_tokens(mapped)) == expected
+    with open(path) as file:
+        assert fields(iter_tokens(file, 4)) == expected
+
+
+def test_bytes_columns_count_bytes():
+    assert [token.column for token in iter_tokens('"é" x'.encode())] == [1, 6]
+    assert [token.value for token in iter_tokens(io.BytesIO('"é" x'.encode()), 1)] == ['é', 'x']
+
+
+@pytest.mark.parametrize("source, message", [
+    ("let a = 1 % 2", "Unexpected character '%' at line 1, column 11"),
+    ("let a = 1\n\n   # x", "Unexpected character '#' at line 3, column 4"),
+    ('let s = "x\ny"\n  @', "Unexpected character '@' at line 3, column 3"),
+    ('let s = "open', "Unexpected character '\"' at line 1, column 9"),
+    ("a !", "Unexpected character '!' at line 1, column 3"),
+])
+@pytest.mark.parametrize("chunk_size", [None, 1, 2, 3])
+def test_unknown_characters(source, message, chunk_size):
+    with pytest.raises(SyntaxError, match=message):
+        if chunk_size is None:
+            tokenize(source)
+        else:
+            list(iter_tokens(io.StringIO(source), chunk_size))
+
+
+def test_tokens_before_an_error_are_yielded():
+    tokens = iter_tokens(io.StringIO("let a = 1\n%"), 2)
+    assert [token.type for token in (next(tokens), next(tokens), next(tokens), next(tokens))] == \
+        ['LET', 'IDENTIFIER', 'ASSIGN', 'NUMBER']
+    with pytest.raises(SyntaxError):
+        next(tokens)
+
+
+def test_unsupported_source():
+    with pytest.raises(TypeError, match="Cannot tokenize int"):
+        iter_tokens(1)
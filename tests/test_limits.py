@@ -0,0 +1,100 @@
+import threading
+
+import pytest
+
+from src import nit
+from src.lexer import tokenize
+from src.parser import Parser
+from src.evaluator import evaluate, create_global_env, run_deep
+from src.limits import Limits, StepLimitExceeded, DeadlineExceeded
+from src.bytecode import compile_source
+from src.vm import VirtualMachine
+
+RUNAWAY = [
+    "func f(n) = f(n)\nf(1)",
+    "let g = lambda n -> g(n)\ng(1)",
+    "while 1 { 0 }",
+    "for x in [1, 2, 3] { let i = 0\nwhile 1 { i = i + 1 } }",
+    "class A { func f(n) = f(n) }\nlet a = new A()\na.f(1)",
+    "map(lambda x -> { while 1 { 0 }\nx }, [1, 2])",
+]
+PARALLEL = [
+    "pmap(lambda x -> { while 1 { 0 }\nx }, [1, 2, 3])",
+    "pfilter(lambda x -> { while 1 { 0 }\nx }, [1, 2, 3])",
+    "func add(a, b) = { while 1 { 0 }\na }\npreduce(add, [1, 2, 3], 0)",
+]
+
+
+def run_vm(source: str, limits: Limits):
+    vm = VirtualMachine(limits=limits)
+    vm.code = compile_source(source)
+    return run_deep(vm.execute)
+
+
+@pytest.mark.parametrize("source", RUNAWAY)
+def test_step_limit(source):
+    with pytest.raises(StepLimitExceeded):
+        nit.compile(source).run(None, Limits(max_steps=10_000))
+
+
+@pytest.mark.parametrize("source", [source for source in RUNAWAY if 'class' not in source])
+def test_deadline(source):
+    with pytest.raises(DeadlineExceeded):
+        nit.compile(source).run(None, Limits(timeout=0.1))
+    with pytest.raises(DeadlineExceeded):
+        run_vm(source, Limits(timeout=0.1))
+
+
+@pytest.mark.parametrize("source", PARALLEL)
+def test_parallel_builtins_run_serially(source):
+    # pool workers could not charge the steps
+    ast = Parser(tokenize(source)).parse()
+    limits = Limits(max_steps=10_000)
+    with pytest.raises(StepLimitExceeded):
+        run_deep(limits.evaluate, ast, create_global_env(parallel_threshold=0, limits=limits))
+    with pytest.raises(StepLimitExceeded):
+        run_vm(source, Limits(max_steps=10_000))
+
+
+def test_steps_counted():
+    limits = Limits(max_steps=1000)
+    assert nit.compile("func f(n) = if n == 0 then 0 else f(n - 1)\nf(100)").run(None, limits) == 0
+    assert limits.steps == 101
+
+
+@pytest.mark.parametrize("options", [
+    {'max_steps': 0}, {'timeout': -1}, {'max_steps': float('nan')}, {'timeout': float('nan')},
+    {'max_steps': float('inf')}, {'timeout': float('inf')},
+])
+def test_invalid_limits(options):
+    with pytest.raises(ValueError):
+        Limits(**options)
+
+
+def test_env_must_carry_the_limits():
+    with pytest.raises(ValueError):
+        Limits(max_steps=10).evaluate(Parser(tokenize("1")).parse(), create_global_env())
+
+
+def test_concurrent_limited_runs_and_jit():
+    # a limited run in another thread neither blocks this one nor turns the
+    # JIT off for it
+    errors = []
+
+    def limited():
+        try:
+            nit.compile("while 1 { 0 }").run(None, Limits(timeout=0.5))
+        except DeadlineExceeded as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=limited)
+    thread.start()
+    env = create_global_env(jit=True, jit_threshold=1)
+    ast = Parser(tokenize("func f(n) = if n == 0 then 0 else f(n - 1)\nf(10)")).parse()
+    limits = Limits(max_steps=100)
+    limited_env = create_global_env(limits=limits)
+    assert run_deep(evaluate, ast, env) == 0
+    assert limits.evaluate(Parser(tokenize("func g(n) = g(n)\n0")).parse(), limited_env) == 0
+    thread.join()
+    assert env.get('f').compiled is not None
+    assert len(errors) == 1
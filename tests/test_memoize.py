@@ -0,0 +1,89 @@
+import pytest
+
+from src.lexer import tokenize
+from src.parser import Parser
+from src.optimizer import optimize
+from src.resolver import resolve
+from src.escape import analyze_scopes
+from src.typeinfer import infer_types
+from src.purity import analyze_purity
+from src.ast_nodes import FunctionNode
+from src.evaluator import evaluate, create_global_env, memo_stats, run_deep
+
+
+def analyzed(source: str):
+    return analyze_purity(infer_types(resolve(analyze_scopes(optimize(Parser(tokenize(source)).parse())))))
+
+
+def purity(source: str) -> dict:
+    return {node.name: node.pure for node in analyzed(source) if isinstance(node, FunctionNode)}
+
+
+@pytest.mark.parametrize("source, expected", [
+    ("func f(n) = n * 2", {'f': True}),
+    ("let k = 3\nfunc f(n) = n * k", {'f': True}),
+    ("func fib(n) = if n < 2 then n else fib(n - 1) + fib(n - 2)", {'fib': True}),
+    ("func f(n) = map(lambda x -> x + n, [1, 2])", {'f': True}),
+    # assignment to an outer name, and reading one that is reassigned
+    ("let total = 0\nfunc f(n) = { total = total + n\ntotal }", {'f': False}),
+    ("let k = 3\nfunc f(n) = n * k\nk = 4", {'f': False}),
+    # assigning its own locals keeps a function pure
+    ("func f(n) = { let a = n\na = a + 1\na }", {'f': True}),
+    ("func f(n) = { let a = n\nlet r = ref a\nr }", {'f': False}),
+    ("class C { let x = 1\nfunc get() = x }\nfunc f(n) = new C(n)", {'f': False}),
+    ("class C { let x = 1\nfunc get() = x }\nfunc f(c) = c.get()", {'f': False}),
+    ("class C { let x = 1\nfunc get() = x }\nfunc f(c) = c.x", {'f': False}),
+    ("func f(n) = unknown(n)", {'f': False}),
+    # impurity spreads to callers, through mutual recursion too
+    ("let t = 0\nfunc g(n) = { t = n\nn }\nfunc f(n) = g(n) + 1", {'g': False, 'f': False}),
+    ("let t = 0\nfunc a(n) = if n == 0 then t else b(n - 1)\nfunc b(n) = a(n)\nt = 1",
+     {'a': False, 'b': False}),
+    ("func a(n) = if n == 0 then 0 else b(n - 1)\nfunc b(n) = a(n)", {'a': True, 'b': True}),
+])
+def test_purity(source, expected):
+    assert purity(source) == expected
+
+
+def run(source: str, **options):
+    env = create_global_env(**options)
+    return run_deep(evaluate, analyzed(source), env), env
+
+
+def test_lru_eviction_order():
+    env = create_global_env(memoize=True, memo_size=2)
+    run_deep(evaluate, analyzed("func sq(n) = n * n\nsq(1)\nsq(2)\nsq(1)\nsq(3)"), env)
+    memo = env.get('sq').memo
+    # sq(1) was used after sq(2), so sq(2) is the one evicted
+    assert [key[0][1] for key in memo.entries] == [1, 3]
+    assert memo_stats(env) == {'sq': {'hits': 1, 'misses': 3, 'evictions': 1, 'size': 2, 'maxsize': 2}}
+
+
+def test_memo_keys_by_type():
+    _, env = run("func f(n) = n\nf(1)\nf(1.0)\nf(1)", memoize=True)
+    assert memo_stats(env)['f']['hits'] == 1
+    assert memo_stats(env)['f']['size'] == 2
+
+
+def test_impure_and_unhashable_calls_are_not_cached():
+    _, env = run("let t = 0\nfunc g(n) = { t = t + n\nt }\nfunc h(xs) = xs[0]\ng(1)\ng(1)\nh([1])\nh([1])",
+                 memoize=True)
+    assert env.get('g').memo is None
+    assert memo_stats(env) == {'h': {'hits': 0, 'misses': 0, 'evictions': 0, 'size': 0, 'maxsize': 1024}}
+
+
+def test_memo_size_validation():
+    with pytest.raises(ValueError, match="memo_size must be positive"):
+        create_global_env(memoize=True, memo_size=0)
+
+
+@pytest.mark.parametrize("source", [
+    "func fib(n) = if n < 2 then n else fib(n - 1) + fib(n - 2)\nfib(25)",
+    "func f(n) = n / 2\nf(3) + f(3.0) + f(3)",
+    "let t = 0\nfunc g(n) = { t = t + n\nt }\ng(1) + g(1) + g(1)",
+    "func add(a, b) = a + b\nfunc sq(n) = n * n\nreduce(add, map(lambda x -> sq(x - 3), [1, 2, 3, 4, 5, 6]), 0)",
+    "func c(s) = s + \"!\"\nc(\"a\") + c(\"a\")",
+])
+def test_memoize_preserves_results(source):
+    plain, _ = run(source)
+    memoized, _ = run(source, memoize=True, memo_size=2)
+    assert memoized == plain
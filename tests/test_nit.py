@@ -0,0 +1,115 @@
+import pytest
+
+from src import nit
+from src.limits import Limits, StepLimitExceeded
+
+
+@pytest.fixture
+def cache():
+    nit.clear_cache()
+    yield
+    nit.set_cache_size(nit.DEFAULT_CACHE_SIZE)
+    nit.clear_cache()
+
+
+def test_run_with_bindings():
+    program = nit.Program("price * (1 - discount)")
+    assert program.run({'price': 120, 'discount': 0.25}) == 90.0
+    assert nit.Program('s + "!"').run({'s': "hi"}) == "hi!"
+
+
+def test_runs_are_isolated():
+    program = nit.Program("let seen = x\nfunc f(n) = n + seen\nf(1)", memoize=True)
+    assert program.run({'x': 1}) == 2
+    assert program.run({'x': 10}) == 11
+    with pytest.raises(NameError):
+        nit.Program("seen").run()
+    with pytest.raises(NameError):
+        program.run()
+
+
+def test_program_is_immutable():
+    program = nit.Program("1")
+    with pytest.raises(AttributeError, match="immutable"):
+        program.source = "2"
+    with pytest.raises(AttributeError, match="immutable"):
+        del program._ast
+    assert program.source == "1"
+    assert repr(nit.Program("1 + " * 20 + "1")).endswith("...')")
+
+
+def test_options_are_checked_at_compile_time():
+    with pytest.raises(ValueError, match="memo_size"):
+        nit.Program("1", memoize=True, memo_size=0)
+    with pytest.raises(SyntaxError):
+        nit.Program("let = 1")
+
+
+@pytest.mark.parametrize("batch_size, batches", [(1, 5), (2, 3), (5, 1), (100, 1)])
+def test_run_many_batches(batch_size, batches, monkeypatch):
+    calls = []
+    run_deep = nit.run_deep
+
+    def counting(func, *args):
+        calls.append(func.__name__)
+        return run_deep(func, *args)
+
+    monkeypatch.setattr(nit, 'run_deep', counting)
+    program = nit.Program("x * 2")
+    assert list(program.run_many(({'x': i} for i in range(5)), batch_size)) == [0, 2, 4, 6, 8]
+    assert calls == ['_run_all'] * batches
+
+
+@pytest.mark.parametrize("batch_size", [1, 2, 10])
+def test_run_many_yields_results_before_an_error(batch_size):
+    results = nit.Program("10 / x").run_many([{'x': 1}, {'x': 2}, {'x': 0}, {'x': 5}], batch_size)
+    assert next(results) == 10.0
+    assert next(results) == 5.0
+    with pytest.raises(ZeroDivisionError):
+        next(results)
+    with pytest.raises(StopIteration):
+        next(results)
+
+
+def test_run_many_limits_apply_per_run():
+    program = nit.Program("func loop(n) = if n == 0 then 0 else loop(n - 1)\nloop(x)")
+    assert list(program.run_many([{'x': 50}] * 3, limits=Limits(max_steps=100))) == [0, 0, 0]
+    with pytest.raises(StepLimitExceeded):
+        list(program.run_many([{'x': 50}, {'x': 500}], limits=Limits(max_steps=100)))
+
+
+@pytest.mark.parametrize("batch_size", [0, -1])
+def test_batch_size_validation(batch_size):
+    with pytest.raises(ValueError, match="batch_size must be positive"):
+        next(nit.Program("1").run_many([{}], batch_size))
+
+
+def test_compile_cache(cache):
+    first = nit.compile("1 + 1")
+    assert nit.compile("1 + 1") is first
+    assert nit.compile("1 + 1", memoize=True) is not first
+    assert nit.cache_info() == {'hits': 1, 'misses': 2, 'evictions': 0, 'size': 2,
+                                'maxsize': nit.DEFAULT_CACHE_SIZE}
+
+
+def test_cache_eviction_order(cache):
+    nit.set_cache_size(2)
+    a = nit.compile("1")
+    nit.compile("2")
+    assert nit.compile("1") is a
+    nit.compile("3")
+    # "2" was used least recently, so it was evicted
+    assert nit.compile("1") is a
+    assert nit.cache_info() == {'hits': 2, 'misses': 3, 'evictions': 1, 'size': 2, 'maxsize': 2}
+    nit.compile("2")
+    nit.set_cache_size(1)
+    assert nit.cache_info()['size'] == 1
+    assert nit.cache_info()['evictions'] == 3
+    nit.clear_cache()
+    assert nit.cache_info() == {'hits': 0, 'misses': 0, 'evictions': 0, 'size': 0, 'maxsize': 1}
+
+
+@pytest.mark.parametrize("maxsize", [0, -5])
+def test_cache_size_validation(maxsize, cache):
+    with pytest.raises(ValueError, match="maxsize must be positive"):
+        nit.set_cache_size(maxsize)
@@ -0,0 +1,32 @@
+import pytest
+
+from src import numarray
+from src.lexer import tokenize
+from src.parser import Parser
+from src.evaluator import evaluate, create_global_env, run_deep
+from src.numarray import NumArray
+
+FORMULAS = [
+    "x * 3 + 1",
+    "(x - 5) * (x + 5) / 2",
+    "x * x < 250",
+    "x * 4611686018427387904",
+    "7",
+]
+
+
+def run(source: str):
+    return run_deep(evaluate, Parser(tokenize(source)).parse(), create_global_env())
+
+
+@pytest.mark.parametrize("formula", FORMULAS)
+@pytest.mark.parametrize("elements", [list(range(40)), [x / 4 for x in range(40)]])
+def test_fallback_map_matches_per_element_calls(formula, elements, monkeypatch):
+    # without NumPy the kernel runs on array('q')/array('d') data
+    monkeypatch.setattr(numarray, 'np', None)
+    literal = f"[{', '.join(map(repr, elements))}]"
+    assert isinstance(run(literal), NumArray)
+    mapped = run(f"map(lambda x -> {formula}, {literal})")
+    expected = [run(f"func f(x) = {formula}\nf({x!r})") for x in elements]
+    assert mapped == expected
+    assert [type(value) for value in mapped] == [type(value) for value in expected]
@@ -0,0 +1,86 @@
+import pytest
+
+from src.lexer import tokenize
+from src.parser import Parser
+from src.optimizer import optimize
+from src.escape import analyze_scopes
+from src.resolver import resolve
+from src.evaluator import evaluate, create_global_env, run_deep
+from tests.engines import plain
+
+
+def optimized(source: str, enabled: bool = True) -> str:
+    return repr(optimize(Parser(tokenize(source)).parse(), enabled=enabled)[-1])
+
+
+@pytest.mark.parametrize("source, expected", [
+    # folding, with evaluate's own rules
+    ("1 + 2 * 3", "NumberNode(7)"),
+    ("7 / 2", "NumberNode(3.5)"),
+    ("2 < 3", "NumberNode(1)"),
+    ("1.5 == 1.5", "NumberNode(1)"),
+    ('"a" + "b"', "StringNode(ab)"),
+    ("(1 + 2) * x", "BinaryOpNode(NumberNode(3), MUL, VariableNode(x))"),
+    # operations that raise at runtime are kept
+    ("1 / 0", "BinaryOpNode(NumberNode(1), DIV, NumberNode(0))"),
+    ('"a" * 2', "BinaryOpNode(StringNode(a), MUL, NumberNode(2))"),
+    # `if` on a literal condition
+    ("if 0 then 5 else 6", "NumberNode(6)"),
+    ("if 2 > 1 then x else y", "VariableNode(x)"),
+    ("if x then 1 + 1 else 3", "IfNode(VariableNode(x), NumberNode(2), NumberNode(3))"),
+    # identities, only on operands known to be numbers
+    ("(x - 1) + 0", "BinaryOpNode(VariableNode(x), MINUS, NumberNode(1))"),
+    ("0 + (x / 2)", "BinaryOpNode(VariableNode(x), DIV, NumberNode(2))"),
+    ("(x < 2) - 0", "BinaryOpNode(VariableNode(x), LESS, NumberNode(2))"),
+    ("1 * (x - 1)", "BinaryOpNode(VariableNode(x), MINUS, NumberNode(1))"),
+    ("x + 0", "BinaryOpNode(VariableNode(x), PLUS, NumberNode(0))"),
+    ("x * 1", "BinaryOpNode(VariableNode(x), MUL, NumberNode(1))"),
+    ("(x - 1) + 0.0", "BinaryOpNode(BinaryOpNode(VariableNode(x), MINUS, NumberNode(1)), PLUS, NumberNode(0.0))"),
+    # constant lets
+    ("let k = 2\nk * 3", "NumberNode(6)"),
+    ('let s = "a"\ns + "b"', "StringNode(ab)"),
+    ("let k = 2\nk = 3\nk", "VariableNode(k)"),
+    ("let k = 2\nlet r = ref k\nk", "VariableNode(k)"),
+    ("let k = 2\nlet k = 3\nk", "VariableNode(k)"),
+    ('let k: int = "a"\nk', "VariableNode(k)"),
+    ("let k = 2\nfunc f(k) = k", "FunctionNode(f, ['k'], VariableNode(k))"),
+    ("let k = 2\nlambda k -> k", "LambdaNode(k, VariableNode(k))"),
+    ("let k = 2\nfunc f(n) = n * k", "FunctionNode(f, ['n'], BinaryOpNode(VariableNode(n), MUL, NumberNode(2)))"),
+])
+def test_rewrites(source, expected):
+    assert optimized(source) == expected
+
+
+def test_disabled():
+    ast = Parser(tokenize("let k = 2\n1 + k * 3")).parse()
+    before = repr(ast)
+    assert optimize(ast, enabled=False) is ast
+    assert repr(ast) == before
+
+
+PROGRAMS = [
+    "let k = 2\nfunc f(n) = n * k + 0\nf(5) + (1 + 2) * 3",
+    "let s = \"a\" + \"b\"\ns + s",
+    "if 2 > 1 then 10 / 4 else 0",
+    "let k = 1\n{ let k = 5\nk }\nk",
+    "let k = 1\nfor i in [1, 2, 3] { k = k + i }\nk",
+    "let k = 3\nlet r = ref k\nr := 4\nk",
+    "func f(x) = x + 0\nf(\"a\")",
+    "func f(x) = x * 1\nf(\"a\")",
+    "1 / 0",
+    "let k: int = \"a\"\nk",
+    "let k = 2\nmap(lambda k -> k * 1, [1, 2])",
+]
+
+
+def outcome(source: str, enabled: bool):
+    ast = analyze_scopes(optimize(Parser(tokenize(source)).parse(), enabled=enabled))
+    try:
+        return plain(run_deep(evaluate, resolve(ast), create_global_env()))
+    except Exception as e:
+        return type(e)
+
+
+@pytest.mark.parametrize("source", PROGRAMS)
+def test_optimized_results_match(source):
+    assert outcome(source, True) == outcome(source, False)
@@ -0,0 +1,84 @@
+import pytest
+
+from src import parallel
+from src.lexer import tokenize
+from src.parser import Parser
+from src.evaluator import evaluate, create_global_env, run_deep
+from tests.engines import plain
+
+# Small enough that every call below goes to the process pool, in several
+# chunks per call.
+POOL = dict(chunk_size=3, parallel_threshold=4)
+DEFS = "func add(a, b) = a + b\nlet k = 3\nfunc sq(x) = x * x\nlet xs = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11]\n"
+
+
+@pytest.fixture(scope="module", autouse=True)
+def pool():
+    yield
+    if parallel._pool is not None:
+        parallel._pool.shutdown()
+        parallel._pool = None
+
+
+def run(source: str, **options):
+    return run_deep(evaluate, Parser(tokenize(DEFS + source)).parse(), create_global_env(**options))
+
+
+@pytest.mark.parametrize("serial, parallel_call", [
+    ("map(lambda x -> x * k + 1, xs)", "pmap(lambda x -> x * k + 1, xs)"),
+    ("map(sq, xs)", "pmap(sq, xs)"),
+    ("map(lambda x -> sq(x) / 2, xs)", "pmap(lambda x -> sq(x) / 2, xs)"),
+    ("filter(lambda x -> x * 2 > 9, xs)", "pfilter(lambda x -> x * 2 > 9, xs)"),
+    ("filter(lambda x -> x < 0, xs)", "pfilter(lambda x -> x < 0, xs)"),
+    ("reduce(add, xs, 100)", "preduce(add, xs, 100)"),
+    ('reduce(add, map(lambda x -> "s", xs), "")', 'preduce(add, pmap(lambda x -> "s", xs), "")'),
+    ("map(lambda x -> [x, x], xs)", "pmap(lambda x -> [x, x], xs)"),
+])
+def test_pool_matches_serial(serial, parallel_call, monkeypatch):
+    expected = plain(run(serial))
+    chunked = []
+    run_chunks = parallel._run_chunks
+
+    def recording(*args):
+        parts = run_chunks(*args)
+        chunked.append(parts is not None and len(parts))
+        return parts
+
+    monkeypatch.setattr(parallel, '_run_chunks', recording)
+    assert plain(run(parallel_call, **POOL)) == expected
+    # every call went to the pool, in four chunks of at most three elements
+    assert chunked and set(chunked) == {4}
+
+
+def test_numarray_input_stays_numarray():
+    source = "pmap(lambda x -> x + 1, [" + ", ".join(str(i) for i in range(40)) + "])"
+    result = run(source, chunk_size=7, parallel_threshold=1)
+    assert type(result).__name__ == 'NumArray'
+    assert result.tolist() == list(range(1, 41))
+
+
+def test_error_in_a_worker_chunk():
+    with pytest.raises(ZeroDivisionError):
+        run("pmap(lambda x -> 10 / (x - 7), xs)", **POOL)
+    with pytest.raises(ZeroDivisionError):
+        run("pfilter(lambda x -> 10 / (x - 7) > 0, xs)", **POOL)
+
+
+def test_unshippable_functions_run_serially(monkeypatch):
+    monkeypatch.setattr(parallel, '_get_pool', lambda: pytest.fail("pool used"))
+    source = "let total = 0\npmap(lambda x -> { total = total + x\ntotal }, xs)\ntotal"
+    assert run(source, **POOL) == run(source.replace("pmap", "map")) == 66
+
+
+def test_below_threshold_runs_serially(monkeypatch):
+    monkeypatch.setattr(parallel, '_get_pool', lambda: pytest.fail("pool used"))
+    assert run("pmap(sq, xs)", chunk_size=3, parallel_threshold=100) == run("map(sq, xs)")
+
+
+@pytest.mark.parametrize("options, message", [
+    (dict(chunk_size=0), "chunk_size must be positive"),
+    (dict(parallel_threshold=-1), "parallel_threshold must not be negative"),
+])
+def test_option_validation(options, message):
+    with pytest.raises(ValueError, match=message):
+        create_global_env(**options)
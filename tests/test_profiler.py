@@ -0,0 +1,91 @@
+import contextlib
+import io
+import threading
+
+from src.lexer import tokenize
+from src.parser import Parser, LocatingParser
+from src.compiler import Compiler
+from src.vm import VirtualMachine
+from src.evaluator import evaluate, create_global_env, run_deep
+from src.profiler import Profiler, ROOT
+
+FIB = "func fib(n) = if n < 2 then n else fib(n - 1) + fib(n - 2)\nfib(10)"
+LOOP = "func loop(n) = if n == 0 then 0 else loop(n - 1)\nloop(50)"
+
+
+def profiled(source: str) -> Profiler:
+    parser = LocatingParser(tokenize(source))
+    ast = parser.parse()
+    profiler = Profiler(parser.locations)
+    profiler.evaluate(ast, create_global_env())
+    return profiler
+
+
+def test_function_counts_and_report():
+    profiler = profiled(FIB)
+    assert profiler.functions == {'fib': 177}
+    report = profiler.report()
+    assert report.splitlines()[0].split() == ['function', 'calls', 'self', 'ms', 'total', 'ms']
+    assert any(line.split()[:2] == ['fib', '177'] for line in report.splitlines())
+    assert any(line.split()[:3] == ['CallNode', '1:36', '88'] for line in report.splitlines())
+
+
+def test_collapsed_stacks():
+    lines = profiled(FIB).collapsed()
+    stacks = [line.rsplit(' ', 1)[0].split(';') for line in lines]
+    assert all(stack[0] == ROOT and set(stack[1:]) <= {'fib'} for stack in stacks)
+    assert max(len(stack) for stack in stacks) == 11
+    assert all(int(line.rsplit(' ', 1)[1]) > 0 for line in lines)
+
+
+def test_tail_calls_replace_the_frame():
+    profiler = profiled(LOOP)
+    assert profiler.functions == {'loop': 51}
+    assert {stack for stack in profiler.stacks} <= {(ROOT,), (ROOT, 'loop')}
+
+
+def test_vm_opcode_counts():
+    profiler = Profiler()
+    vm = VirtualMachine(profiler=profiler)
+    vm.code = Compiler().compile(Parser(tokenize("let a = 2\na + 3")).parse())
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert vm.execute() == 5
+    assert {op: stats[0] for op, stats in profiler.opcodes.items()} == {
+        'LOAD': 2, 'STORE': 1, 'LOAD_VAR': 1, 'ADD': 1, 'PRINT': 1}
+    assert 'opcode' in profiler.report()
+
+
+def test_vm_function_frames():
+    profiler = Profiler()
+    vm = VirtualMachine(profiler=profiler)
+    vm.code = Compiler().compile(Parser(tokenize(FIB)).parse())
+    with contextlib.redirect_stdout(io.StringIO()):
+        run_deep(vm.execute)
+    assert profiler.functions == {'fib': 177}
+
+
+def test_concurrent_runs_are_separate():
+    # a profiled run in one thread neither sees nor disturbs runs in others
+    profilers = [Profiler(), Profiler()]
+    results = []
+
+    def run(profiler):
+        profiler.evaluate(Parser(tokenize(FIB)).parse(), create_global_env())
+
+    threads = [threading.Thread(target=run, args=(profiler,)) for profiler in profilers]
+    for thread in threads:
+        thread.start()
+    results.append(run_deep(evaluate, Parser(tokenize(LOOP)).parse(), create_global_env()))
+    for thread in threads:
+        thread.join()
+    assert [profiler.functions for profiler in profilers] == [{'fib': 177}] * 2
+    assert results == [0]
+
+
+def test_profiler_restored_on_env():
+    env = create_global_env()
+    Profiler().evaluate(Parser(tokenize("1")).parse(), env)
+    assert env.profiler is None
+    env.jit_threshold = 1
+    assert run_deep(evaluate, Parser(tokenize(FIB)).parse(), env) == 55
+    assert env.get('fib').compiled is not None
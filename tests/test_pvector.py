@@ -0,0 +1,29 @@
+import pytest
+
+from src.pvector import PersistentVector
+from tests.engines import assert_agree, AST_ENGINES
+
+# Element updates rebind the array to a new vector; other holders of the
+# old array keep seeing the old elements.
+PROGRAMS = [
+    ("let a = [1, 2, 3]\nlet b = a\na[0] := 9\nb[0] * 10 + a[0]", 19),
+    ("let m = [[1, 2], [3, 4]]\nm[1][0] := 7\nm", [[1, 2], [7, 4]]),
+    ("let a = [1, 2]\nlet r = ref a[1]\nr := 5\na", [1, 5]),
+    ("let a = [0, 0, 0]\nlet i = 0\nwhile i < 3 { a[i] := i * i\ni = i + 1 }\nreduce(lambda s -> s, [], 0) + a[2]", 4),
+    ("let a = [1, 2, 3]\na[1] := 0\nmap(lambda x -> x + 1, a)", [2, 1, 4]),
+    ("let a = [1, 2, 3]\na[1] := 0\nfilter(lambda x -> x > 0, a)", [1, 3]),
+    ("let a = [1]\na[3] := 0", IndexError),
+    ("let a = [1]\na[\"x\"] := 0", TypeError),
+]
+
+
+@pytest.mark.parametrize("source, expected", PROGRAMS)
+def test_element_updates(source, expected):
+    assert_agree(source, expected, AST_ENGINES)
+
+
+def test_structural_sharing():
+    old = PersistentVector.from_list(list(range(2000)))
+    new = old.set(1500, -1)
+    assert old[1500] == 1500 and new[1500] == -1
+    assert new.tolist()[:1500] == old.tolist()[:1500]
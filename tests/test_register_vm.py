@@ -0,0 +1,30 @@
+import pytest
+
+from tests.engines import outcomes
+
+# Each program runs on RegisterVM and VirtualMachine (and evaluate as the
+# reference); all three must agree.
+PROGRAMS = [
+    "func fib(n) = if n < 2 then n else fib(n - 1) + fib(n - 2)\nfib(15)",
+    "func g(a) = a\nfunc f(x) = g({ func g(b) = 100\n1 })\nf(0)",
+    "func f(x) = { func g(b) = b * 2\ng(x) }\nf(21)",
+    "func f(x) = g(x)\nfunc g(y) = y + 1\nf(1)",
+    "func f(n) = if n > 0 then { let a = n * 2\na } else { let a = 7\na }\nf(3) + f(0)",
+    "func adder(k) = lambda x -> x + k\nlet add5 = adder(5)\nadd5(10)",
+    "func f(xs) = { let s = 0\nfor x in xs { s = s + x }\ns }\nf([1, 2, 3, 4])",
+    "func f(n) = { let i = 0\nlet acc = 1\nwhile i < n { acc = acc * 2\ni = i + 1 }\nacc }\nf(10)",
+    "func f(n) = { let x = 1\nwhile n > 0 { let x = n\nn = n - 1 }\nx }\nf(3)",
+    'func greet(name: string) = "hi " + name\ngreet("bob")',
+    "func f(a: int, b: int) = if a < b then a * b else a - b\nf(3, 4) + f(9, 2)",
+    "let xs = map(lambda x -> x * x, [1, 2, 3])\nxs[0] + xs[2]",
+    "func f(n) = filter(lambda x -> x > n, [1, 5, 2, 8])\nf(2)",
+    "func f(x) = x / 0\nf(1)",
+    "func f(x) = undefined_name + x\nf(1)",
+    "func f(n, acc) = if n == 0 then acc else f(n - 1, acc + n)\nf(5000, 0)",
+]
+
+
+@pytest.mark.parametrize("source", PROGRAMS)
+def test_register_vm_matches_stack_vm(source):
+    results = outcomes(source, ('evaluate', 'vm', 'registers'))
+    assert results['registers'] == results['vm'] == results['evaluate'], results
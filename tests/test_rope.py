@@ -0,0 +1,46 @@
+import operator
+
+import pytest
+
+from src.rope import ROPE_CHUNK, Rope, concat
+from tests.engines import ENGINES, run, assert_agree
+
+TEXT = "x" * ROPE_CHUNK
+OPERATORS = [operator.add, operator.sub, operator.mul, operator.truediv,
+             operator.lt, operator.le, operator.gt, operator.ge, operator.eq]
+
+
+def error(op, left, right):
+    try:
+        return op(left, right)
+    except TypeError as e:
+        return str(e)
+
+
+@pytest.mark.parametrize("op", OPERATORS)
+@pytest.mark.parametrize("other", [1, 1.5, None, [1]])
+def test_operators_act_as_str(op, other):
+    rope = concat(TEXT, "y")
+    assert type(rope) is Rope
+    assert error(op, rope, other) == error(op, TEXT + "y", other)
+    # Python asks the rope for the mirrored comparison, so only the
+    # operands' types are compared for those
+    if op in (operator.lt, operator.le, operator.gt, operator.ge):
+        assert "Rope" not in str(error(op, other, rope))
+    else:
+        assert error(op, other, rope) == error(op, other, TEXT + "y")
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_engine_errors_name_str(engine):
+    with pytest.raises(TypeError) as raised:
+        run(engine, f'func f(a) = a + "y"\nlet s = f("{TEXT}")\ns - 1')
+    assert "Rope" not in str(raised.value)
+
+
+def test_semantics():
+    source = f'func f(a) = a + "y"\nlet s = f("{TEXT}")\nlet t = "a" + s\n'
+    assert_agree(source + f's == "{TEXT}y"', 1)
+    assert_agree(source + 't < s', 1)
+    assert_agree(source + 'let u = t + t\nu', "a" + TEXT + "y" + "a" + TEXT + "y")
+    assert_agree(source + 's < 1', TypeError)
@@ -0,0 +1,47 @@
+import pytest
+
+from tests.engines import assert_agree, AST_ENGINES
+
+# Lexical scoping (the resolver's addresses) and scope elision
+# (escape.analyze_scopes): blocks and frames that are skipped or reused must
+# not change what closures and later statements see.
+PROGRAMS = [
+    ("let x = 1\nfunc f() = x\nlet x = 2\nf()", 2),
+    ("let x = 1\nfunc f(x) = x + 1\nf(10) + x", 12),
+    ("let x = 1\n{ let x = 5\nx }\nx", 1),
+    ("func adder(k) = lambda x -> { let y = x + k\ny }\nlet a = adder(1)\nlet b = adder(10)\na(1) + b(1)", 13),
+    ("func f(n, acc) = { let m = n - 1\nif n == 0 then acc else f(m, acc + 1) }\nf(500, 0)", 500),
+    ("let fs = map(lambda k -> lambda x -> x + k, [1, 2, 3])\nlet g = fs[0]\nlet h = fs[2]\ng(10) + h(10)", 24),
+    ("let total = 0\nfor x in [1, 2, 3] { total = total + x }\ntotal", 6),
+    ("let x = 1\nwhile x < 5 { x = x + 1 }\nx", 5),
+    ("func f() = y\nf()", NameError),
+]
+# The stack and register VMs compile a nested block into the enclosing
+# scope, so only the AST engines give it a scope of its own.
+BLOCKS = [
+    ("func f(n) = { let a = n * 2\n{ let a = 1\na }\na }\nf(4)", 8),
+    ("let y = 1\n{ let z = 2 }\nz", NameError),
+]
+
+
+@pytest.mark.parametrize("source, expected", PROGRAMS)
+def test_scoping(source, expected):
+    assert_agree(source, expected)
+
+
+@pytest.mark.parametrize("source, expected", BLOCKS)
+def test_block_scopes(source, expected):
+    assert_agree(source, expected, AST_ENGINES)
+
+
+def test_loop_body_captured_per_iteration():
+    source = ("let fs = [0, 0, 0]\nlet i = 0\n"
+              "for x in [1, 2, 3] { let y = x * 10\nfs[i] := lambda z -> y + z\ni = i + 1 }\n"
+              "let f = fs[0]\nlet g = fs[2]\nf(1) + g(1)")
+    assert_agree(source, 42, AST_ENGINES)
+
+
+def test_ref_keeps_frame():
+    source = ("func f(n) = { let a = n\nlet r = ref a\nr := a + 1\na }\n"
+              "func loop(n, acc) = if n == 0 then acc else loop(n - 1, acc + f(n))\nloop(10, 0)")
+    assert_agree(source, 65, AST_ENGINES)
@@ -0,0 +1,81 @@
+import asyncio
+import json
+
+from src.server import ScriptServer
+
+# squares a number until it has tens of millions of digits: a few steps,
+# each a long multiplication the step counter cannot interrupt
+RUNAWAY = "let x = 3\nlet i = 0\nwhile i < 40 { x = x * x\ni = i + 1 }\n0"
+
+
+class RecordingServer(ScriptServer):
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.killed_processes = []
+
+    def _kill(self, pool):
+        self.killed_processes.extend(pool._processes.values())
+        super()._kill(pool)
+
+
+async def session(lines: list, **options) -> tuple:
+    server = RecordingServer(workers=1, **options)
+    await server.start()
+    try:
+        reader, writer = await asyncio.open_connection(*server.address()[:2], limit=1 << 24)
+        for line in lines:
+            writer.write(line if isinstance(line, bytes) else json.dumps(line).encode() + b'\n')
+        await writer.drain()
+        responses = [json.loads(await reader.readline()) for _ in lines]
+        writer.close()
+        return responses, server
+    finally:
+        await server.close()
+
+
+def test_requests():
+    responses, _ = asyncio.run(session([
+        {'id': 1, 'source': 'price * qty', 'bindings': {'price': 3, 'qty': 4}},
+        {'id': 2, 'source': 'price * qty', 'bindings': {'price': 3, 'qty': 4}, 'engine': 'vm'},
+        {'id': 3, 'source': 'func f(n) = f(n)\nf(1)', 'max_steps': 100},
+        b'not json\n',
+    ]))
+    by_id = {response['id']: response for response in responses}
+    assert by_id[1]['result'] == by_id[2]['result'] == 12
+    assert by_id[3]['error']['type'] == 'StepLimitExceeded'
+    assert by_id[None]['error']['type'] == 'ValueError'
+
+
+def test_overlong_line():
+    responses, _ = asyncio.run(session([
+        {'id': 1, 'source': '"' + 'x' * 5000 + '"'},
+        {'id': 2, 'source': '1 + 1'},
+    ], line_limit=1024))
+    by_id = {response['id']: response for response in responses}
+    assert by_id[None] == {'id': None, 'ok': False, 'error': {
+        'type': 'ValueError', 'message': 'Request line longer than 1024 bytes'}}
+    assert by_id[2]['result'] == 2
+
+
+def test_runaway_worker_is_killed():
+    # the second request waits behind the first on the only worker and runs
+    # again on the fresh pool
+    responses, server = asyncio.run(session([
+        {'id': 1, 'source': RUNAWAY, 'timeout': 0.5},
+        {'id': 2, 'source': '1 + 1'},
+    ], grace=0.5))
+    by_id = {response['id']: response for response in responses}
+    assert by_id[1]['error']['type'] == 'DeadlineExceeded'
+    assert by_id[2]['result'] == 2
+    assert len(server.killed_processes) == 1
+    assert not server.killed_processes[0].is_alive()
+
+
+def test_non_finite_limits_are_rejected():
+    lines = [f'{{"id": {i}, "source": "let i = 0\\nwhile 1 {{ i = i + 1 }}", "{key}": {value}}}\n'.encode()
+             for i, (key, value) in enumerate([('max_steps', 'NaN'), ('timeout', 'NaN'),
+                                               ('max_steps', 'Infinity'), ('timeout', '-Infinity')])]
+    responses, _ = asyncio.run(session(lines, max_steps=1000))
+    assert [response['error'] for response in sorted(responses, key=lambda r: r['id'])] == [
+        {'type': 'ValueError', 'message': f"{key} must be a positive number"}
+        for key in ('max_steps', 'timeout', 'max_steps', 'timeout')]
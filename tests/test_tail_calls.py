@@ -0,0 +1,20 @@
+import pytest
+
+from tests.engines import assert_agree
+
+# Tail calls and deep non-tail recursion, which every engine runs on
+# run_deep's large-stack thread.
+PROGRAMS = [
+    ("func f(n, acc) = if n == 0 then acc else f(n - 1, acc + 1)\nf(20000, 0)", 20000),
+    ("func odd(n) = if n == 0 then 0 else even(n - 1)\nfunc even(n) = if n == 0 then 1 else odd(n - 1)\n"
+     "even(5001)", 0),
+    ("func f(n) = if n == 0 then 0 else { let m = n - 1\nf(m) }\nf(20000)", 0),
+    ("func sum(n) = if n == 0 then 0 else n + sum(n - 1)\nsum(5000)", 12502500),
+    ("let g = lambda n -> if n == 0 then 7 else g(n - 1)\ng(5000)", 7),
+    ("func f(n) = if n == 0 then n else f(n - 1)\nf(1, 2)", TypeError),
+]
+
+
+@pytest.mark.parametrize("source, expected", PROGRAMS)
+def test_tail_calls(source, expected):
+    assert_agree(source, expected)
@@ -0,0 +1,87 @@
+import pytest
+
+from src.lexer import tokenize
+from src.parser import Parser
+from src.optimizer import optimize
+from src.typeinfer import infer_types
+from src.compiler import Compiler
+from src.vm import OPCODE, assemble
+from tests.engines import assert_agree, run
+
+
+def last_let(source: str):
+    ast = infer_types(Parser(tokenize(source)).parse())
+    return ast[0].body.statements[-2]
+
+
+@pytest.mark.parametrize("param, branches, proven", [
+    ("string", "if b then let x = 2 else 0", False),
+    ("string", "if b then 0 else let x = 2", False),
+    ("int", 'if b then let x = 2 else let x = "s"', False),
+    ("int", "if b then let x = 2 else 0", True),
+    ("string", "if b then let x = 2 else let x = 3", True),
+    ("int", "if b then 0 else 1", True),
+])
+def test_let_in_branch(param, branches, proven):
+    source = f"func f(a: {param}, b) = {{ let x = a\n{branches}\nlet y: int = x\ny }}"
+    assert last_let(source).proven is proven
+
+
+def test_let_in_branch_keeps_runtime_check():
+    source = 'func f(a, b) = { let x = a\nif b then let x = 2 else 0\nlet y: int = x\ny }\n'
+    assert_agree(source + 'f("oops", 0)', TypeError)
+    assert_agree(source + 'f("oops", 1)', 2)
+
+
+def test_typed_lets():
+    assert_agree("func f(n: int) = { let m: int = n * 2\nlet s: string = \"v\" + \"w\"\nm }\nf(21)", 42)
+    assert_agree('let x: int = "a"', TypeError)
+    assert_agree('func f(s: string) = s\nf(1)', TypeError)
+
+
+def compiled(source: str):
+    return Compiler().compile(infer_types(optimize(Parser(tokenize(source)).parse())))
+
+
+def test_typed_operators_have_own_opcodes():
+    code = compiled('func f(n: int, s: string) = { let t = s + "x"\nn * 2 + n - 1 }')
+    ops, _ = assemble(code)
+    assert {OPCODE[op] for op in ('ADD_INT', 'SUB_INT', 'MUL_INT', 'CONCAT_STR')} <= set(ops)
+    assert 'CHECK_TYPE' not in [inst.op for inst in code]
+
+
+def test_call_carries_proven_argument_types():
+    code = compiled('func f(n: int) = if n < 2 then n else f(n - 1) + f(n - 2)\nf(x)')
+    calls = [inst.operand for inst in code if inst.op == 'CALL']
+    assert calls == [(1, ('int',)), (1, ('int',)), (1, None)]
+
+
+@pytest.mark.parametrize("source, expected", [
+    ('func fib(n: int) = if n < 2 then n else fib(n - 1) + fib(n - 2)\nfib(15)', 610),
+    ('func f(n: int) = n\nf("a")', TypeError),
+    ('func f(n: string) = n\nf(1)', TypeError),
+    ('func f(n: int, s) = n\nf(1, 2)', 1),
+    ('func f(n: int, s: string) = n\nf(1, 2)', TypeError),
+    ('func f(n: int) = n\nlet g = f\ng("a")', TypeError),
+    ('func f(n: int) = n\nmap(f, [1, "a"])', TypeError),
+    ('func c(a: string, b: string) = a + b\nc("x", "y") + c("z", "")', "xyz"),
+    ('func f(n: int) = n\nfunc f(n: string) = n\nf(1)', TypeError),
+])
+def test_parameter_checks(source, expected):
+    assert_agree(source, expected)
+
+
+@pytest.mark.parametrize("engine", ['evaluate', 'closure'])
+def test_proven_calls_skip_parameter_checks(engine, monkeypatch):
+    from src import evaluator, closure_compiler
+    checked = []
+    original = evaluator.check_args
+
+    def check_args(param_types, args):
+        checked.append(args)
+        return original(param_types, args)
+
+    monkeypatch.setattr(evaluator if engine == 'evaluate' else closure_compiler, 'check_args', check_args)
+    assert run(engine, 'func f(n: int) = if n < 2 then n else f(n - 1) + f(n - 2)\nfunc id(a) = a\nf(id(3))') == 2
+    # only the call with an unproven argument is checked
+    assert checked == [[3]]